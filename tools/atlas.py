@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Texture atlases for generated sprites
+Bin-packs sprites into a few power-of-two sheets and writes the sheets with
+a JSON index and a Godot resource mapping each sprite key to its rect
+"""
+
+import json
+import math
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+ATLAS_DIR = "atlas"
+DEFAULT_MAX_SIZE = 2048
+DEFAULT_PADDING = 1
+
+
+def next_power_of_two(value: int) -> int:
+    """Smallest power of two >= value"""
+    return 1 << max(0, math.ceil(math.log2(max(1, value))))
+
+
+def pack(sizes: List[Tuple[int, int]], max_size: int = DEFAULT_MAX_SIZE,
+         padding: int = DEFAULT_PADDING) -> Tuple[List[Tuple[int, int, int]], List[Tuple[int, int]]]:
+    """Shelf-pack rectangles into power-of-two sheets
+
+    Rectangles are placed tallest first, left to right along shelves, with
+    padding pixels around each. Sheets are as narrow as the total area
+    allows, capped at max_size, and a new sheet starts when one fills up.
+    Returns ((sheet, x, y) per rectangle, (width, height) per sheet).
+    """
+    padded = [(w + 2 * padding, h + 2 * padding) for w, h in sizes]
+    for w, h in padded:
+        if w > max_size or h > max_size:
+            raise ValueError(f"A {w - 2 * padding}x{h - 2 * padding} sprite does not fit "
+                             f"a {max_size}x{max_size} sheet")
+    area = sum(w * h for w, h in padded)
+    width = min(max_size, max(next_power_of_two(math.ceil(math.sqrt(area))),
+                              next_power_of_two(max((w for w, _ in padded), default=1))))
+
+    order = sorted(range(len(sizes)), key=lambda i: (-padded[i][1], -padded[i][0], i))
+    places: List[Optional[Tuple[int, int, int]]] = [None] * len(sizes)
+    sheets: List[Tuple[int, int]] = []
+    sheet, x, y, shelf = 0, 0, 0, 0
+    for i in order:
+        w, h = padded[i]
+        if x + w > width:
+            x, y, shelf = 0, y + shelf, 0
+        if y + h > max_size:
+            sheets.append((width, next_power_of_two(y)))
+            sheet, x, y, shelf = sheet + 1, 0, 0, 0
+        places[i] = (sheet, x + padding, y + padding)
+        x += w
+        shelf = max(shelf, h)
+    if sizes:
+        sheets.append((width, next_power_of_two(y + shelf)))
+    return places, sheets
+
+
+def paletted(image: Image.Image) -> Optional[Image.Image]:
+    """An RGBA image as an exact paletted copy (None if it has over 255 colors)
+
+    Fully transparent pixels share entry 0; partial alpha is not kept, so
+    only images without it should be converted.
+    """
+    pixels = np.asarray(image.convert("RGBA"))
+    opaque = pixels[..., 3] > 0
+    keys = (pixels[..., 0].astype(np.int64) << 16) | (pixels[..., 1].astype(np.int64) << 8) \
+        | pixels[..., 2]
+    colors, indices = np.unique(keys[opaque], return_inverse=True)
+    if len(colors) > 255:
+        return None
+    data = np.zeros(keys.shape, dtype=np.uint8)
+    data[opaque] = indices + 1
+    result = Image.fromarray(data, "P")
+    table = [0, 0, 0]
+    for key in colors.tolist():
+        table += [key >> 16, (key >> 8) & 255, key & 255]
+    result.putpalette(table)
+    result.info["transparency"] = 0
+    return result
+
+
+def _godot_string(value: str) -> str:
+    return json.dumps(value)
+
+
+def write_tres(path: Path, sheets: List[str], sprites: Dict[str, Dict]):
+    """Write a Godot 4 resource: one AtlasTexture per sprite
+
+    The resource's "sprites" metadata maps each key to its AtlasTexture
+    (usable anywhere a Texture2D is) and "regions" to its sheet index and
+    Rect2, so load(path).get_meta("sprites")[key] gives a sprite.
+    """
+    lines = [f'[gd_resource type="Resource" load_steps={len(sheets) + len(sprites) + 1} '
+             f'format=3]', ""]
+    for index, sheet in enumerate(sheets):
+        # Relative paths resolve against the resource's own directory
+        lines.append(f'[ext_resource type="Texture2D" path="{sheet}" id="{index + 1}_sheet"]')
+    lines.append("")
+    for number, (key, rect) in enumerate(sprites.items()):
+        lines += [
+            f'[sub_resource type="AtlasTexture" id="AtlasTexture_{number}"]',
+            f'atlas = ExtResource("{rect["sheet"] + 1}_sheet")',
+            f'region = Rect2({rect["x"]}, {rect["y"]}, {rect["w"]}, {rect["h"]})',
+            "",
+        ]
+    textures = ", ".join(f'{_godot_string(key)}: SubResource("AtlasTexture_{number}")'
+                         for number, key in enumerate(sprites))
+    regions = ", ".join(
+        f'{_godot_string(key)}: [{rect["sheet"]}, '
+        f'Rect2({rect["x"]}, {rect["y"]}, {rect["w"]}, {rect["h"]})]'
+        for key, rect in sprites.items())
+    lines += [
+        "[resource]",
+        f"metadata/sprites = {{{textures}}}",
+        f"metadata/regions = {{{regions}}}",
+        "",
+    ]
+    _write_atomic(path, "\n".join(lines).encode())
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def build_atlas(images: Dict[str, Image.Image], info: Dict[str, Dict], out_dir: Path,
+                key: str = "", max_size: int = DEFAULT_MAX_SIZE,
+                padding: int = DEFAULT_PADDING, indexed: bool = False) -> Dict:
+    """Pack images (by sprite key) into sheets under out_dir
+
+    Writes atlas_<n>.png, atlas.json (each key's sheet, rect and info
+    fields such as crop and stage) and atlas.tres, and returns the index.
+    key identifies the inputs; it is stored so callers can skip a rebuild.
+    With indexed, sheets of at most 255 colors are saved paletted.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    keys = sorted(images)
+    places, sizes = pack([images[k].size for k in keys], max_size, padding)
+
+    sheets = [Image.new("RGBA", size, (0, 0, 0, 0)) for size in sizes]
+    sprites = {}
+    for k, (sheet, x, y) in zip(keys, places):
+        image = images[k]
+        sheets[sheet].paste(image.convert("RGBA"), (x, y))
+        sprites[k] = dict(info.get(k, {}), sheet=sheet, x=x, y=y,
+                          w=image.width, h=image.height)
+
+    names = [f"atlas_{index}.png" for index in range(len(sheets))]
+    for name, image in zip(names, sheets):
+        tmp = out_dir / f"{name}.{os.getpid()}.tmp.png"
+        compact = paletted(image) if indexed else None
+        if compact is not None:
+            compact.save(tmp, "PNG", transparency=0, optimize=True, compress_level=9)
+        else:
+            image.save(tmp, "PNG")
+        os.replace(tmp, out_dir / name)
+    for stale in out_dir.glob("atlas_*.png"):
+        if stale.name not in names:
+            stale.unlink()
+
+    index = {"key": key, "padding": padding, "sheets": names, "sprites": sprites}
+    _write_atomic(out_dir / "atlas.json", json.dumps(index, indent=1).encode())
+    write_tres(out_dir / "atlas.tres", names, sprites)
+    return index
+
+
+def atlas_key(out_dir: Path) -> Optional[str]:
+    """Input key of the atlas already in out_dir (None if there is none)"""
+    path = Path(out_dir) / "atlas.json"
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f).get("key")
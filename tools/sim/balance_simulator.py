@@ -4,18 +4,103 @@ Headless balance simulator for Embers of the Earth
 Runs game simulations to test economy and encounter balance
 """
 
+import argparse
+import contextlib
+import functools
 import json
+import os
 import random
-import csv
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from checkpoint import Checkpointer, batch_key, checkpoint_path
+from content import content_paths, health_regen, load_content
+from event_engine import DAYS_PER_YEAR, DEFAULT_WORLD_EVENTS, load_world_events
+from farm import load_farm
+from instrument import Profile, profile_path
+from travel import TradeRoutes
+from policy import compile_policy
+from parallel import ProgressPrinter, derive_seed, iter_sharded, make_shards, report_progress
+from results import ResultTable, ResultWriter, load_results
+from stats import BatchSummary
+
+ENGINES = ("python", "numpy", "event")
+
+# Bump whenever a change alters simulation outcomes; cached sweep results
+# are keyed on it
+SIMULATOR_VERSION = 7
+
+
+class AntitheticRandom(random.Random):
+    """random.Random whose draws mirror those of the same seed (u -> 1 - u)
+
+    Paired with a plain Random of the same seed it gives antithetic runs:
+    each is an ordinary run on its own, but their noise pulls in opposite
+    directions, so their average varies less than two independent runs.
+    """
+
+    def random(self) -> float:
+        return 1.0 - super().random()
+
+    def getrandbits(self, k: int) -> int:
+        return ((1 << k) - 1) ^ super().getrandbits(k)
+
 
 class BalanceSimulator:
     """Simulates game runs to test balance"""
     
-    def __init__(self, config_path: str = "data/sim_config.json"):
-        self.config = self._load_config(config_path)
-        self.results = []
+    def __init__(self, config_path: str = "data/sim_config.json",
+                 engine: str = "python", seed: Optional[int] = None,
+                 config: Optional[Dict] = None, antithetic: bool = False):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+        self.config = config if config is not None else self._load_config(config_path)
+        self.engine = engine
+        # Shipped encounter/hazard content replaces the simplified handlers
+        # when the config has a "content" section (not the numpy engine)
+        self.content = None
+        self._trait_choices = None
+        self._health_regen = 0
+        self._events = None
+        if self.config.get("content") is not None:
+            if engine == "numpy":
+                raise ValueError("Content-driven encounters need the python or event engine")
+            self.content = load_content(*content_paths(self.config["content"]))
+            self._health_regen = health_regen(self.config["content"])
+            # An optional "policy" replaces the random player (see policy.py)
+            self._trait_choices = compile_policy(
+                self.content, self.config["content"].get("policy", "random"),
+                self.config["content"].get("traits", [])
+            )
+        # A "farm" section grows crops on a farm grid whose produce replaces
+        # the random harvest bump
+        self.farm = None
+        if self.config.get("farm") is not None:
+            self.farm = load_farm(self.config["farm"], self.config.get("crop_choices"))
+        # A "travel" section sends runs on trade runs along routes from the
+        # precomputed route index (not the numpy engine)
+        self.travel = None
+        if self.config.get("travel") is not None:
+            if engine == "numpy":
+                raise ValueError("Trade runs need the python or event engine")
+            self.travel = TradeRoutes(self.config["travel"], self.config["starting_resources"])
+        # Yearly world events, opted into with a "world_events" path; the
+        # numpy engine does not play them, so they are off by default and
+        # the engines' default runs stay comparable
+        self.world_events = []
+        if self.config.get("world_events"):
+            if engine == "numpy":
+                raise ValueError("World events need the python or event engine")
+            self.world_events = load_world_events(self.config["world_events"])
+        self.seed = seed
+        self.antithetic = antithetic
+        self.rng = random.Random(seed)
+        self.results = ResultTable.empty()
+        self.summary = BatchSummary()
+        # Set a Profile to time and count what batches do (see instrument())
+        self.profile: Optional[Profile] = None
         
     def _load_config(self, config_path: str) -> Dict:
         """Load simulation configuration"""
@@ -32,6 +117,12 @@ class BalanceSimulator:
             "crop_choices": ["Ironwheat", "Steamroot", "Cogbean"],
             "encounter_rate": 0.3,
             "hazard_rate": 0.2,
+            # Runs per shard for the numpy engine; part of the config because
+            # each shard draws from its own stream
+            "shard_size": 16384,
+            # Runs between precision checks in run_until (python engine)
+            "check_interval": 250,
+            "starting_health": 100,
             "starting_resources": {
                 "food": 10,
                 "fuel": 5,
@@ -39,9 +130,8 @@ class BalanceSimulator:
             }
         }
     
-    def run_simulation(self) -> Dict:
-        """Run a single game simulation"""
-        # Simplified simulation (would integrate with actual game logic)
+    def _new_state(self) -> Dict:
+        """Starting state of a run"""
         state = {
             "day": 1,
             "dead": False,
@@ -49,35 +139,126 @@ class BalanceSimulator:
             "entropy_order": 0.0,
             "entropy_wild": 0.0,
             "bankrupt": False,
-            "resources": self.config["starting_resources"].copy()
+            "resources": self.config["starting_resources"].copy(),
+            "health": self.config.get("starting_health", 100),
+            "reputation": 0,
+            "injuries": [],
+            "lost_days": 0,
+            "trades": 0,
+            "trips": 0,
+            "travel_days": 0
         }
+        if self.content is not None:
+            for item, quantity in self.config["content"].get("starting_items", {}).items():
+                state["resources"][item] = state["resources"].get(item, 0) + quantity
+        return state
+    
+    def _event_engine(self):
+        """The event engine for this config, built on first use"""
+        if self._events is None:
+            from event_engine import EventEngine
+            
+            self._events = EventEngine(self.config, self.content, self._trait_choices,
+                                       self.world_events, self.travel)
+        return self._events
+    
+    def instrument(self, profile: Profile):
+        """Count and time the event handlers into profile
+        
+        The handlers are swapped for wrapped ones on this instance, so
+        simulators that are not instrumented pay nothing.
+        """
+        self.profile = profile
+        self._handle_encounter = profile.wrap("encounter", self._handle_encounter)
+        self._handle_hazard = profile.wrap("hazard", self._handle_hazard)
+        if self.travel is not None:
+            self.travel.depart = profile.wrap("trip", self.travel.depart)
+        self._world_check = profile.wrap("world_check", self._world_check)
+        if self.engine == "event":
+            events = self._event_engine()
+            events._encounter = profile.wrap("encounter", events._encounter)
+            events._road_encounter = profile.wrap("encounter", events._road_encounter)
+            events._hazard = profile.wrap("hazard", events._hazard)
+            events._world = profile.wrap("world_check", events._world)
+    
+    def _phase(self, name: str):
+        """Context timing a phase into the profile, if there is one"""
+        if self.profile is None:
+            return contextlib.nullcontext()
+        return self.profile.phase(name)
+    
+    def run_simulation(self, rng: Optional[random.Random] = None,
+                       harvest: Optional[Callable[[Dict, int], None]] = None) -> Dict:
+        """Run a single game simulation
+
+        harvest, if given, collects the run's farm produce for the n-th
+        harvest day (see farm.FarmHarvests.collect).
+        """
+        rng = rng or self.rng
+        state = self._new_state()
+        if self.engine == "event":
+            return self._event_engine().run(state, rng, harvest)
+        
+        max_health = state["health"]
+        state["world_events"] = []
+        pending_events = list(self.world_events)
+        # Last day of the trade run under way (0 at home) and the days its legs set off
+        away = 0
+        legs = ()
         
+        # Simplified simulation (would integrate with actual game logic)
         for day in range(1, self.config["max_days"] + 1):
             state["day"] = day
             
-            # Random events
-            if random.random() < self.config["encounter_rate"]:
-                self._handle_encounter(state)
-            
-            if random.random() < self.config["hazard_rate"]:
-                self._handle_hazard(state)
+            # Random events; on the road, a daily encounter and a hazard roll per leg
+            if day > away:
+                if rng.random() < self.config["encounter_rate"]:
+                    self._handle_encounter(state, rng)
+                
+                if rng.random() < self.config["hazard_rate"]:
+                    self._handle_hazard(state, rng)
+            else:
+                self._handle_encounter(state, rng)
+                if day in legs and rng.random() < self.travel.hazard_chance:
+                    self._handle_hazard(state, rng)
             
-            # Crop harvests (simplified)
+            # Crop harvests (simplified unless the run has a farm)
             if day % 10 == 0:
-                state["resources"]["coins"] += random.randint(5, 15)
+                if harvest is None:
+                    state["resources"]["coins"] += rng.randint(5, 15)
+                else:
+                    harvest(state, day // 10 - 1)
+            
+            # Trade runs leave from home; their road days follow on the clock
+            if self.travel is not None and day > away and day % self.travel.every == 0:
+                trip = self.travel.depart(state, rng)
+                if trip is not None:
+                    out, days = trip
+                    away, legs = day + days, (day + 1, day + out + 1)
             
             # Entropy drift
-            state["entropy_order"] += random.uniform(0.1, 0.5)
-            state["entropy_wild"] += random.uniform(0.1, 0.5)
+            state["entropy_order"] += rng.uniform(0.1, 0.5)
+            state["entropy_wild"] += rng.uniform(0.1, 0.5)
+            
+            # World events: each eligible one rolls its chance once a year
+            if pending_events and day % DAYS_PER_YEAR == 1:
+                self._world_check(state, rng, pending_events, (day - 1) // DAYS_PER_YEAR + 1)
             
             # Death check (simplified)
-            if state["day"] > 200 and random.random() < 0.01:
+            if state["day"] > 200 and rng.random() < 0.01:
+                state["dead"] = True
+                break
+            if state["health"] <= 0:
                 state["dead"] = True
                 break
             
+            # Content damage heals a little every day
+            if self._health_regen:
+                state["health"] = min(max_health, state["health"] + self._health_regen)
+            
             # Marriage (first time)
             if state["marriage_days"] is None and day > 50 and state["resources"]["coins"] > 100:
-                if random.random() < 0.05:
+                if rng.random() < 0.05:
                     state["marriage_days"] = day
             
             # Bankruptcy check
@@ -87,87 +268,262 @@ class BalanceSimulator:
         
         return state
     
-    def _handle_encounter(self, state: Dict):
+    def _world_check(self, state: Dict, rng: random.Random, pending: List, year: int):
+        """Yearly world event rolls; an event goes off at most once a run"""
+        for event in list(pending):
+            if event.eligible(state, year) and rng.random() < event.chance:
+                pending.remove(event)
+                event.apply(state)
+    
+    def _handle_encounter(self, state: Dict, rng: random.Random):
         """Handle random encounter"""
+        if self.content is not None:
+            self.content.roll_encounter(state, rng)
+            return
         # Simplified: sometimes lose items
-        if random.random() < 0.3:
-            state["resources"]["coins"] -= random.randint(1, 10)
+        if rng.random() < 0.3:
+            state["resources"]["coins"] -= rng.randint(1, 10)
     
-    def _handle_hazard(self, state: Dict):
+    def _handle_hazard(self, state: Dict, rng: random.Random):
         """Handle travel hazard"""
+        if self.content is not None:
+            self.content.roll_hazard(state, rng, self._trait_choices)
+            return
         # Simplified: costs resources
-        if random.random() < 0.5:
+        if rng.random() < 0.5:
             state["resources"]["food"] -= 1
         if state["resources"]["food"] < 0:
             state["bankrupt"] = True
     
-    def run_batch(self, num_runs: int = None) -> List[Dict]:
-        """Run multiple simulations"""
+    def run_batch(self, num_runs: int = None, workers: int = 1,
+                  report_path: Optional[str] = None, csv_output: bool = True,
+                  checkpoint: Optional[Checkpointer] = None,
+                  resume: bool = False) -> ResultTable:
+        """Run multiple simulations, optionally sharded across worker processes
+        
+        Every run draws from a stream derived from the master seed (for the
+        numpy engine, every shard does), so results are identical for any
+        number of workers.
+        
+        With report_path set, results stream to disk shard by shard (the CSV
+        report and its .columns directory) and are not kept in memory;
+        self.results is then the memory-mapped columns read back.
+        
+        A streamed batch can also save its progress through checkpoint, and
+        with resume it continues from the last checkpoint instead of
+        starting over; the output is the same as an uninterrupted batch's.
+        """
         if num_runs is None:
             num_runs = self.config["runs"]
+        shards = make_shards(num_runs, self._shard_size(num_runs, workers))
+        return self._run_shards(shards, workers, report_path, csv_output,
+                                checkpoint=checkpoint, resume=resume)
+    
+    def run_until(self, precision: float = 0.01, confidence: float = 0.95,
+                  max_runs: int = 100000, workers: int = 1,
+                  report_path: Optional[str] = None, csv_output: bool = True,
+                  checkpoint: Optional[Checkpointer] = None,
+                  resume: bool = False) -> ResultTable:
+        """Run simulations until the survival and bankruptcy CIs are tight enough
         
-        results = []
-        for i in range(num_runs):
-            result = self.run_simulation()
-            results.append(result)
-            if (i + 1) % 100 == 0:
-                print(f"Completed {i + 1}/{num_runs} simulations...")
-        
-        self.results = results
-        return results
+        Stops after the first shard at which both confidence intervals are
+        within +/- precision, or after max_runs. Shards have a fixed size
+        (config check_interval for the python engine, shard_size for numpy)
+        and are checked in order, so the stopping point is the same for any
+        number of workers.
+        """
+        if self.engine == "numpy":
+            shard_size = self.config.get("shard_size", 16384)
+        else:
+            shard_size = self.config.get("check_interval", 250)
+        shards = make_shards(max_runs, shard_size)
+        return self._run_shards(shards, workers, report_path, csv_output,
+                                stop=lambda summary: summary.is_precise(precision, confidence),
+                                plan={"precision": precision, "confidence": confidence},
+                                checkpoint=checkpoint, resume=resume)
     
-    def generate_report(self, output_path: str = "reports/balance_report.csv"):
-        """Generate CSV report from simulation results"""
-        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    def _run_shards(self, shards: List[Tuple[int, int]], workers: int,
+                    report_path: Optional[str], csv_output: bool,
+                    stop: Optional[Callable[[BatchSummary], bool]] = None,
+                    plan: Optional[Dict] = None, checkpoint: Optional[Checkpointer] = None,
+                    resume: bool = False) -> ResultTable:
+        """Run shards in order, folding each into self.summary, until stop says so
         
-        with open(output_path, 'w', newline='') as f:
-            writer = csv.writer(f)
-            
-            # Header
-            writer.writerow([
-                "Run", "Days", "Dead", "Marriage_Day", "Bankrupt",
-                "Final_Order", "Final_Wild", "Final_Coins"
-            ])
+        plan describes stop for matching checkpoints to the batch.
+        """
+        saved = None
+        if checkpoint is not None:
+            if report_path is None:
+                raise ValueError("Checkpoints need results streamed to a report_path")
+            if resume:
+                saved = checkpoint.load()
+                if self.seed is None:
+                    self.seed = saved["seed"]
+        if self.seed is None:
+            self.seed = random.SystemRandom().randrange(2 ** 63)
+            print(f"Master seed: {self.seed}")
+        total = sum(count for _, count in shards)
+        key = None
+        if checkpoint is not None:
+            # Python-engine runs draw from per-run streams, so a plain batch
+            # sized to the worker count has the same results however it is
+            # split; keying it on the run count lets it resume under any
+            # --workers. Numpy streams and stop checks follow the shards.
+            layout = shards if self.engine == "numpy" or stop is not None else total
+            key = batch_key(config=self.config, engine=self.engine, seed=self.seed,
+                            antithetic=self.antithetic, shards=layout, csv_output=csv_output,
+                            plan=plan)
+            if saved is not None and saved["key"] != key:
+                raise ValueError(f"{checkpoint.path} was saved by a different batch "
+                                 "(config, engine, seed or runs differ)")
+        
+        # Every run's (or numpy shard's) streams derive from the seed and its
+        # position, so resuming only needs to skip the runs already done
+        skipped = 0 if saved is None else saved["runs"]
+        if skipped:
+            print(f"Resuming after {skipped} runs")
+            shards = [
+                (max(start, skipped), start + count - max(start, skipped))
+                for start, count in shards if start + count > skipped
+            ]
+        task = functools.partial(_run_shard, self.config, self.engine, self.seed,
+                                 self.antithetic, self.profile is not None)
+        printer = ProgressPrinter(total)
+        parts = iter_sharded(task, shards, workers,
+                             lambda finished: printer(skipped + finished))
+        self.summary = BatchSummary() if saved is None else saved["summary"]
+        tables = []
+        writer = None
+        if report_path is not None:
+            metadata = {"engine": self.engine, "seed": self.seed}
+            writer = ResultWriter(report_path, csv_output=csv_output, metadata=metadata,
+                                  resume=None if saved is None else saved["position"])
+        try:
+            done = skipped
+            for table, summary, profile in parts:
+                done += len(table)
+                self.summary.merge(summary)
+                with self._phase("write"):
+                    if writer is None:
+                        tables.append(table)
+                    else:
+                        writer.write(table)
+                if profile is not None:
+                    self.profile.merge(profile)
+                    self.profile.tick(self.summary.runs - skipped)
+                if stop is not None and stop(self.summary):
+                    break
+                if checkpoint is not None and checkpoint.due():
+                    with self._phase("checkpoint"):
+                        checkpoint.save({"key": key, "seed": self.seed, "runs": done,
+                                         "summary": self.summary,
+                                         "position": writer.position()})
+        finally:
+            # Closing the generator cancels shards still queued in the pool
+            parts.close()
+            if writer is not None:
+                writer.close()
+        if checkpoint is not None:
+            checkpoint.clear()
+        
+        if writer is None:
+            self.results = ResultTable.concat(tables)
+        else:
+            self.results = load_results(report_path)
+        return self.results
+    
+    def _shard_size(self, num_runs: int, workers: int) -> int:
+        """Runs per shard"""
+        if self.engine == "numpy":
+            return self.config.get("shard_size", 16384)
+        # Per-run seeds make python results independent of sharding, so
+        # just keep every worker busy with a few shards each
+        return max(1, min(1000, -(-num_runs // (max(1, workers) * 4))))
+    
+    def run_shard(self, start: int, count: int) -> ResultTable:
+        """Run runs [start, start + count) of the batch seeded by self.seed"""
+        harvests = None
+        if self.farm is not None:
+            with self._phase("farm"):
+                harvests = self.farm.plant(self.seed, start, count).run(self.config["max_days"])
+        if self.engine == "numpy":
+            from vector_engine import NumpyEngine
             
-            # Data
-            for i, result in enumerate(self.results):
-                writer.writerow([
-                    i + 1,
-                    result["day"],
-                    result["dead"],
-                    result["marriage_days"] or "",
-                    result["bankrupt"],
-                    round(result["entropy_order"], 2),
-                    round(result["entropy_wild"], 2),
-                    result["resources"]["coins"]
-                ])
+            with self._phase("simulate"):
+                rng = np.random.default_rng(derive_seed(self.seed, "shard", start))
+                engine = NumpyEngine(self.config, antithetic=self.antithetic)
+                table = ResultTable(engine.run(count, rng,
+                                               None if harvests is None else harvests.coins))
+            report_progress(count)
+            return table
+        
+        make_rng = AntitheticRandom if self.antithetic else random.Random
+        results = []
+        with self._phase("simulate"):
+            for i in range(start, start + count):
+                harvest = (None if harvests is None
+                           else functools.partial(harvests.collect, run=i - start))
+                results.append(self.run_simulation(make_rng(derive_seed(self.seed, i)), harvest))
+                if len(results) % 100 == 0:
+                    report_progress(100)
+        report_progress(len(results) % 100)
+        with self._phase("results"):
+            return ResultTable.from_states(results)
+    
+    def generate_report(self, output_path: str = "reports/balance_report.csv",
+                        chunk_size: int = 65536):
+        """Generate CSV report (and .columns directory) from simulation results"""
+        metadata = {"engine": self.engine, "seed": self.seed}
+        with ResultWriter(output_path, metadata=metadata) as writer:
+            for start in range(0, len(self.results), chunk_size):
+                writer.write(self.results.slice(start, start + chunk_size))
         
         # Summary statistics
         self._print_summary()
     
-    def _print_summary(self):
+    def _print_summary(self, confidence: float = 0.95):
         """Print summary statistics"""
-        if not self.results:
+        if self.summary.runs != len(self.results):
+            self.summary = BatchSummary.from_table(self.results)
+        summary = self.summary
+        if not summary.runs:
             return
         
-        total = len(self.results)
-        avg_days = sum(r["day"] for r in self.results) / total
-        survival_rate = sum(1 for r in self.results if not r["dead"]) / total
-        avg_marriage_days = sum(
-            r["marriage_days"] for r in self.results if r["marriage_days"]
-        ) / max(1, sum(1 for r in self.results if r["marriage_days"]))
-        bankruptcy_rate = sum(1 for r in self.results if r["bankrupt"]) / total
-        avg_entropy_order = sum(r["entropy_order"] for r in self.results) / total
-        avg_entropy_wild = sum(r["entropy_wild"] for r in self.results) / total
+        level = f"{confidence:.0%} CI"
+        survival = summary.survival()
+        survival_rate = survival.rate
+        avg_marriage_days = summary.marriage_day.mean
+        bankruptcy_rate = summary.bankrupt.rate
+        
+        def mean(moments, fmt=".1f"):
+            low, high = moments.confidence_interval(confidence)
+            return f"{moments.mean:{fmt}} ({level} {low:{fmt}}-{high:{fmt}})"
+        
+        def rate(proportion):
+            low, high = proportion.confidence_interval(confidence)
+            return f"{proportion.rate:.1%} ({level} {low:.1%}-{high:.1%})"
+        
+        def percentiles(sketch):
+            return " ".join(
+                f"p{q * 100:.0f}={sketch.quantile(q):.0f}" for q in BatchSummary.PERCENTILES
+            )
         
         print("\n=== SIMULATION SUMMARY ===")
-        print(f"Total Runs: {total}")
-        print(f"Average Days: {avg_days:.1f}")
-        print(f"Survival Rate: {survival_rate:.1%}")
-        print(f"Average Days to First Marriage: {avg_marriage_days:.1f}")
-        print(f"Bankruptcy Rate: {bankruptcy_rate:.1%}")
-        print(f"Average Order Entropy: {avg_entropy_order:.1f}")
-        print(f"Average Wild Entropy: {avg_entropy_wild:.1f}")
+        print(f"Total Runs: {summary.runs}")
+        print(f"Average Days: {mean(summary.days)}")
+        print(f"Days Survived: {percentiles(summary.days_quantiles)}")
+        print(f"Survival Rate: {rate(survival)}")
+        print(f"Marriage Rate: {rate(summary.married)}")
+        print(f"Average Days to First Marriage: {mean(summary.marriage_day)}")
+        print(f"Bankruptcy Rate: {rate(summary.bankrupt)}")
+        print(f"Average Final Coins: {mean(summary.coins)}")
+        print(f"Final Coins: {percentiles(summary.coins_quantiles)}")
+        print(f"Average Order Entropy: {mean(summary.entropy_order)}")
+        print(f"Average Wild Entropy: {mean(summary.entropy_wild)}")
+        if self.content is not None:
+            print(f"Average Final Health: {mean(summary.health)}")
+            print(f"Average Reputation: {mean(summary.reputation)}")
+            print(f"Average Injuries: {mean(summary.injuries, '.2f')}")
         
         # Flag outliers
         if bankruptcy_rate > 0.3:
@@ -177,15 +533,105 @@ class BalanceSimulator:
         if avg_marriage_days > 200:
             print("⚠️  WARNING: Average marriage day > 200")
 
+def _run_shard(config: Dict, engine: str, seed: int, antithetic: bool, profiled: bool,
+               start: int, count: int):
+    """Worker entry point: run one shard of a batch and summarise (and profile) it"""
+    simulator = BalanceSimulator(config=config, engine=engine, seed=seed, antithetic=antithetic)
+    if profiled:
+        simulator.instrument(Profile())
+    table = simulator.run_shard(start, count)
+    with simulator._phase("summarise"):
+        summary = BatchSummary.from_table(table)
+    if profiled:
+        simulator.profile.count_results(table)
+    return table, summary, simulator.profile
+
 def main():
     """Main function"""
-    simulator = BalanceSimulator()
+    parser = argparse.ArgumentParser(description="Headless balance simulator")
+    parser.add_argument("--runs", type=int, default=1000, help="Number of runs")
+    parser.add_argument("--engine", choices=ENGINES, default="python",
+                        help="Simulation engine")
+    parser.add_argument("--seed", type=int, default=None, help="Master random seed")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes (0 = one per CPU)")
+    parser.add_argument("--report", default="reports/balance_report.csv",
+                        help="CSV report path; columns go next to it in <name>.columns/")
+    parser.add_argument("--no-csv", action="store_true",
+                        help="Only write the binary columns, not the CSV")
+    parser.add_argument("--content", action="store_true",
+                        help="Draw encounters and hazards from data/world (python/event engines)")
+    parser.add_argument("--farm", action="store_true",
+                        help="Replace the random harvest bump with a simulated farm grid")
+    parser.add_argument("--travel", action="store_true",
+                        help="Send runs on trade runs from home (python/event engines)")
+    parser.add_argument("--world-events", action="store_true",
+                        help="Play the yearly world events (python/event engines)")
+    parser.add_argument("--precision", type=float, default=None,
+                        help="Stop once the survival and bankruptcy CIs are within "
+                             "+/- this (--runs becomes the cap)")
+    parser.add_argument("--confidence", type=float, default=0.95,
+                        help="Confidence level for intervals and --precision")
+    parser.add_argument("--checkpoint-interval", type=float, default=60.0,
+                        help="Seconds between checkpoints of the batch (0 = none)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the batch from its last checkpoint")
+    parser.add_argument("--profile", action="store_true",
+                        help="Write phase timings and event counts to <report>.profile.json")
+    parser.add_argument("--cprofile", action="store_true",
+                        help="Also dump cProfile stats of this process to <report>.pstats")
+    args = parser.parse_args()
     
-    print("Running balance simulations...")
-    results = simulator.run_batch(1000)
+    config = BalanceSimulator().config
+    if args.content:
+        if args.engine == "numpy":
+            parser.error("--content needs --engine python or event")
+        config.setdefault("content", {})
+    if args.farm:
+        config.setdefault("farm", {})
+    if args.travel:
+        if args.engine == "numpy":
+            parser.error("--travel needs --engine python or event")
+        config.setdefault("travel", {})
+    if args.world_events:
+        if args.engine == "numpy":
+            parser.error("--world-events needs --engine python or event")
+        config.setdefault("world_events", DEFAULT_WORLD_EVENTS)
+    simulator = BalanceSimulator(engine=args.engine, seed=args.seed, config=config)
+    checkpoint = None
+    if args.checkpoint_interval > 0 or args.resume:
+        checkpoint = Checkpointer(checkpoint_path(args.report), args.checkpoint_interval)
+    if args.resume and not checkpoint.exists():
+        parser.error(f"--resume: no checkpoint at {checkpoint.path}")
     
-    print("\nGenerating report...")
-    simulator.generate_report("reports/balance_report.csv")
+    if args.profile or args.cprofile:
+        simulator.profile = Profile()
+    profiler = None
+    if args.cprofile:
+        import cProfile
+        
+        profiler = cProfile.Profile()
+        profiler.enable()
+    
+    print("Running balance simulations...")
+    print(f"Streaming results to {args.report}")
+    workers = args.workers or os.cpu_count()
+    if args.precision is None:
+        simulator.run_batch(args.runs, workers=workers,
+                            report_path=args.report, csv_output=not args.no_csv,
+                            checkpoint=checkpoint, resume=args.resume)
+    else:
+        simulator.run_until(args.precision, args.confidence, max_runs=args.runs,
+                            workers=workers, report_path=args.report,
+                            csv_output=not args.no_csv, checkpoint=checkpoint,
+                            resume=args.resume)
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(Path(args.report).with_suffix(".pstats"))
+    if simulator.profile is not None:
+        simulator.profile.write(profile_path(args.report))
+        print(f"Profile written to {profile_path(args.report)}")
+    simulator._print_summary(args.confidence)
     
     print("\nDone!")
 
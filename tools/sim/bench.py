@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the balance simulator
+Measures engine throughput, peak memory, worker scaling and report writing
+on fixed seeds and configs, and compares them against stored baselines
+"""
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from balance_simulator import BalanceSimulator
+from event_engine import DEFAULT_WORLD_EVENTS
+from results import COLUMNS, ResultTable, ResultWriter
+
+DEFAULT_BASELINE = "tools/sim/bench_baseline.json"
+DEFAULT_OUTPUT = "reports/bench.json"
+SEED = 20240601
+
+# Fail when a throughput drops, or the memory peak grows, by more than this
+DEFAULT_THRESHOLD = 0.25
+
+# The config every benchmark runs. It is a literal rather than the
+# simulator's defaults so that changing a default cannot quietly change the
+# workload a baseline was measured on; edit it only with a new baseline.
+BENCH_CONFIG = {
+    "runs": 1000,
+    "max_days": 500,
+    "crop_choices": ["Ironwheat", "Steamroot", "Cogbean"],
+    "encounter_rate": 0.3,
+    "hazard_rate": 0.2,
+    "shard_size": 16384,
+    "check_interval": 250,
+    "starting_health": 100,
+    "starting_resources": {"food": 10, "fuel": 5, "coins": 50},
+}
+
+
+class Benchmark:
+    """One named measurement
+
+    run() returns the metric; higher_is_better says which way a regression
+    goes. Throughput benchmarks keep the best of several repeats, since
+    noise only ever makes a run slower.
+    """
+
+    def __init__(self, name: str, unit: str, run: Callable[[], float],
+                 higher_is_better: bool = True, repeat: int = 3):
+        self.name = name
+        self.unit = unit
+        self.run = run
+        self.higher_is_better = higher_is_better
+        self.repeat = repeat
+
+    def measure(self) -> float:
+        """Best value over the repeats"""
+        values = [self.run() for _ in range(self.repeat)]
+        return max(values) if self.higher_is_better else min(values)
+
+
+def bench_config() -> Dict:
+    """A fresh copy of BENCH_CONFIG"""
+    return copy.deepcopy(BENCH_CONFIG)
+
+
+def _quiet(func: Callable, *args, **kwargs):
+    """Call func with its progress output swallowed"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def engine_throughput(engine: str, runs: int, sections: Optional[Dict] = None,
+                      workers: int = 1) -> Callable[[], float]:
+    """Runs/sec of an in-memory batch on engine, with extra config sections"""
+    config = bench_config()
+    config.update(copy.deepcopy(sections or {}))
+
+    def run() -> float:
+        simulator = BalanceSimulator(config=config, engine=engine, seed=SEED)
+        start = time.perf_counter()
+        _quiet(simulator.run_batch, runs, workers=workers)
+        return runs / (time.perf_counter() - start)
+
+    return run
+
+
+def streamed_memory(runs: int) -> Callable[[], float]:
+    """Peak traced MB of a numpy batch of runs streamed to a report"""
+    config = bench_config()
+
+    def run() -> float:
+        with tempfile.TemporaryDirectory() as directory:
+            simulator = BalanceSimulator(config=config, engine="numpy", seed=SEED)
+            tracemalloc.start()
+            try:
+                _quiet(simulator.run_batch, runs,
+                       report_path=os.path.join(directory, "bench.csv"))
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        return peak / 2 ** 20
+
+    return run
+
+
+def report_throughput(rows: int, csv_output: bool) -> Callable[[], float]:
+    """Rows/sec ResultWriter streams to disk, in 64k-row chunks"""
+    rng = np.random.default_rng(SEED)
+    table = ResultTable({
+        name: (rng.random(65536) * 500).astype(dtype) for name, dtype in COLUMNS.items()
+    })
+
+    def run() -> float:
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            with ResultWriter(os.path.join(directory, "bench.csv"),
+                              csv_output=csv_output) as writer:
+                for _ in range(rows // len(table)):
+                    writer.write(table)
+            return writer.rows / (time.perf_counter() - start)
+
+    return run
+
+
+def suite(max_workers: int) -> List[Benchmark]:
+    """Every benchmark, with worker scaling up to max_workers"""
+    benchmarks = [
+        Benchmark("python_runs_per_sec", "runs/s", engine_throughput("python", 2000)),
+        Benchmark("event_runs_per_sec", "runs/s", engine_throughput("event", 2000)),
+        Benchmark("numpy_runs_per_sec", "runs/s", engine_throughput("numpy", 100000)),
+        Benchmark("content_runs_per_sec", "runs/s",
+                  engine_throughput("python", 1000, {"content": {}})),
+        Benchmark("farm_runs_per_sec", "runs/s",
+                  engine_throughput("numpy", 20000, {"farm": {}})),
+        Benchmark("travel_runs_per_sec", "runs/s",
+                  engine_throughput("event", 2000, {"travel": {}})),
+        Benchmark("world_events_runs_per_sec", "runs/s",
+                  engine_throughput("event", 2000, {"world_events": DEFAULT_WORLD_EVENTS})),
+        Benchmark("numpy_peak_mb_per_100k", "MB", streamed_memory(100000),
+                  higher_is_better=False, repeat=1),
+        Benchmark("report_rows_per_sec", "rows/s", report_throughput(1 << 20, True)),
+        Benchmark("columns_rows_per_sec", "rows/s", report_throughput(1 << 22, False)),
+    ]
+    workers = 1
+    while workers <= max_workers:
+        benchmarks.append(Benchmark(f"numpy_workers_{workers}_runs_per_sec", "runs/s",
+                                    engine_throughput("numpy", 200000, workers=workers),
+                                    repeat=2))
+        workers *= 2
+    return benchmarks
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], benchmarks: List[Benchmark],
+            threshold: float) -> List[str]:
+    """Names of the benchmarks that regressed past threshold against baseline"""
+    regressions = []
+    for benchmark in benchmarks:
+        before = baseline.get(benchmark.name)
+        if not before or benchmark.name not in results:
+            continue
+        ratio = results[benchmark.name] / before
+        if benchmark.higher_is_better and ratio < 1 - threshold:
+            regressions.append(benchmark.name)
+        elif not benchmark.higher_is_better and ratio > 1 + threshold:
+            regressions.append(benchmark.name)
+    return regressions
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Balance simulator benchmarks")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON path")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT,
+                        help="Where to write this run's numbers")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store this run's numbers as the new baseline "
+                             "(required when there is none)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed regression as a fraction (default: 0.25)")
+    parser.add_argument("--max-workers", type=int, default=0,
+                        help="Largest worker count for the scaling runs (0 = one per CPU)")
+    parser.add_argument("--only", default=None,
+                        help="Only run benchmarks whose name contains this")
+    args = parser.parse_args()
+
+    benchmarks = suite(args.max_workers or os.cpu_count())
+    if args.only:
+        benchmarks = [b for b in benchmarks if args.only in b.name]
+    baseline = {}
+    if Path(args.baseline).exists():
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    print(f"{'Benchmark':<36}{'Result':>14}{'Baseline':>14}{'Change':>9}")
+    for benchmark in benchmarks:
+        value = results[benchmark.name] = benchmark.measure()
+        before = baseline.get(benchmark.name)
+        change = f"{value / before - 1:+.0%}" if before else ""
+        before = f"{before:,.1f}" if before else "-"
+        print(f"{benchmark.name:<36}{value:>14,.1f}{before:>14}{change:>9}  {benchmark.unit}")
+
+    def save(path: str, numbers: Dict[str, float]):
+        record = {
+            "seed": SEED,
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "cpus": os.cpu_count(),
+            "results": numbers,
+        }
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(record, f, indent=2)
+
+    save(args.output, results)
+    if args.save_baseline:
+        # Benchmarks left out with --only keep their old baseline
+        save(args.baseline, dict(baseline, **results))
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+    missing = [benchmark.name for benchmark in benchmarks if benchmark.name not in baseline]
+    if missing:
+        print(f"\nNo baseline for: {', '.join(missing)}")
+        print(f"Record one in {args.baseline} with --save-baseline (make bench-baseline)")
+        sys.exit(1)
+
+    regressions = compare(results, baseline, benchmarks, args.threshold)
+    if regressions:
+        print(f"\nRegressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Checkpoints for long balance simulator batches
+Periodically records how far a streamed batch has got so a killed or
+preempted job can pick up where it stopped instead of starting over
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import Dict
+
+# Bump when the saved state changes shape
+_CHECKPOINT_VERSION = 2
+
+
+def checkpoint_path(report_path: str) -> Path:
+    """Checkpoint file that goes with a CSV report path"""
+    return Path(report_path).with_suffix(".checkpoint")
+
+
+def batch_key(**batch) -> str:
+    """SHA-256 of everything that decides a batch's results, to match checkpoints to batches"""
+    data = json.dumps(batch, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+class Checkpointer:
+    """Saves a batch's progress every interval seconds
+
+    Runs and shards draw from streams derived from the master seed and
+    their index, so the random state of a batch is just its seed and how
+    many runs are done. A checkpoint holds those, the merged summary and
+    the writer's position (see results.ResultWriter.position); it is
+    written to a temp file and renamed, so a crash mid-save leaves the
+    previous one intact.
+    """
+
+    def __init__(self, path: Path, interval: float = 60.0):
+        self.path = Path(path)
+        self.interval = interval
+        self._last = time.monotonic()
+
+    def exists(self) -> bool:
+        """True if there is a checkpoint to resume from"""
+        return self.path.exists()
+
+    def due(self) -> bool:
+        """True once interval seconds have passed since the last save"""
+        return time.monotonic() - self._last >= self.interval
+
+    def save(self, state: Dict):
+        """Write a checkpoint, replacing the previous one"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(dict(state, version=_CHECKPOINT_VERSION), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._last = time.monotonic()
+
+    def load(self) -> Dict:
+        """Read the checkpoint back"""
+        with open(self.path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("version") != _CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint format in {self.path}")
+        return state
+
+    def clear(self):
+        """Remove the checkpoint once the batch is complete"""
+        if self.path.exists():
+            self.path.unlink()
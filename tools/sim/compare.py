@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Paired A/B comparison of balance simulator configs
+Runs a baseline and a candidate config on common random numbers and reports
+the per-run paired difference of every summary metric with its CI
+"""
+
+import argparse
+import copy
+import functools
+import json
+import os
+import random
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from balance_simulator import ENGINES, BalanceSimulator
+from parallel import ProgressPrinter, iter_sharded, make_shards
+from stats import Moments
+from sweep import set_path
+
+METRICS = ("survival", "bankruptcy", "marriage", "days", "coins",
+           "entropy_order", "entropy_wild")
+
+
+def run_metrics(table) -> Dict[str, np.ndarray]:
+    """Per-run values of every compared metric; rates are 0/1 indicators"""
+    return {
+        "survival": ~table["dead"],
+        "bankruptcy": table["bankrupt"],
+        "marriage": table["marriage_day"] >= 0,
+        "days": table["day"],
+        "coins": table["coins"],
+        "entropy_order": table["entropy_order"],
+        "entropy_wild": table["entropy_wild"],
+    }
+
+
+class PairedComparison:
+    """Moments of the baseline, the candidate and their per-run difference
+
+    Mergeable across shards like stats.BatchSummary.
+    """
+
+    def __init__(self):
+        self.baseline = {metric: Moments() for metric in METRICS}
+        self.candidate = {metric: Moments() for metric in METRICS}
+        self.difference = {metric: Moments() for metric in METRICS}
+
+    @property
+    def runs(self) -> int:
+        """Number of paired runs (antithetic pairs count once)"""
+        return self.difference[METRICS[0]].count
+
+    def update(self, baseline: Dict[str, np.ndarray], candidate: Dict[str, np.ndarray]):
+        """Fold in per-run metric values of aligned runs"""
+        for metric in METRICS:
+            base = np.asarray(baseline[metric], dtype=np.float64)
+            cand = np.asarray(candidate[metric], dtype=np.float64)
+            self.baseline[metric].update(base)
+            self.candidate[metric].update(cand)
+            self.difference[metric].update(cand - base)
+
+    def merge(self, other: "PairedComparison"):
+        """Combine with a comparison gathered elsewhere"""
+        for metric in METRICS:
+            self.baseline[metric].merge(other.baseline[metric])
+            self.candidate[metric].merge(other.candidate[metric])
+            self.difference[metric].merge(other.difference[metric])
+
+    def rows(self, confidence: float = 0.95) -> List[Dict]:
+        """One row per metric: means, paired difference, CI and variance reduction
+
+        variance_reduction is how many times more runs two independent batches
+        would need for the same CI width on the difference.
+        """
+        rows = []
+        for metric in METRICS:
+            difference = self.difference[metric]
+            low, high = difference.confidence_interval(confidence)
+            independent = self.baseline[metric].variance + self.candidate[metric].variance
+            rows.append({
+                "metric": metric,
+                "baseline": self.baseline[metric].mean,
+                "candidate": self.candidate[metric].mean,
+                "difference": difference.mean,
+                "low": low,
+                "high": high,
+                "variance_reduction": (independent / difference.variance
+                                       if difference.variance > 0 else float("inf")),
+            })
+        return rows
+
+
+def _simulate(config: Dict, engine: str, seed: int, antithetic: bool,
+              start: int, count: int) -> Dict[str, np.ndarray]:
+    """Per-run metrics of one shard; antithetic pairs are averaged"""
+    metrics = run_metrics(
+        BalanceSimulator(config=config, engine=engine, seed=seed).run_shard(start, count)
+    )
+    if antithetic:
+        mirrored = run_metrics(
+            BalanceSimulator(config=config, engine=engine, seed=seed,
+                             antithetic=True).run_shard(start, count)
+        )
+        metrics = {
+            metric: (values.astype(np.float64) + mirrored[metric]) / 2
+            for metric, values in metrics.items()
+        }
+    return metrics
+
+
+def _compare_shard(baseline: Dict, candidate: Dict, engine: str, seed: int,
+                   antithetic: bool, start: int, count: int) -> PairedComparison:
+    """Worker entry point: run one shard of both configs on the same streams"""
+    comparison = PairedComparison()
+    comparison.update(_simulate(baseline, engine, seed, antithetic, start, count),
+                      _simulate(candidate, engine, seed, antithetic, start, count))
+    return comparison
+
+
+def compare(baseline: Dict, candidate: Dict, runs: int = 1000, seed: Optional[int] = None,
+            engine: str = "numpy", antithetic: bool = False,
+            workers: int = 1) -> PairedComparison:
+    """Compare two configs run by run on common random numbers
+
+    Run i of both configs draws from the same seeded stream, so most of the
+    run-to-run noise cancels in the difference. The numpy engine keeps every
+    draw aligned between configs; the python engine shares each run's stream
+    but drifts apart once the configs take different branches, so it
+    benefits less. With antithetic, every run is paired with its mirrored
+    run and runs counts pairs (four simulations each).
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+    if seed is None:
+        seed = random.SystemRandom().randrange(2 ** 63)
+        print(f"Master seed: {seed}")
+
+    shard_size = BalanceSimulator(config=baseline, engine=engine)._shard_size(runs, workers)
+    task = functools.partial(_compare_shard, baseline, candidate, engine, seed, antithetic)
+    simulations = runs * (4 if antithetic else 2)
+    comparison = PairedComparison()
+    for part in iter_sharded(task, make_shards(runs, shard_size), workers,
+                             ProgressPrinter(simulations)):
+        comparison.merge(part)
+    return comparison
+
+
+def print_comparison(comparison: PairedComparison, confidence: float = 0.95):
+    """Print the paired comparison table"""
+    level = f"{confidence:.0%} CI"
+    print(f"\n=== PAIRED COMPARISON ({comparison.runs} paired runs) ===")
+    print(f"{'Metric':<15}{'Baseline':>11}{'Candidate':>11}{'Difference':>12}"
+          f"  {level:<22}{'Var. reduction':>14}")
+    for row in comparison.rows(confidence):
+        interval = f"[{row['low']:+.4f}, {row['high']:+.4f}]"
+        significant = "*" if row["low"] > 0 or row["high"] < 0 else " "
+        reduction = row["variance_reduction"]
+        reduction = f"{reduction:.1f}x" if np.isfinite(reduction) else "n/a"
+        print(f"{row['metric']:<15}{row['baseline']:>11.4f}{row['candidate']:>11.4f}"
+              f"{row['difference']:>+12.4f}{significant} {interval:<22}{reduction:>14}")
+    print("* interval excludes zero")
+
+
+def _parse_override(text: str):
+    """Parse a --set key=value override; values are JSON where possible"""
+    key, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Expected key=value, got '{text}'")
+    try:
+        return key, json.loads(value)
+    except json.JSONDecodeError:
+        return key, value
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Paired A/B comparison of simulator configs")
+    parser.add_argument("--baseline", default="data/sim_config.json",
+                        help="Baseline config (default config if missing)")
+    parser.add_argument("--candidate", default=None,
+                        help="Candidate config (default: the baseline)")
+    parser.add_argument("--set", type=_parse_override, action="append", default=[],
+                        metavar="KEY=VALUE",
+                        help="Override a dotted config key in the candidate (repeatable)")
+    parser.add_argument("--runs", type=int, default=1000, help="Paired runs")
+    parser.add_argument("--engine", choices=ENGINES, default="numpy", help="Simulation engine")
+    parser.add_argument("--seed", type=int, default=None, help="Master random seed")
+    parser.add_argument("--antithetic", action="store_true",
+                        help="Pair every run with its mirrored run")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes (0 = one per CPU)")
+    parser.add_argument("--confidence", type=float, default=0.95, help="Confidence level")
+    args = parser.parse_args()
+
+    baseline = BalanceSimulator(config_path=args.baseline).config
+    candidate = (BalanceSimulator(config_path=args.candidate).config
+                 if args.candidate else copy.deepcopy(baseline))
+    for key, value in args.set:
+        set_path(candidate, key, value)
+
+    comparison = compare(baseline, candidate, runs=args.runs, seed=args.seed,
+                         engine=args.engine, antithetic=args.antithetic,
+                         workers=args.workers or os.cpu_count())
+    print_comparison(comparison, args.confidence)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Data-driven encounters and hazards for the balance simulator
+Loads data/world/encounters.json and hazards.json once and compiles them into
+alias-method samplers and precompiled effects, mirroring EncounterTable.gd,
+HazardResolver.gd and WorldController._handle_encounter
+"""
+
+import functools
+import random
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from datapack import load_json
+
+DEFAULT_ENCOUNTERS = "data/world/encounters.json"
+DEFAULT_HAZARDS = "data/world/hazards.json"
+
+# Health a run recovers per day (resting at home between trips), up to its
+# starting health. Damage then only kills when it comes in clusters: with
+# none, the machine beasts alone (15 damage, about 1 encounter in 7) wear
+# every run down to 0 by day 150 or so.
+DEFAULT_HEALTH_REGEN = 1
+
+
+class AliasTable:
+    """Vose alias table: O(1) weighted sampling however many entries there are"""
+
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        if not n:
+            raise ValueError("AliasTable needs at least one weight")
+        total = float(sum(weights))
+        if total <= 0:
+            raise ValueError("AliasTable weights must sum to a positive value")
+        scaled = [w * n / total for w in weights]
+        self.probability = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Whatever is left over is 1.0 up to rounding
+        self._probability = np.array(self.probability)
+        self._alias = np.array(self.alias)
+
+    def __len__(self) -> int:
+        return len(self.probability)
+
+    def sample(self, rng: random.Random) -> int:
+        """Draw one index; one uniform picks both the column and the coin"""
+        u = rng.random() * len(self.probability)
+        column = int(u)
+        return column if u - column < self.probability[column] else self.alias[column]
+
+    def sample_many(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """Draw size indices at once"""
+        u = rng.random(size) * len(self.probability)
+        column = u.astype(np.int64)
+        return np.where(u - column < self._probability[column], column, self._alias[column])
+
+
+class Effect:
+    """An encounter effect or hazard outcome compiled to plain tuples
+
+    Item changes follow Player.add_item / remove_item: a removal that the
+    inventory cannot cover is skipped, so counts never go negative. Items
+    listed without quantities lose int(randf_range(1, 3)), i.e. 1 or 2.
+    """
+
+    __slots__ = ("gains", "losses", "random_losses", "injury", "heal",
+                 "reputation", "damage", "lose_days", "trade")
+
+    def __init__(self, effects: Dict, heal_key: str):
+        lose_items = effects.get("lose_items", {})
+        if isinstance(lose_items, dict):
+            self.losses = tuple(lose_items.items())
+            self.random_losses = ()
+        else:
+            self.losses = ()
+            self.random_losses = tuple(lose_items)
+        self.gains = tuple(effects.get("gain_items", {}).items())
+        self.injury = effects.get("injury")
+        self.heal = bool(effects.get(heal_key, False))
+        self.reputation = effects.get("reputation_gain", 0) - effects.get("reputation_loss", 0)
+        self.damage = effects.get("damage", 0)
+        self.lose_days = effects.get("lose_days", 0)
+        self.trade = bool(effects.get("trade_opportunity", False))
+
+    def apply(self, state: Dict, rng: random.Random):
+        """Apply to a run state"""
+        inventory = state["resources"]
+        for item, quantity in self.losses:
+            if inventory.get(item, 0) >= quantity:
+                inventory[item] -= quantity
+        for item in self.random_losses:
+            quantity = rng.randint(1, 2)
+            if inventory.get(item, 0) >= quantity:
+                inventory[item] -= quantity
+        for item, quantity in self.gains:
+            inventory[item] = inventory.get(item, 0) + quantity
+        if self.injury is not None and self.injury not in state["injuries"]:
+            state["injuries"].append(self.injury)
+        if self.heal and state["injuries"]:
+            state["injuries"].pop()
+        state["reputation"] += self.reputation
+        state["health"] -= self.damage
+        state["lost_days"] += self.lose_days
+        state["trades"] += self.trade
+
+
+class Choice:
+    """A hazard choice with its requirements split into trait and item checks"""
+
+    __slots__ = ("id", "traits", "items", "success_chance", "success", "failure")
+
+    def __init__(self, choice: Dict):
+        requires = choice.get("requires", {})
+        self.id = choice["id"]
+        self.traits = tuple(requires.get("traits", ()))
+        self.items = tuple(requires.get("items", {}).items())
+        self.success_chance = choice.get("success_chance", 1.0)
+        self.success = Effect(choice.get("success", {}), heal_key="rest")
+        self.failure = Effect(choice.get("failure", {}), heal_key="rest")
+
+    def has_traits(self, traits: Sequence[str]) -> bool:
+        """Trait check with HazardResolver's substring matching"""
+        return all(
+            any(required in trait or trait in required for trait in traits)
+            for required in self.traits
+        )
+
+    def has_items(self, inventory: Dict) -> bool:
+        """Item check against the run's inventory"""
+        for item, quantity in self.items:
+            if inventory.get(item, 0) < quantity:
+                return False
+        return True
+
+
+class TraitChoices:
+    """Per hazard, the choices a trait set allows, picked uniformly
+
+    This is the default simulated player. Choices are filtered by traits
+    once, since traits never change during a run, and by items at roll
+    time. As in HazardResolver.get_available_choices, if nothing is
+    available then every choice is. Other players (policy.RankedChoices)
+    provide the same pick().
+    """
+
+    def __init__(self, hazards: List[Tuple[Choice, ...]], traits: Sequence[str]):
+        self.hazards = hazards
+        self.allowed = [tuple(choice for choice in choices if choice.has_traits(traits))
+                        for choices in hazards]
+
+    def __getitem__(self, index: int) -> Tuple[Choice, ...]:
+        return self.allowed[index]
+
+    def pick(self, index: int, inventory: Dict, u: float) -> Choice:
+        """The choice made at hazard index, given the inventory and a uniform draw"""
+        available = [choice for choice in self.allowed[index] if choice.has_items(inventory)]
+        if not available:
+            available = self.hazards[index]
+        return available[int(u * len(available))]
+
+
+class Content:
+    """Compiled encounter and hazard tables
+
+    Encounters are drawn by weight and hazards uniformly, both through alias
+    tables. Which choice a hazard gets is up to the player passed to
+    roll_hazard (TraitChoices by default).
+    """
+
+    def __init__(self, encounters: List[Dict], hazards: List[Dict]):
+        self.encounter_ids = [encounter["id"] for encounter in encounters]
+        self.encounters = [Effect(e.get("effects", {}), heal_key="heal_injury")
+                           for e in encounters]
+        self.encounter_table = AliasTable([e.get("weight", 1.0) for e in encounters])
+        self.hazard_ids = [hazard["id"] for hazard in hazards]
+        self.hazards = [tuple(Choice(c) for c in h.get("choices", ())) for h in hazards]
+        self.hazard_table = AliasTable([h.get("weight", 1.0) for h in hazards])
+        self._trait_choices = {}
+
+    def choices_for(self, traits: Sequence[str]) -> TraitChoices:
+        """The default player for a trait set: uniform among the allowed choices"""
+        key = frozenset(traits)
+        if key not in self._trait_choices:
+            self._trait_choices[key] = TraitChoices(self.hazards, traits)
+        return self._trait_choices[key]
+
+    def roll_encounter(self, state: Dict, rng: random.Random) -> int:
+        """Draw an encounter, apply its effects and return its index"""
+        index = self.encounter_table.sample(rng)
+        self.encounters[index].apply(state, rng)
+        return index
+
+    def roll_hazard(self, state: Dict, rng: random.Random,
+                    trait_choices: TraitChoices) -> Tuple[int, Choice, bool]:
+        """Draw a hazard, let the player pick a choice and resolve it
+
+        Returns (hazard, choice, success).
+        """
+        index = self.hazard_table.sample(rng)
+        choice = trait_choices.pick(index, state["resources"], rng.random())
+        success = rng.random() < choice.success_chance
+        (choice.success if success else choice.failure).apply(state, rng)
+        return index, choice, success
+
+
+@functools.lru_cache(maxsize=None)
+def load_content(encounters_path: str = DEFAULT_ENCOUNTERS,
+                 hazards_path: str = DEFAULT_HAZARDS) -> Content:
+    """Load and compile content; cached, so each process parses the files once"""
+    return Content(load_json(encounters_path), load_json(hazards_path))
+
+
+def health_regen(settings: Optional[Dict]) -> int:
+    """Daily health recovery from a config's content section"""
+    return (settings or {}).get("health_regen", DEFAULT_HEALTH_REGEN)
+
+
+def content_paths(settings: Optional[Dict]) -> Tuple[str, str]:
+    """(encounters, hazards) paths from a config's content section"""
+    settings = settings or {}
+    return (settings.get("encounters", DEFAULT_ENCOUNTERS),
+            settings.get("hazards", DEFAULT_HAZARDS))
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Compiled data pack for the Python tools
+Validates every data/**/*.json once and packs them into a single file that
+tools map and decode on demand, rebuilt only when a source file changes
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+DATA_DIR = "data"
+DEFAULT_PACK = "reports/data.pack"
+
+# Bump when the pack layout changes
+_PACK_VERSION = 1
+_MAGIC = b"EMBRPACK"
+_PREFIX = struct.Struct("<8sII")
+
+_NUMBER = (int, float)
+
+
+def records(key: str, required: Optional[Dict] = None, optional: Optional[Dict] = None) -> Dict:
+    """Schema of a file holding a list of records identified by their key field"""
+    return {"key": key, "required": dict(required or {}, **{key: str}),
+            "optional": optional or {}}
+
+
+# Schemas of the files the simulator reads, by path under DATA_DIR. Other
+# files only have to be valid JSON.
+SCHEMAS = {
+    "crops.json": records("name", optional={
+        "growth_stages": int, "days_per_stage": int, "output": list,
+        "likes": list, "hates": list}),
+    "soil_types.json": records("name"),
+    "marriage_terms.json": records("faction", optional={
+        "dowry": dict, "obligations": dict, "benefits": dict}),
+    "buildings/buildings.json": records("id", optional={"recipes": list, "cost": dict}),
+    "buildings/recipes.json": records("name", {"building": str}, {
+        "in": dict, "out": dict, "time": int}),
+    "world/goods.json": records("id"),
+    "world/settlements.json": records("id", optional={
+        "stock": list, "base_prices": dict, "factions": list, "attitude": dict}),
+    "world/regions.json": records("id", optional={
+        "position": dict, "connections": list, "type": str}),
+    "world/encounters.json": records("id", optional={"weight": _NUMBER, "effects": dict}),
+    "world/hazards.json": records("id", optional={"weight": _NUMBER, "choices": list}),
+    "world/events/world_events.json": records("id", optional={
+        "trigger_conditions": dict, "effects": dict}),
+}
+
+
+class DataError(ValueError):
+    """Raised when data files fail validation; lists every problem found"""
+
+    def __init__(self, problems: List[str]):
+        super().__init__("Invalid data:\n  " + "\n  ".join(problems))
+        self.problems = problems
+
+
+def validate(name: str, document, schema: Dict) -> List[str]:
+    """Problems with a parsed document against its schema (empty if none)"""
+    if not isinstance(document, list):
+        return [f"{name}: expected a list of records"]
+    problems = []
+    seen = set()
+    for index, record in enumerate(document):
+        where = f"{name}[{index}]"
+        if not isinstance(record, dict):
+            problems.append(f"{where}: expected an object")
+            continue
+        for field, kind in schema["required"].items():
+            if field not in record:
+                problems.append(f"{where}: missing '{field}'")
+            elif not _is(record[field], kind):
+                problems.append(f"{where}.{field}: expected {_kind_name(kind)}")
+        for field, kind in schema["optional"].items():
+            if field in record and not _is(record[field], kind):
+                problems.append(f"{where}.{field}: expected {_kind_name(kind)}")
+        key = record.get(schema["key"])
+        if key in seen:
+            problems.append(f"{where}: duplicate {schema['key']} '{key}'")
+        seen.add(key)
+    return problems
+
+
+def _is(value, kind) -> bool:
+    kinds = kind if isinstance(kind, tuple) else (kind,)
+    # bool is an int subclass, but true/false is never a valid number
+    if isinstance(value, bool) and bool not in kinds:
+        return False
+    return isinstance(value, kinds)
+
+
+def _kind_name(kind) -> str:
+    kinds = kind if isinstance(kind, tuple) else (kind,)
+    return " or ".join(k.__name__ for k in kinds)
+
+
+def _intern(value):
+    """value with every string interned
+
+    marshal then stores each string once per document and loading
+    interns them again, so repeated keys and IDs share one object.
+    """
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return [_intern(item) for item in value]
+    if isinstance(value, dict):
+        return {sys.intern(key): _intern(item) for key, item in value.items()}
+    return value
+
+
+def _sources(data_dir: str) -> Dict[str, Tuple[int, int]]:
+    """Every JSON file under data_dir with its (mtime_ns, size)"""
+    sources = {}
+    for path in sorted(Path(data_dir).rglob("*.json")):
+        stat = path.stat()
+        sources[path.relative_to(data_dir).as_posix()] = (stat.st_mtime_ns, stat.st_size)
+    return sources
+
+
+def _environment() -> List:
+    """What the pack's encoding depends on besides the data"""
+    return [_PACK_VERSION, marshal.version, list(sys.version_info[:2])]
+
+
+def build_pack(data_dir: str = DATA_DIR, pack_path: str = DEFAULT_PACK) -> "DataPack":
+    """Validate and compile every JSON file under data_dir into pack_path
+
+    Raises DataError listing every unparsable file and schema violation.
+    """
+    sources = _sources(data_dir)
+    problems = []
+    blobs, hashes, ids = {}, {}, {}
+    for name in sources:
+        raw = (Path(data_dir) / name).read_bytes()
+        hashes[name] = hashlib.sha256(raw).hexdigest()
+        try:
+            document = json.loads(raw)
+        except ValueError as error:
+            problems.append(f"{name}: {error}")
+            continue
+        schema = SCHEMAS.get(name)
+        if schema is not None:
+            found = validate(name, document, schema)
+            problems.extend(found)
+            if not found:
+                ids[name] = {record[schema["key"]]: i for i, record in enumerate(document)}
+        blobs[name] = marshal.dumps(_intern(document))
+    missing = [name for name in SCHEMAS if name not in sources]
+    problems.extend(f"{name}: missing" for name in missing)
+    if problems:
+        raise DataError(problems)
+
+    documents, offset = {}, 0
+    for name, blob in blobs.items():
+        documents[name] = [offset, len(blob)]
+        offset += len(blob)
+    header = json.dumps({
+        "environment": _environment(),
+        "sources": {name: [*sources[name], hashes[name]] for name in sources},
+        "documents": documents,
+        "ids": ids,
+    }, separators=(",", ":")).encode()
+
+    path = Path(pack_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(_MAGIC, _PACK_VERSION, len(header)))
+        f.write(header)
+        for blob in blobs.values():
+            f.write(blob)
+    os.replace(tmp, path)
+    return DataPack(path)
+
+
+class DataPack:
+    """A compiled pack, memory-mapped
+
+    Documents are decoded from the mapping only when asked for, and every
+    process mapping the same file shares its pages. ids(name) gives the
+    integer ID of each record of a schema'd file by its key field (its
+    position in the file).
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, length = _PREFIX.unpack_from(self._map)
+        if magic != _MAGIC or version != _PACK_VERSION:
+            raise ValueError(f"{self.path} is not a version {_PACK_VERSION} data pack")
+        header = json.loads(self._map[_PREFIX.size:_PREFIX.size + length])
+        self.environment = header["environment"]
+        self.sources = header["sources"]
+        self.documents = header["documents"]
+        self._ids = header["ids"]
+        self._base = _PREFIX.size + length
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.documents
+
+    def load(self, name: str):
+        """A fresh copy of the document at name (a path under the data directory)"""
+        offset, length = self.documents[name]
+        start = self._base + offset
+        return marshal.loads(self._map[start:start + length])
+
+    def ids(self, name: str) -> Dict[str, int]:
+        """{record key: integer ID} of a schema'd file"""
+        return self._ids[name]
+
+    def is_current(self, data_dir: str = DATA_DIR) -> bool:
+        """True if the pack was built from the files now in data_dir
+
+        Files whose mtime or size changed are hashed, so touching a file
+        without editing it does not count as a change.
+        """
+        if self.environment != _environment():
+            return False
+        sources = _sources(data_dir)
+        if sources.keys() != self.sources.keys():
+            return False
+        for name, (mtime, size) in sources.items():
+            packed_mtime, packed_size, digest = self.sources[name]
+            if (mtime, size) == (packed_mtime, packed_size):
+                continue
+            raw = (Path(data_dir) / name).read_bytes()
+            if hashlib.sha256(raw).hexdigest() != digest:
+                return False
+        return True
+
+
+@functools.lru_cache(maxsize=None)
+def open_pack(data_dir: str = DATA_DIR, pack_path: str = DEFAULT_PACK) -> DataPack:
+    """The current pack for data_dir, rebuilt first if any source changed; cached per process"""
+    if Path(pack_path).exists():
+        try:
+            pack = DataPack(Path(pack_path))
+            if pack.is_current(data_dir):
+                return pack
+        except ValueError:
+            pass
+    return build_pack(data_dir, pack_path)
+
+
+@functools.lru_cache(maxsize=None)
+def _loader_pack() -> Optional[DataPack]:
+    """open_pack() for load_json, or None (said once) when data/ does not compile"""
+    try:
+        return open_pack()
+    except (DataError, OSError) as error:
+        print(f"Data pack not built, reading data files directly: {error}", file=sys.stderr)
+        return None
+
+
+def load_json(path: str):
+    """Parsed contents of a JSON file, from the data pack if it is a data file
+
+    Paths outside the data directory (custom content, configs) are read
+    directly, and so is everything when the pack cannot be built: a
+    broken file elsewhere in data/ only fails the tools that read it.
+    """
+    try:
+        name = Path(path).resolve().relative_to(Path(DATA_DIR).resolve()).as_posix()
+    except ValueError:
+        name = None
+    if name is not None:
+        pack = _loader_pack()
+        if pack is not None and name in pack:
+            return pack.load(name)
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Validate and compile data/ into a data pack")
+    parser.add_argument("--data", default=DATA_DIR, help="Data directory")
+    parser.add_argument("--pack", default=DEFAULT_PACK, help="Pack path")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if up to date")
+    args = parser.parse_args()
+
+    try:
+        if args.force:
+            pack = build_pack(args.data, args.pack)
+        else:
+            pack = open_pack(args.data, args.pack)
+    except DataError as error:
+        print(error)
+        sys.exit(1)
+    size = pack.path.stat().st_size
+    print(f"{pack.path}: {len(pack.documents)} files, {size / 1024:.1f} KiB, all valid")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Production-chain and market economy for the balance simulator
+Compiles recipes.json into input/output matrices and settlements.json into
+price tables, then steps production, consumption and trade for a whole batch
+of runs at once
+"""
+
+import argparse
+import copy
+import functools
+import os
+import random
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from datapack import load_json
+from parallel import ProgressPrinter, derive_seed, iter_sharded, make_shards, report_progress
+from stats import Moments, QuantileSketch
+
+DEFAULT_PATHS = {
+    "recipes": "data/buildings/recipes.json",
+    "buildings": "data/buildings/buildings.json",
+    "settlements": "data/world/settlements.json",
+    "goods": "data/world/goods.json",
+}
+
+# SettlementController: -2% per attitude point, capped at 50%-150%; items in
+# stock without a base price cost 10; selling pays 60% of the buy price
+_ATTITUDE_STEP = 0.02
+_PRICE_BOUNDS = (0.5, 1.5)
+_DEFAULT_PRICE = 10
+_SELL_FRACTION = 0.6
+# Stock of each item when a settlement is visited: randf_range(5, 20), of
+# which buy_item lets int(stock) units go
+_STOCK_RANGE = (5.0, 20.0)
+
+# The economy section used when the config has none: a boiler feeding a
+# condenser, with steamroot to process (it is not sold anywhere) and fuel
+# and steam crystals traded at the ash caravan and Brassford
+DEFAULT_ECONOMY = {
+    "owned": ["boiler", "condenser"],
+    "starting_items": {"steamroot": 40},
+    "trade_interval": 10,
+}
+
+# Marks a building with no recipe in progress
+_IDLE = -1
+
+
+class Market:
+    """Recipes, goods and settlement prices compiled to arrays
+
+    Goods get integer ids; recipes become (recipe, good) input and output
+    matrices, and settlements become base price, stock and faction
+    membership tables so prices for every run come out of one expression.
+    """
+
+    def __init__(self, recipes: List[Dict], buildings: List[Dict],
+                 settlements: List[Dict], goods: List[Dict]):
+        names = [good["id"] for good in goods]
+        for recipe in recipes:
+            names += list(recipe.get("in", {})) + list(recipe.get("out", {}))
+        for settlement in settlements:
+            names += settlement.get("stock", []) + list(settlement.get("base_prices", {}))
+        for building in buildings:
+            names += list(building.get("cost", {}))
+        self.goods = list(dict.fromkeys(name for name in names if name != "coins"))
+        self.good_ids = {name: i for i, name in enumerate(self.goods)}
+
+        self.recipe_names = [recipe["name"] for recipe in recipes]
+        self.recipe_buildings = [recipe["building"] for recipe in recipes]
+        self.inputs = self._matrix([recipe.get("in", {}) for recipe in recipes])
+        self.outputs = self._matrix([recipe.get("out", {}) for recipe in recipes])
+        self.time = np.array([recipe.get("time", 1) for recipe in recipes], dtype=np.int64)
+
+        self.settlement_ids = [settlement["id"] for settlement in settlements]
+        self.factions = list(dict.fromkeys(
+            faction for settlement in settlements
+            for faction in list(settlement.get("attitude", {})) + settlement.get("factions", [])
+        ))
+        faction_ids = {name: i for i, name in enumerate(self.factions)}
+        # Every (settlement, item) pair on sale is a listing; prices are
+        # computed per listing rather than over the mostly empty
+        # settlement x good grid
+        settlement_of, good_of, base = [], [], []
+        # Attitude toward the player only counts the settlement's own factions
+        self.members = np.zeros((len(self.factions), len(settlements)))
+        self.base_attitude = np.zeros(len(settlements))
+        for s, settlement in enumerate(settlements):
+            prices = settlement.get("base_prices", {})
+            for item in settlement.get("stock", []):
+                settlement_of.append(s)
+                good_of.append(self.good_ids[item])
+                base.append(prices.get(item, _DEFAULT_PRICE))
+            for faction in settlement.get("factions", []):
+                self.members[faction_ids[faction], s] = 1
+                self.base_attitude[s] += settlement.get("attitude", {}).get(faction, 0)
+        self.listing_settlement = np.array(settlement_of, dtype=np.int64)
+        self.listing_good = np.array(good_of, dtype=np.int64)
+        self.listing_price = np.array(base, dtype=np.float64)
+        self.listings = {
+            good: np.flatnonzero(self.listing_good == good) for good in set(good_of)
+        }
+
+    def _matrix(self, rows: List[Dict]) -> np.ndarray:
+        return np.array([self.vector(row) for row in rows]).reshape(len(rows), len(self.goods))
+
+    def vector(self, quantities: Dict) -> np.ndarray:
+        """Goods vector from an {item: quantity} dict"""
+        vector = np.zeros(len(self.goods), dtype=np.int64)
+        for item, quantity in quantities.items():
+            if item in self.good_ids:
+                vector[self.good_ids[item]] = quantity
+        return vector
+
+    def buy_prices(self, reputation: np.ndarray) -> np.ndarray:
+        """(run, listing) buy prices given (run, faction) reputation"""
+        attitude = self.base_attitude + reputation @ self.members
+        modifier = np.clip(1.0 - attitude * _ATTITUDE_STEP, *_PRICE_BOUNDS)
+        return np.floor(self.listing_price * modifier[:, self.listing_settlement])
+
+    def sell_prices(self, reputation: np.ndarray) -> np.ndarray:
+        """(run, listing) prices the settlements pay for goods they stock"""
+        return np.floor(self.buy_prices(reputation) * _SELL_FRACTION)
+
+    def best_listing(self, prices: np.ndarray, good: int, highest: bool):
+        """(price, listing) per run of the highest or lowest priced listing of good"""
+        listings = self.listings[good]
+        if len(listings) == 1:
+            return prices[:, listings[0]], np.full(len(prices), listings[0])
+        offers = prices[:, listings]
+        pick = offers.argmax(axis=1) if highest else offers.argmin(axis=1)
+        return offers[np.arange(len(prices)), pick], listings[pick]
+
+
+@functools.lru_cache(maxsize=None)
+def load_market(recipes: str = DEFAULT_PATHS["recipes"],
+                buildings: str = DEFAULT_PATHS["buildings"],
+                settlements: str = DEFAULT_PATHS["settlements"],
+                goods: str = DEFAULT_PATHS["goods"]) -> Market:
+    """Load and compile the economy data; cached per process"""
+    return Market(*(load_json(path) for path in (recipes, buildings, settlements, goods)))
+
+
+class EconomySimulator:
+    """Runs production and trade for a batch of runs as (run, good) arrays
+
+    Every owned building keeps its recipe queued, following
+    ProductionSystem.process_day: an idle building starts a batch when the
+    inputs are in the inventory, and a busy one counts down and adds the
+    outputs when done. Every trade_interval days the run visits the market:
+    it sells everything its buildings do not consume at the best price on
+    offer, then buys inputs for the next interval's batches at the cheapest
+    settlement, limited by coins and by the stock found there. Each sale
+    earns +1 reputation with the settlement's factions, as in
+    SettlementController.sell_item.
+    """
+
+    def __init__(self, market: Market, settings: Dict, starting_coins: int = 50):
+        self.market = market
+        self.settings = settings
+        owned = set(settings.get("owned", []))
+        known = sorted(set(market.recipe_buildings))
+        unknown = owned - set(known)
+        if unknown:
+            raise ValueError(f"Unknown buildings: {', '.join(sorted(unknown))} "
+                             f"(expected some of {', '.join(known)})")
+        self.owned = np.array([b in owned for b in market.recipe_buildings])
+        self.start = market.vector(settings.get("starting_items", {}))
+        self.starting_coins = settings.get("coins", starting_coins)
+        self.trade_interval = settings.get("trade_interval", 10)
+        self.reputation = np.array(
+            [settings.get("reputation", {}).get(f, 0) for f in market.factions], dtype=float
+        )
+        # Goods the owned buildings consume are kept and topped up to one
+        # trade interval's worth of batches; everything else on offer is sold
+        owned_inputs = market.inputs[self.owned]
+        batches = -(-self.trade_interval // (np.maximum(market.time[self.owned], 1) + 1))
+        self.wanted = (batches[:, None] * owned_inputs).sum(axis=0)
+        self.supplies = [g for g in np.flatnonzero(self.wanted) if g in market.listings]
+        self.surplus = [g for g in market.listings if not self.wanted[g]]
+
+    def run(self, num_runs: int, days: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        """Simulate num_runs economies for days days"""
+        market = self.market
+        inventory = np.tile(self.start, (num_runs, 1))
+        coins = np.full(num_runs, self.starting_coins, dtype=np.int64)
+        reputation = np.tile(self.reputation, (num_runs, 1))
+        remaining = np.full((len(market.recipe_names), num_runs), _IDLE, dtype=np.int64)
+        batches = np.zeros_like(remaining)
+        sold = np.zeros(num_runs, dtype=np.int64)
+        spent = np.zeros(num_runs, dtype=np.int64)
+        # Owned recipes as (row, input columns, input row, output columns,
+        # output row, duration) so each day only touches the goods they use
+        recipes = []
+        for r in np.flatnonzero(self.owned):
+            takes = np.flatnonzero(market.inputs[r])
+            makes = np.flatnonzero(market.outputs[r])
+            recipes.append((r, takes, market.inputs[r, takes], makes,
+                            market.outputs[r, makes], max(market.time[r], 1)))
+
+        for day in range(1, days + 1):
+            # Busy buildings count down and deliver finished batches; idle
+            # ones start a batch if the inputs are there, in recipe order
+            # since they draw from one inventory. A building that finished
+            # today starts again tomorrow, and recipes with no duration
+            # finish the day after they start
+            for r, takes, needs, makes, yields, duration in recipes:
+                timer = remaining[r]
+                busy = timer > 0
+                timer[busy] -= 1
+                done = busy & (timer == 0)
+                if done.any():
+                    inventory[np.ix_(done, makes)] += yields
+                    batches[r] += done
+                    timer[done] = _IDLE
+                can = timer == _IDLE
+                can[done] = False
+                can &= (inventory[:, takes] >= needs).all(axis=1)
+                inventory[np.ix_(can, takes)] -= needs
+                timer[can] = duration
+
+            if day % self.trade_interval == 0:
+                s, b = self._trade(inventory, coins, reputation, rng)
+                sold += s
+                spent += b
+
+        prices = market.sell_prices(reputation)
+        worth = coins.copy()
+        for good in market.listings:
+            worth += (inventory[:, good] * market.best_listing(prices, good, True)[0]).astype(np.int64)
+        return {
+            "coins": coins,
+            "worth": worth,
+            "sold": sold,
+            "spent": spent,
+            "batches": batches.T,
+            "inventory": inventory,
+        }
+
+    def _trade(self, inventory: np.ndarray, coins: np.ndarray, reputation: np.ndarray,
+               rng: np.random.Generator):
+        """One market visit for every run; returns (coins earned, coins spent)"""
+        market = self.market
+        n = len(coins)
+        rows = np.arange(n)
+        prices = market.buy_prices(reputation)
+
+        # Sell surplus where it fetches the most; each sale earns +1
+        # reputation with the buying settlement's factions
+        sell_prices = np.floor(prices * _SELL_FRACTION)
+        earned = np.zeros(n, dtype=np.int64)
+        sales = np.zeros((n, len(market.settlement_ids)))
+        for good in self.surplus:
+            price, listing = market.best_listing(sell_prices, good, True)
+            quantity = np.where(price > 0, inventory[:, good], 0)
+            earned += (quantity * price).astype(np.int64)
+            inventory[:, good] -= quantity
+            sales[rows, market.listing_settlement[listing]] += quantity > 0
+        coins += earned
+        reputation += sales @ market.members.T
+
+        # Buy inputs for the coming interval's batches at the cheapest
+        # settlement, limited by coins and by the stock found there
+        spent = np.zeros(n, dtype=np.int64)
+        for good in self.supplies:
+            price, _ = market.best_listing(prices, good, False)
+            # Closed at the top like randf_range, so a stock of 20 is possible
+            low, high = _STOCK_RANGE
+            stock = rng.uniform(low, np.nextafter(high, np.inf), size=n).astype(np.int64)
+            need = np.maximum(self.wanted[good] - inventory[:, good], 0)
+            affordable = np.where(price > 0, coins // np.maximum(price, 1), 0).astype(np.int64)
+            quantity = np.minimum(np.minimum(need, stock), affordable)
+            paid = (quantity * price).astype(np.int64)
+            inventory[:, good] += quantity
+            coins -= paid
+            spent += paid
+        return earned, spent
+
+
+class EconomySummary:
+    """Mergeable per-batch economy statistics"""
+
+    def __init__(self, recipes: List[str]):
+        self.recipes = recipes
+        self.coins = Moments()
+        self.worth = Moments()
+        self.sold = Moments()
+        self.spent = Moments()
+        self.worth_quantiles = QuantileSketch()
+        self.batches = [Moments() for _ in recipes]
+
+    def update(self, result: Dict[str, np.ndarray]):
+        """Fold in one shard's results"""
+        self.coins.update(result["coins"])
+        self.worth.update(result["worth"])
+        self.sold.update(result["sold"])
+        self.spent.update(result["spent"])
+        self.worth_quantiles.update(result["worth"])
+        for moments, column in zip(self.batches, result["batches"].T):
+            moments.update(column)
+
+    def merge(self, other: "EconomySummary"):
+        """Combine with another summary"""
+        for name in ("coins", "worth", "sold", "spent", "worth_quantiles"):
+            getattr(self, name).merge(getattr(other, name))
+        for mine, theirs in zip(self.batches, other.batches):
+            mine.merge(theirs)
+
+
+def _economy_shard(settings: Dict, paths: Dict, starting_coins: int, days: int,
+                   seed: int, start: int, count: int) -> EconomySummary:
+    """Worker entry point: simulate and summarise one shard"""
+    market = load_market(**paths)
+    simulator = EconomySimulator(market, settings, starting_coins)
+    rng = np.random.default_rng(derive_seed(seed, "economy", start))
+    summary = EconomySummary(market.recipe_names)
+    summary.update(simulator.run(count, days, rng))
+    report_progress(count)
+    return summary
+
+
+def run_economy(config: Dict, num_runs: int, days: int, seed: Optional[int] = None,
+                workers: int = 1) -> EconomySummary:
+    """Simulate the economy section of a simulator config across shards
+
+    A config without one runs DEFAULT_ECONOMY. Unknown buildings raise
+    ValueError before any shard starts.
+    """
+    settings = config.get("economy", DEFAULT_ECONOMY)
+    paths = {key: settings.get(key, path) for key, path in DEFAULT_PATHS.items()}
+    starting_coins = config["starting_resources"].get("coins", 0)
+    EconomySimulator(load_market(**paths), settings, starting_coins)
+    if seed is None:
+        seed = random.SystemRandom().randrange(2 ** 63)
+        print(f"Master seed: {seed}")
+    task = functools.partial(_economy_shard, settings, paths, starting_coins, days, seed)
+    summary = EconomySummary(load_market(**paths).recipe_names)
+    shards = make_shards(num_runs, config.get("shard_size", 16384))
+    for part in iter_sharded(task, shards, workers, ProgressPrinter(num_runs)):
+        summary.merge(part)
+    return summary
+
+
+def print_summary(summary: EconomySummary, days: int):
+    """Print economy statistics"""
+    print("\n=== ECONOMY SUMMARY ===")
+    print(f"Runs: {summary.coins.count}, days: {days}")
+    print(f"Average Final Coins: {summary.coins.mean:.1f}")
+    print(f"Average Net Worth: {summary.worth.mean:.1f} "
+          f"(p5={summary.worth_quantiles.quantile(0.05):.0f} "
+          f"p50={summary.worth_quantiles.quantile(0.5):.0f} "
+          f"p95={summary.worth_quantiles.quantile(0.95):.0f})")
+    print(f"Average Coins From Sales: {summary.sold.mean:.1f}")
+    print(f"Average Coins Spent On Inputs: {summary.spent.mean:.1f}")
+    for name, moments in zip(summary.recipes, summary.batches):
+        if moments.mean:
+            print(f"  {name}: {moments.mean:.1f} batches")
+
+
+def main():
+    """Main function"""
+    from balance_simulator import BalanceSimulator
+
+    parser = argparse.ArgumentParser(description="Production and market economy simulation")
+    parser.add_argument("--runs", type=int, default=10000, help="Number of runs")
+    parser.add_argument("--days", type=int, default=None, help="Days per run (default: max_days)")
+    parser.add_argument("--buildings", default=None,
+                        help="Comma-separated buildings every run owns (overrides config)")
+    parser.add_argument("--seed", type=int, default=None, help="Master random seed")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes (0 = one per CPU)")
+    args = parser.parse_args()
+
+    config = BalanceSimulator().config
+    if args.buildings is not None:
+        config.setdefault("economy", copy.deepcopy(DEFAULT_ECONOMY))["owned"] = \
+            [name for name in args.buildings.split(",") if name]
+    days = args.days or config["max_days"]
+    try:
+        summary = run_economy(config, args.runs, days, seed=args.seed,
+                              workers=args.workers or os.cpu_count())
+    except ValueError as error:
+        parser.error(str(error))
+    print_summary(summary, days)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Discrete-event engine for the balance simulator
+Jumps from event to event with a priority queue instead of ticking every day,
+so a run costs time per event rather than per day
+"""
+
+import heapq
+import itertools
+import math
+import random
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from content import health_regen
+from datapack import load_json
+
+# GameManager.DAYS_PER_YEAR
+DAYS_PER_YEAR = 120
+
+DEFAULT_WORLD_EVENTS = "data/world/events/world_events.json"
+
+# Events on the same day resolve in run_simulation's order
+ENCOUNTER, HAZARD, ROAD, HARVEST, TRAVEL, WORLD, DEATH = range(7)
+
+# Sums of more uniforms than this are drawn from their normal approximation
+_EXACT_DRIFT_DAYS = 16
+
+
+def geometric(rng: random.Random, p: float) -> float:
+    """Trials up to and including the first success (inf if p is 0)"""
+    if p >= 1:
+        return 1
+    if p <= 0:
+        return math.inf
+    return int(math.log(1.0 - rng.random()) / math.log(1.0 - p)) + 1
+
+
+def uniform_sum(rng: random.Random, days: int, low: float = 0.1, high: float = 0.5) -> float:
+    """Sum of `days` uniform(low, high) draws in O(1) for long gaps"""
+    if days <= _EXACT_DRIFT_DAYS:
+        return sum(rng.uniform(low, high) for _ in range(days))
+    mean = days * (low + high) / 2
+    std = (high - low) * math.sqrt(days / 12)
+    return min(days * high, max(days * low, rng.gauss(mean, std)))
+
+
+class WorldEvent:
+    """A world_events.json entry with its chance_per_year trigger compiled"""
+
+    __slots__ = ("id", "min_year", "chance", "entropy", "threshold", "reputation", "wipe")
+
+    def __init__(self, event: Dict):
+        conditions = event.get("trigger_conditions", {})
+        effects = event.get("effects", {})
+        self.id = event["id"]
+        self.min_year = conditions.get("min_year", 1)
+        self.chance = conditions.get("chance_per_year", 0.0)
+        self.entropy = conditions.get("requires_entropy")
+        self.threshold = conditions.get("entropy_threshold", 0)
+        self.reputation = -(effects.get("player_reputation_loss", 0)
+                            + effects.get("faction_reputation_loss", 0))
+        self.wipe = bool(effects.get("reputation_wipe", False))
+
+    def eligible(self, state: Dict, year: int) -> bool:
+        """Trigger conditions other than the yearly roll; once true they stay true"""
+        if year < self.min_year:
+            return False
+        if self.entropy is not None:
+            return state[f"entropy_{self.entropy}"] >= self.threshold
+        return True
+
+    def apply(self, state: Dict):
+        """Apply the event's effects on the run"""
+        if self.wipe:
+            state["reputation"] = 0
+        state["reputation"] += self.reputation
+        state["world_events"].append(self.id)
+
+
+def load_world_events(path: Optional[str]) -> List[WorldEvent]:
+    """Yearly-chance world events from a world_events.json
+
+    Events triggered by travel or by later generations cannot happen in a
+    single-generation run without travel and are left out.
+    """
+    if not path or not Path(path).exists():
+        return []
+    return [
+        WorldEvent(event) for event in load_json(path)
+        if "chance_per_year" in event.get("trigger_conditions", {})
+        and "generation" not in event["trigger_conditions"]
+    ]
+
+
+class EventEngine:
+    """Simulates one run at a time as a queue of timed events
+
+    Produces the same distribution of outcomes as BalanceSimulator.run_simulation.
+    Each kind of event draws the day it next happens (geometric gaps for daily
+    rolls, fixed gaps for harvests, trade runs and yearly world-event checks)
+    and the run jumps straight there. Entropy only matters to world events, so its daily
+    drift is summed in one draw whenever a world event reads it and at the
+    end of the run; the marriage roll lands on the G-th eligible day with G
+    drawn once. A trade run books one ROAD event per day it spends on the
+    road; home encounters and hazards falling in that stretch are redrawn
+    from its last day, which gaps of daily rolls allow.
+    """
+
+    def __init__(self, config: Dict, content=None, trait_choices=None,
+                 world_events: Optional[List[WorldEvent]] = None, travel=None):
+        self.config = config
+        self.content = content
+        self.trait_choices = trait_choices
+        self.world_events = world_events or []
+        self.travel = travel
+        if content is None:
+            # The simplified handlers only do something 30% / 50% of the time
+            self.encounter_chance = config["encounter_rate"] * 0.3
+            self.hazard_chance = config["hazard_rate"] * 0.5
+        else:
+            self.encounter_chance = config["encounter_rate"]
+            self.hazard_chance = config["hazard_rate"]
+        self.health_regen = 0 if content is None else health_regen(config["content"])
+        if travel is not None:
+            # As for hazard_chance, the simplified handler's 50% is folded in
+            self.leg_hazard_chance = travel.hazard_chance * (0.5 if content is None else 1)
+
+    def run(self, state: Dict, rng: random.Random,
+            harvest: Optional[Callable[[Dict, int], None]] = None) -> Dict:
+        """Run one simulation from a fresh run_simulation-style state
+
+        harvest, if given, collects the run's farm produce for the n-th
+        harvest day in place of the random harvest bump.
+        """
+        max_days = self.config["max_days"]
+        resources = state["resources"]
+        # Entries are (day, kind, tiebreak, payload)
+        self._tiebreak = itertools.count()
+        queue = [
+            (geometric(rng, self.encounter_chance), ENCOUNTER, 0, None),
+            (geometric(rng, self.hazard_chance), HAZARD, 0, None),
+            (10, HARVEST, 0, None),
+            (200 + geometric(rng, 0.01), DEATH, 0, None),
+        ]
+        if self.world_events:
+            queue.append((1, WORLD, 0, None))
+        if self.travel is not None:
+            queue.append((self.travel.every, TRAVEL, 0, None))
+        heapq.heapify(queue)
+        state["world_events"] = []
+        pending_events = list(self.world_events)
+        marriage_rolls = geometric(rng, 0.05)
+        last = 0
+        self._drifted = 0
+        self._healed = 0
+        self._max_health = state["health"]
+        self._away = 0
+
+        while True:
+            day = min(queue[0][0], max_days)
+            # Quiet days before this one: coins are flat, so either every one
+            # of them past day 50 is a marriage roll or none is
+            if state["marriage_days"] is None and resources["coins"] > 100:
+                first = max(last + 1, 51)
+                eligible = day - first
+                if eligible > 0:
+                    if marriage_rolls <= eligible:
+                        state["marriage_days"] = first + marriage_rolls - 1
+                    else:
+                        marriage_rolls -= eligible
+            state["day"] = last = day
+            if self.health_regen:
+                self._heal(state, day - 1)
+
+            while queue and queue[0][0] == day:
+                _, kind, _, payload = heapq.heappop(queue)
+                if kind == ENCOUNTER:
+                    if day > self._away:
+                        self._encounter(state, rng)
+                    heapq.heappush(queue, (max(day, self._away)
+                                           + geometric(rng, self.encounter_chance),
+                                           ENCOUNTER, 0, None))
+                elif kind == HAZARD:
+                    if day > self._away:
+                        self._hazard(state, rng)
+                    heapq.heappush(queue, (max(day, self._away)
+                                           + geometric(rng, self.hazard_chance),
+                                           HAZARD, 0, None))
+                elif kind == ROAD:
+                    self._road_encounter(state, rng)
+                    if payload and rng.random() < self.leg_hazard_chance:
+                        self._hazard(state, rng)
+                elif kind == HARVEST:
+                    if harvest is None:
+                        resources["coins"] += rng.randint(5, 15)
+                    else:
+                        harvest(state, day // 10 - 1)
+                    heapq.heappush(queue, (day + 10, HARVEST, 0, None))
+                elif kind == TRAVEL:
+                    if day > self._away:
+                        self._depart(state, rng, queue)
+                    heapq.heappush(queue, (day + self.travel.every, TRAVEL, 0, None))
+                elif kind == WORLD:
+                    self._drift(state, rng)
+                    self._world(state, rng, queue, pending_events, payload)
+                elif kind == DEATH:
+                    state["dead"] = True
+            if state["dead"]:
+                break
+            if state["health"] <= 0:
+                state["dead"] = True
+                break
+
+            # End of an event day: its own marriage roll, then bankruptcy
+            if (state["marriage_days"] is None and day > 50 and resources["coins"] > 100):
+                marriage_rolls -= 1
+                if not marriage_rolls:
+                    state["marriage_days"] = day
+            if resources["coins"] < 0:
+                state["bankrupt"] = True
+                break
+            if day >= max_days:
+                break
+        if self.health_regen and not state["dead"]:
+            self._heal(state, state["day"])
+        self._drift(state, rng)
+        return state
+
+    def _depart(self, state: Dict, rng: random.Random, queue: List):
+        """Set off on a trade run, booking its road days (the first of each leg flagged)"""
+        trip = self.travel.depart(state, rng)
+        if trip is None:
+            return
+        out, days = trip
+        day = state["day"]
+        self._away = day + days
+        for road_day in range(day + 1, day + days + 1):
+            leg = road_day in (day + 1, day + out + 1)
+            heapq.heappush(queue, (road_day, ROAD, 0, leg))
+
+    def _heal(self, state: Dict, day: int):
+        """Apply the daily health recovery of every day up to and including day"""
+        days = day - self._healed
+        if days > 0:
+            state["health"] = min(self._max_health, state["health"] + self.health_regen * days)
+            self._healed = day
+
+    def _drift(self, state: Dict, rng: random.Random):
+        """Bring entropy up to date; nothing reads it between world events"""
+        days = state["day"] - self._drifted
+        state["entropy_order"] += uniform_sum(rng, days)
+        state["entropy_wild"] += uniform_sum(rng, days)
+        self._drifted = state["day"]
+
+    def _encounter(self, state: Dict, rng: random.Random):
+        if self.content is not None:
+            self.content.roll_encounter(state, rng)
+        else:
+            state["resources"]["coins"] -= rng.randint(1, 10)
+
+    def _road_encounter(self, state: Dict, rng: random.Random):
+        """A travel day's encounter roll, run_simulation's _handle_encounter"""
+        if self.content is not None:
+            self.content.roll_encounter(state, rng)
+        elif rng.random() < 0.3:
+            state["resources"]["coins"] -= rng.randint(1, 10)
+
+    def _hazard(self, state: Dict, rng: random.Random):
+        if self.content is not None:
+            self.content.roll_hazard(state, rng, self.trait_choices)
+            return
+        state["resources"]["food"] -= 1
+        if state["resources"]["food"] < 0:
+            state["bankrupt"] = True
+
+    def _world(self, state: Dict, rng: random.Random, queue: List,
+               pending: List[WorldEvent], event: Optional[WorldEvent]):
+        """Yearly check, or a scheduled world event going off
+
+        A check schedules every newly eligible event for the year its
+        chance_per_year first comes up, then books the next check while any
+        event is still waiting on its conditions.
+        """
+        day = state["day"]
+        if event is not None:
+            event.apply(state)
+            return
+        year = (day - 1) // DAYS_PER_YEAR + 1
+        for candidate in list(pending):
+            if candidate.eligible(state, year):
+                pending.remove(candidate)
+                years = geometric(rng, candidate.chance)
+                if years < math.inf:
+                    when = day + (years - 1) * DAYS_PER_YEAR
+                    if when == day:
+                        candidate.apply(state)
+                    else:
+                        heapq.heappush(queue, (when, WORLD, next(self._tiebreak), candidate))
+        if pending:
+            heapq.heappush(queue, (day + DAYS_PER_YEAR, WORLD, next(self._tiebreak), None))
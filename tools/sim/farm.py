@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Farm-plot crop growth for the balance simulator
+Compiles data/crops.json and data/soil_types.json into crop x soil lookup
+tables and advances whole farm grids of many runs as tile arrays, following
+FarmGrid.gd, Tile.gd and Crop.gd
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from datapack import load_json
+from parallel import derive_seed
+
+DEFAULT_CROPS = "data/crops.json"
+DEFAULT_SOILS = "data/soil_types.json"
+
+# FarmGrid.GRID_WIDTH x GRID_HEIGHT and its weighted soil draw
+DEFAULT_SIZE = (10, 10)
+DEFAULT_SOIL_WEIGHTS = {"ferro_soil": 1, "fungal_soil": 1, "ash_soil": 3}
+
+# Crop.check_soil_compatibility classes; the game only uses them for the
+# tile's mood, so by default they do not change growth or yield
+COMPATIBILITY = ("hates", "neutral", "likes")
+# Tile.harvest: the soil is "tired" after 3 harvests and "exhausted" after 5
+MOODS = (("neutral", 0), ("tired", 4), ("exhausted", 6))
+
+
+class FarmModel:
+    """Crop x soil tables compiled from the crop and soil data
+
+    cycle[c, s] is the days from planting crop c on soil s to harvesting it
+    (growth_stages x days_per_stage, scaled by the compatibility growth
+    rate) and yields[c, s] the items one harvest gives. Tiles are replanted
+    with the same crop on the day they are harvested, so a tile's whole
+    history follows from its age and how often it has been harvested.
+    """
+
+    def __init__(self, crops: List[Dict], soils: List[Dict], settings: Dict,
+                 prices: Optional[Dict[str, float]] = None,
+                 crop_choices: Optional[List[str]] = None):
+        self.settings = settings
+        self.crops = [crop["name"] for crop in crops]
+        self.soils = [soil["name"] for soil in soils]
+        self.items = list(dict.fromkeys(item for crop in crops for item in crop.get("output", [])))
+        soil_ids = {name: i for i, name in enumerate(self.soils)}
+        item_ids = {name: i for i, name in enumerate(self.items)}
+
+        growth = settings.get("growth", {})
+        yields = settings.get("yield", {})
+        shape = (len(crops), len(soils))
+        self.compatibility = np.ones(shape, dtype=np.int64)
+        self.rate = np.ones(shape)
+        self.cycle = np.zeros(shape, dtype=np.int64)
+        self.yields = np.zeros(shape + (len(self.items),))
+        for c, crop in enumerate(crops):
+            for soil in crop.get("likes", []):
+                self.compatibility[c, soil_ids[soil]] = 2
+            for soil in crop.get("hates", []):
+                self.compatibility[c, soil_ids[soil]] = 0
+            days = crop.get("growth_stages", 5) * crop.get("days_per_stage", 3)
+            output = np.zeros(len(self.items))
+            for item in crop.get("output", []):
+                output[item_ids[item]] += 1
+            for s in range(len(soils)):
+                kind = COMPATIBILITY[self.compatibility[c, s]]
+                rate = self.rate[c, s] = growth.get(kind, 1.0)
+                # A crop that never matures is never harvested
+                self.cycle[c, s] = int(np.ceil(days / rate)) if rate > 0 else 0
+                self.yields[c, s] = output * yields.get(kind, 1.0)
+        self.growth_stages = np.array([crop.get("growth_stages", 5) for crop in crops])
+        self.days_per_stage = np.array([crop.get("days_per_stage", 3) for crop in crops])
+
+        # Cumulative mood yield multiplier: harvest k of a tile (k from 0)
+        # happens with k earlier harvests in its memory
+        mood_yield = settings.get("mood_yield", {})
+        last = MOODS[-1][1]
+        multiplier = np.ones(last + 1)
+        for mood, first in MOODS:
+            multiplier[first:] = mood_yield.get(mood, 1.0)
+        self._cumulative = np.concatenate(([0.0], np.cumsum(multiplier)))
+        self._exhausted = multiplier[-1]
+
+        # Items with a price are sold at the harvest; the rest go to the inventory
+        prices = prices or {}
+        self.prices = np.array([prices.get(item, 0) for item in self.items], dtype=np.float64)
+        self.kept = [i for i, price in enumerate(self.prices) if price <= 0]
+
+        choices = settings.get("crops") or crop_choices or self.crops
+        self.choices = np.array([self.crops.index(name) for name in choices])
+        # Best crop per soil by coins per day, for the "best" planting policy
+        value = (self.yields[self.choices] @ self.prices) / np.maximum(self.cycle[self.choices], 1)
+        value[self.cycle[self.choices] == 0] = -1
+        self.best_crop = self.choices[value.argmax(axis=0)]
+
+        weights = settings.get("soils", DEFAULT_SOIL_WEIGHTS)
+        self.soil_choices = np.array([soil_ids[name] for name in weights])
+        self.soil_weights = np.array(list(weights.values()), dtype=np.float64)
+        self.soil_weights /= self.soil_weights.sum()
+        self.size = tuple(settings.get("size", DEFAULT_SIZE))
+
+    def cumulative_yield(self, harvests: int) -> np.ndarray:
+        """Lookup table: entry k sums the mood multipliers of a tile's first k harvests"""
+        k = np.arange(harvests + 1)
+        top = len(self._cumulative) - 1
+        capped = np.minimum(k, top)
+        return self._cumulative[capped] + (k - capped) * self._exhausted
+
+    def plant(self, seed: int, start: int, count: int) -> "FarmBatch":
+        """Lay out and plant the farms of runs [start, start + count)
+
+        Every run draws its soils (and crops, for random planting) from its
+        own stream derived from the master seed, so a run's farm does not
+        depend on how the batch is sharded.
+        """
+        height, width = self.size
+        soil = np.empty((count, height, width), dtype=np.int8)
+        crop = np.empty_like(soil)
+        for j in range(count):
+            rng = np.random.default_rng(derive_seed(seed, "farm", start + j))
+            soil[j] = rng.choice(self.soil_choices, size=self.size, p=self.soil_weights)
+            if self.settings.get("planting", "best") == "random":
+                crop[j] = rng.choice(self.choices, size=self.size)
+            else:
+                crop[j] = self.best_crop[soil[j]]
+        return FarmBatch(self, soil, crop)
+
+
+class FarmBatch:
+    """The farm grids of a batch of runs as (run, y, x) tile arrays
+
+    Every tile is planted on day one and replanted the day it is harvested,
+    so tiles of the same crop on the same soil stay in lockstep: their age
+    (days since planting) and memory (harvests so far,
+    Tile.memory["years_used"]) are held once per (run, crop x soil class)
+    along with how many tiles share them, and the per-tile arrays gather
+    from there. advance() moves the whole batch forward any number of days
+    in one step: harvests are age // cycle, each yielding what the crop x
+    soil table and the class's memory say.
+    """
+
+    def __init__(self, model: FarmModel, soil: np.ndarray, crop: np.ndarray):
+        self.model = model
+        self.soil = soil
+        self.crop = crop
+        runs = len(soil)
+        # Crop x soil class of every tile, and how many tiles each run has per class
+        self.tile_class = crop.astype(np.int64) * len(model.soils) + soil
+        classes = len(model.crops) * len(model.soils)
+        offsets = np.arange(runs)[:, None] * classes
+        self.tiles = np.bincount((self.tile_class.reshape(runs, -1) + offsets).ravel(),
+                                 minlength=runs * classes).reshape(runs, classes)
+        # Crops that never mature get a cycle no run reaches
+        self.cycle = model.cycle.ravel().astype(np.int64)
+        self.cycle[self.cycle == 0] = np.iinfo(np.int64).max
+        self.class_age = np.zeros((runs, classes), dtype=np.int64)
+        self.class_memory = np.zeros((runs, classes), dtype=np.int64)
+        self._class_yields = model.yields.reshape(classes, len(model.items))
+        # Cumulative yield table, grown as tiles are harvested; _most bounds
+        # any tile's memory and _shortest is the quickest cycle on the farm
+        self._shortest = int(self.cycle.min())
+        self._most = 0
+        self._yield = model.cumulative_yield(0)
+
+    def _per_tile(self, values: np.ndarray) -> np.ndarray:
+        """Spread (run, class) values over the (run, y, x) grid"""
+        runs = np.arange(len(self.soil))[:, None, None]
+        return values[runs, self.tile_class]
+
+    @property
+    def age(self) -> np.ndarray:
+        """Days since every tile was planted"""
+        return self._per_tile(self.class_age)
+
+    @property
+    def memory(self) -> np.ndarray:
+        """Harvests every tile has given (Tile.memory["years_used"])"""
+        return self._per_tile(self.class_memory)
+
+    def _grown(self) -> np.ndarray:
+        """Days of growth each tile's crop has had"""
+        return np.floor(self.age * self.model.rate[self.crop, self.soil]).astype(np.int64)
+
+    @property
+    def stage(self) -> np.ndarray:
+        """Growth stage of every tile (Tile.crop_growth_stage)"""
+        return self._grown() // self.model.days_per_stage[self.crop]
+
+    @property
+    def days_in_stage(self) -> np.ndarray:
+        """Days into the current stage of every tile (Tile.crop_days_in_stage)"""
+        return self._grown() % self.model.days_per_stage[self.crop]
+
+    def advance(self, days: int) -> np.ndarray:
+        """Grow every tile by days, harvesting and replanting ripe ones
+
+        Returns the (run, item) quantities harvested.
+        """
+        age = self.class_age + days
+        harvests = age // self.cycle
+        self.class_age = age - harvests * self.cycle
+        self._most += days // self._shortest + 1
+        if len(self._yield) <= self._most:
+            self._yield = self.model.cumulative_yield(2 * self._most)
+        self.class_memory += harvests
+        weight = self._yield[self.class_memory] - self._yield[self.class_memory - harvests]
+        return (self.tiles * weight) @ self._class_yields
+
+    def run(self, days: int, interval: int = 10) -> "FarmHarvests":
+        """Advance through days, collecting the produce every interval days"""
+        steps = days // interval
+        produced = np.zeros((steps, len(self.soil), len(self.model.items)))
+        for step in range(steps):
+            produced[step] = self.advance(interval)
+        # Fractional yields are floored on the running total so nothing is lost
+        totals = np.floor(np.cumsum(produced, axis=0) + 1e-9)
+        quantities = np.diff(totals, axis=0, prepend=0).astype(np.int32)
+        coins = (quantities @ self.model.prices).astype(np.int32)
+        return FarmHarvests(self.model, coins, quantities[:, :, self.model.kept])
+
+
+class FarmHarvests:
+    """What a batch's farms bring in at each harvest day
+
+    coins is (harvest, run) coin income from selling priced produce and
+    items the (harvest, run, item) quantities of the unpriced items kept.
+    """
+
+    def __init__(self, model: FarmModel, coins: np.ndarray, items: np.ndarray):
+        self.coins = coins
+        self.items = items
+        self.item_names = [model.items[i] for i in model.kept]
+
+    def collect(self, state: Dict, harvest: int, run: int):
+        """Add one harvest day's produce to a run-state dict"""
+        if harvest >= len(self.coins):
+            return
+        resources = state["resources"]
+        resources["coins"] += int(self.coins[harvest, run])
+        for name, quantity in zip(self.item_names, self.items[harvest, run]):
+            if quantity:
+                resources[name] = resources.get(name, 0) + int(quantity)
+
+
+def default_prices() -> Dict[str, float]:
+    """Best settlement sell price of every good at neutral reputation"""
+    from economy import load_market
+
+    market = load_market()
+    sell = market.sell_prices(np.zeros((1, len(market.factions))))
+    prices = {}
+    for good, listings in market.listings.items():
+        prices[market.goods[good]] = float(sell[0, listings].max())
+    return prices
+
+
+def load_farm(settings: Dict, crop_choices: Optional[List[str]] = None) -> FarmModel:
+    """Compile the farm section of a simulator config"""
+    crops, soils = (load_json(path) for path in farm_paths(settings))
+    prices = settings.get("prices")
+    return FarmModel(crops, soils, settings, default_prices() if prices is None else prices,
+                     crop_choices)
+
+
+def farm_paths(settings: Optional[Dict]) -> Tuple[str, str]:
+    """(crops, soils) data paths from a config's farm section"""
+    settings = settings or {}
+    return (settings.get("crop_data", DEFAULT_CROPS), settings.get("soil_data", DEFAULT_SOILS))
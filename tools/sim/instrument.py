@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Instrumentation for the balance simulator
+Phase timers, event counters and a throughput timeline, gathered per shard
+and merged like the batch summary
+"""
+
+import contextlib
+import json
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+
+def profile_path(report_path: str) -> Path:
+    """Profile file that goes with a CSV report path"""
+    return Path(report_path).with_suffix(".profile.json")
+
+
+class Profile:
+    """Where a batch spends its time and how often each branch fires
+
+    phases maps a phase name to the seconds spent in it and events an event
+    name to how many times it happened; both add up across shards. Handlers
+    are counted by wrapping them (wrap), so a simulator with no Profile
+    attached runs exactly the code it always did. timeline holds (seconds,
+    runs done) samples taken as shards finish.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.events: Dict[str, int] = {}
+        self.runs = 0
+        self.timeline: List[Tuple[float, int]] = []
+        self._started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """Time the block as part of phase name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name: str, times: int = 1):
+        """Record times occurrences of event name"""
+        self.events[name] = self.events.get(name, 0) + int(times)
+
+    def wrap(self, name: str, handler: Callable) -> Callable:
+        """handler, counting its calls as event name and timing them as phase name"""
+        phases, events = self.phases, self.events
+        clock = time.perf_counter
+
+        def wrapped(*args, **kwargs):
+            start = clock()
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                phases[name] = phases.get(name, 0.0) + clock() - start
+                events[name] = events.get(name, 0) + 1
+
+        return wrapped
+
+    def count_results(self, table):
+        """Count the outcomes a ResultTable records: runs, harvests, marriages, exits"""
+        days = np.asarray(table["day"])
+        self.runs += len(days)
+        self.count("harvest", (days // 10).sum())
+        self.count("marriage", np.count_nonzero(np.asarray(table["marriage_day"]) >= 0))
+        self.count("death", np.count_nonzero(table["dead"]))
+        self.count("bankruptcy", np.count_nonzero(table["bankrupt"]))
+
+    def tick(self, runs_done: int):
+        """Add a throughput sample"""
+        self.timeline.append((time.perf_counter() - self._started, runs_done))
+
+    def merge(self, other: "Profile"):
+        """Combine with a profile gathered elsewhere (a shard's)"""
+        for name, seconds in other.phases.items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+        for name, count in other.events.items():
+            self.events[name] = self.events.get(name, 0) + count
+        self.runs += other.runs
+
+    def to_dict(self) -> Dict:
+        """The profile as plain JSON-ready data"""
+        elapsed = time.perf_counter() - self._started
+        timeline = []
+        last_time, last_runs = 0.0, 0
+        for seconds, runs in self.timeline:
+            span = seconds - last_time
+            timeline.append({
+                "seconds": round(seconds, 4),
+                "runs": runs,
+                "runs_per_sec": (runs - last_runs) / span if span > 0 else None,
+            })
+            last_time, last_runs = seconds, runs
+        return {
+            "runs": self.runs,
+            "elapsed": elapsed,
+            "runs_per_sec": self.runs / elapsed if elapsed > 0 else None,
+            "phases": dict(sorted(self.phases.items(), key=lambda item: -item[1])),
+            "events": {
+                name: {"count": count, "per_run": count / self.runs if self.runs else None}
+                for name, count in sorted(self.events.items())
+            },
+            "timeline": timeline,
+        }
+
+    def write(self, path: Path):
+        """Write the profile as JSON"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Multi-generation dynasty mode for the balance simulator
+Carries each run across generations the way LineageSystem.gd does: a head
+who marries pays the dowry, takes on the faction's yearly tribute and
+reputation, and leaves the estate to the child of the marriage
+"""
+
+import argparse
+import functools
+import os
+import random
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from datapack import load_json
+from economy import load_market
+from event_engine import DAYS_PER_YEAR
+from parallel import ProgressPrinter, derive_seed, iter_sharded, make_shards, report_progress
+from stats import Moments, Proportion, QuantileSketch
+from vector_engine import NumpyEngine
+
+DEFAULT_TERMS = "data/marriage_terms.json"
+
+# LineageSystem._check_tribute: +2 reputation for a paid year, -5 for a
+# missed one, kept within [-50, 100]
+_TRIBUTE_PAID = 2
+_TRIBUTE_MISSED = -5
+_REPUTATION_BOUNDS = (-50, 100)
+# _schedule_child_birth: the child arrives 1-2 years after the wedding
+_BIRTH_YEARS = (1, 2)
+
+
+class MarriageTerms:
+    """marriage_terms.json compiled against the market's goods and factions
+
+    dowry and tribute are (terms, good) quantity matrices and reputation
+    the (terms, faction) benefit, so a generation's weddings and tribute are
+    priced for every dynasty at once.
+    """
+
+    def __init__(self, terms: List[Dict], market):
+        self.market = market
+        self.factions = [t["faction"] for t in terms]
+        faction_ids = {name: i for i, name in enumerate(market.factions)}
+        self.dowry = np.array([market.vector(t.get("dowry", {}).get("items", {}))
+                               for t in terms]).reshape(len(terms), len(market.goods))
+        self.tribute = np.array([market.vector(t.get("obligations", {}).get("tribute", {}))
+                                 for t in terms]).reshape(len(terms), len(market.goods))
+        self.reputation = np.zeros((len(terms), len(market.factions)))
+        # Tribute moves reputation with the spouse's faction (-1 if the
+        # market has never heard of it)
+        self.faction = np.full(len(terms), -1)
+        for i, t in enumerate(terms):
+            for faction, amount in t.get("benefits", {}).get("reputation", {}).items():
+                if faction in faction_ids:
+                    self.reputation[i, faction_ids[faction]] += amount
+            self.faction[i] = faction_ids.get(t["faction"], -1)
+
+    def cost(self, quantities: np.ndarray, reputation: np.ndarray) -> np.ndarray:
+        """Coins each dynasty pays to buy its row of goods at the cheapest settlement
+
+        Goods nobody sells cost infinity: they cannot be bought.
+        """
+        prices = self.market.buy_prices(reputation)
+        total = np.zeros(len(quantities))
+        for good in np.flatnonzero(quantities.any(axis=0)):
+            needed = quantities[:, good]
+            if good in self.market.listings:
+                price, _ = self.market.best_listing(prices, good, False)
+                total += needed * price
+            else:
+                total[needed > 0] = np.inf
+        return total
+
+
+class Family:
+    """The heads of a batch of dynasties in one generation, as parallel columns
+
+    One row per living dynasty; rows of dynasties that end are dropped
+    between generations, so a table never outgrows its shard.
+    """
+
+    __slots__ = ("dynasty", "coins", "reputation")
+
+    def __init__(self, dynasty: np.ndarray, coins: np.ndarray, reputation: np.ndarray):
+        self.dynasty = dynasty
+        self.coins = coins
+        self.reputation = reputation
+
+    def __len__(self) -> int:
+        return len(self.dynasty)
+
+    def heirs(self, keep: np.ndarray, coins: np.ndarray) -> "Family":
+        """The next generation: rows where keep is set, with their inheritance"""
+        return Family(self.dynasty[keep], coins[keep], self.reputation[keep])
+
+
+class GenerationSummary:
+    """Mergeable statistics of one generation across dynasties"""
+
+    PERCENTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+    def __init__(self):
+        self.dead = Proportion()
+        self.bankrupt = Proportion()
+        self.married = Proportion()
+        self.heir = Proportion()
+        self.days = Moments()
+        self.inherited = Moments()
+        self.estate = Moments()
+        self.tribute = Moments()
+        self.estate_quantiles = QuantileSketch()
+        self.spouses: Dict[str, int] = {}
+
+    @property
+    def heads(self) -> int:
+        """Dynasties that reached this generation"""
+        return self.dead.count
+
+    def merge(self, other: "GenerationSummary"):
+        """Combine with a summary gathered elsewhere"""
+        for name, value in vars(self).items():
+            if name == "spouses":
+                for faction, count in other.spouses.items():
+                    value[faction] = value.get(faction, 0) + count
+            else:
+                value.merge(getattr(other, name))
+
+
+class DynastySimulator:
+    """Plays dynasties generation by generation on the numpy engine
+
+    Each generation is one NumpyEngine batch over the dynasties still going,
+    opening with each head's inheritance. At the end of a head's life:
+
+    - a head who married pays the dowry at the cheapest settlement prices;
+      one who cannot afford it never married (accept_marriage fails)
+    - a marriage picks a faction's terms, adds its reputation benefit, and
+      owes tribute every year of the marriage, settled from the estate:
+      each year paid earns +2 with the faction, each missed year costs -5
+    - the child is born 1-2 years after the wedding; a head who lived that
+      long passes the estate (times inheritance, debts are not inherited)
+      to them; a dynasty without an heir ends
+    """
+
+    def __init__(self, config: Dict, settings: Optional[Dict] = None):
+        self.config = config
+        self.settings = settings if settings is not None else config.get("dynasty", {})
+        self.market = load_market()
+        self.terms = MarriageTerms(load_json(self.settings.get("terms", DEFAULT_TERMS)),
+                                   self.market)
+        weights = self.settings.get("factions")
+        if weights is None:
+            weights = {faction: 1 for faction in self.terms.factions}
+        self.choices = np.array([self.terms.factions.index(f) for f in weights])
+        self.weights = np.array(list(weights.values()), dtype=np.float64)
+        self.weights /= self.weights.sum()
+        self.inheritance = self.settings.get("inheritance", 1.0)
+        self.engine = NumpyEngine(config)
+
+    def founders(self, start: int, count: int) -> Family:
+        """Generation one of dynasties [start, start + count)"""
+        return Family(np.arange(start, start + count, dtype=np.int64),
+                      np.full(count, self.config["starting_resources"].get("coins", 0),
+                              dtype=np.int64),
+                      np.zeros((count, len(self.market.factions))))
+
+    def generation(self, family: Family, rng: np.random.Generator,
+                   summary: GenerationSummary) -> Family:
+        """Live out one generation; returns the heirs"""
+        n = len(family)
+        result = self.engine.run(n, rng, coins=family.coins)
+        days = result["day"].astype(np.int64)
+        estate = result["coins"].astype(np.float64)
+        reputation = family.reputation
+        married = result["marriage_day"] >= 0
+
+        terms = self.choices[rng.choice(len(self.choices), size=n, p=self.weights)]
+        dowry = self.terms.cost(self.terms.dowry[terms], reputation)
+        married &= estate >= dowry
+        estate = np.where(married, estate - dowry, estate)
+        reputation = reputation + married[:, None] * self.terms.reputation[terms]
+
+        # Tribute for every full year of the marriage, paid while the estate
+        # lasts; tribute in goods nobody sells is never paid
+        years = np.where(married, (days - result["marriage_day"]) // DAYS_PER_YEAR, 0)
+        per_year = self.terms.cost(self.terms.tribute[terms], reputation)
+        payable = np.isfinite(per_year)
+        affordable = np.maximum(estate, 0) // np.where(payable & (per_year > 0), per_year, 1)
+        paid = np.where(payable, np.minimum(years, np.where(per_year > 0, affordable, years)), 0)
+        paid = paid.astype(np.int64)
+        paid_coins = np.where(paid > 0, paid * np.where(payable, per_year, 0), 0)
+        estate -= paid_coins
+        faction = self.terms.faction[terms]
+        rows = np.flatnonzero(married & (faction >= 0))
+        standing = reputation[rows, faction[rows]]
+        standing = np.minimum(_REPUTATION_BOUNDS[1], standing + _TRIBUTE_PAID * paid[rows])
+        standing = np.maximum(_REPUTATION_BOUNDS[0],
+                              standing + _TRIBUTE_MISSED * (years[rows] - paid[rows]))
+        reputation[rows, faction[rows]] = standing
+
+        # The line goes on if the child was born before the head died
+        birth = rng.integers(_BIRTH_YEARS[0], _BIRTH_YEARS[1], size=n, endpoint=True)
+        heir = married & (days >= result["marriage_day"] + birth * DAYS_PER_YEAR)
+
+        summary.dead.update(result["dead"])
+        summary.bankrupt.update(result["bankrupt"])
+        summary.married.update(married)
+        summary.heir.update(heir)
+        summary.days.update(days)
+        summary.inherited.update(family.coins)
+        summary.estate.update(estate)
+        summary.tribute.update(paid_coins[married])
+        summary.estate_quantiles.update(estate)
+        for index, count in zip(*np.unique(terms[married], return_counts=True)):
+            faction_name = self.terms.factions[index]
+            summary.spouses[faction_name] = summary.spouses.get(faction_name, 0) + int(count)
+
+        family.reputation = reputation
+        inherited = np.floor(np.maximum(estate, 0) * self.inheritance).astype(np.int64)
+        return family.heirs(heir, inherited)
+
+
+def _dynasty_shard(config: Dict, generations: int, seed: int,
+                   start: int, count: int) -> List[GenerationSummary]:
+    """Worker entry point: play one shard of dynasties to the end"""
+    simulator = DynastySimulator(config)
+    family = simulator.founders(start, count)
+    summaries = [GenerationSummary() for _ in range(generations)]
+    for generation, summary in enumerate(summaries):
+        if not len(family):
+            break
+        rng = np.random.default_rng(derive_seed(seed, "dynasty", start, generation))
+        family = simulator.generation(family, rng, summary)
+    report_progress(count)
+    return summaries
+
+
+def run_dynasties(config: Dict, dynasties: int, generations: int, seed: Optional[int] = None,
+                  workers: int = 1) -> List[GenerationSummary]:
+    """Play dynasties for up to generations generations; one summary per generation
+
+    Dynasties are sharded by shard_size and each shard keeps only its
+    current generation, so memory stays flat however many there are.
+    """
+    if seed is None:
+        seed = random.SystemRandom().randrange(2 ** 63)
+        print(f"Master seed: {seed}")
+    task = functools.partial(_dynasty_shard, config, generations, seed)
+    summaries = [GenerationSummary() for _ in range(generations)]
+    shards = make_shards(dynasties, config.get("shard_size", 16384))
+    for part in iter_sharded(task, shards, workers, ProgressPrinter(dynasties)):
+        for summary, other in zip(summaries, part):
+            summary.merge(other)
+    return summaries
+
+
+def print_generations(summaries: List[GenerationSummary]):
+    """Print the per-generation table"""
+    print("\n=== DYNASTY SUMMARY ===")
+    print(f"{'Gen':>3}{'Heads':>9}{'Died':>8}{'Bankr.':>8}{'Married':>9}{'Heir':>8}"
+          f"{'Days':>8}{'Inherited':>11}{'Estate':>9}{'p5':>8}{'p50':>8}{'p95':>8}")
+    for generation, s in enumerate(summaries, 1):
+        if not s.heads:
+            break
+        q = s.estate_quantiles
+        print(f"{generation:>3}{s.heads:>9}{s.dead.rate:>8.1%}{s.bankrupt.rate:>8.1%}"
+              f"{s.married.rate:>9.1%}{s.heir.rate:>8.1%}{s.days.mean:>8.1f}"
+              f"{s.inherited.mean:>11.1f}{s.estate.mean:>9.1f}{q.quantile(0.05):>8.0f}"
+              f"{q.quantile(0.5):>8.0f}{q.quantile(0.95):>8.0f}")
+    spouses: Dict[str, int] = {}
+    for s in summaries:
+        for faction, count in s.spouses.items():
+            spouses[faction] = spouses.get(faction, 0) + count
+    if spouses:
+        print("Marriages: " + ", ".join(f"{f} {c}" for f, c in sorted(spouses.items())))
+
+
+def main():
+    """Main function"""
+    from balance_simulator import BalanceSimulator
+
+    parser = argparse.ArgumentParser(description="Multi-generation dynasty simulation")
+    parser.add_argument("--dynasties", type=int, default=10000, help="Number of dynasties")
+    parser.add_argument("--generations", type=int, default=10, help="Generations to play")
+    parser.add_argument("--seed", type=int, default=None, help="Master random seed")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes (0 = one per CPU)")
+    args = parser.parse_args()
+
+    config = BalanceSimulator().config
+    summaries = run_dynasties(config, args.dynasties, args.generations, seed=args.seed,
+                              workers=args.workers or os.cpu_count())
+    print_generations(summaries)
+
+if __name__ == "__main__":
+    main()
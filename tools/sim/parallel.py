@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Process-pool execution for the balance simulator
+Splits a batch into fixed shards, runs them across worker processes and
+merges the shard results back in run order
+"""
+
+import hashlib
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from typing import Callable, Iterator, List, Tuple
+
+# Shared count of finished runs, set in worker processes by _init_worker
+_progress = None
+
+
+def derive_seed(master_seed: int, *key) -> int:
+    """Derive an independent 64-bit seed from the master seed and a key"""
+    data = ":".join(str(part) for part in (master_seed,) + key).encode()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def make_shards(num_runs: int, shard_size: int) -> List[Tuple[int, int]]:
+    """Split num_runs into (start, count) shards of at most shard_size runs"""
+    return [
+        (start, min(shard_size, num_runs - start))
+        for start in range(0, num_runs, shard_size)
+    ]
+
+
+def report_progress(count: int):
+    """Add finished runs to the shared progress counter (no-op outside workers)"""
+    if _progress is not None:
+        with _progress.get_lock():
+            _progress.value += count
+
+
+def _init_worker(counter):
+    """Process-pool initializer: hook up the shared progress counter"""
+    global _progress
+    _progress = counter
+
+
+class ProgressPrinter:
+    """Prints aggregated 'Completed x/n' lines, at most once per interval"""
+
+    def __init__(self, total: int, interval: float = 1.0):
+        self.total = total
+        self.interval = interval
+        self._last_time = 0.0
+        self._last_done = -1
+
+    def __call__(self, done: int):
+        now = time.monotonic()
+        final = done >= self.total
+        if done == self._last_done or (not final and now - self._last_time < self.interval):
+            return
+        self._last_time = now
+        self._last_done = done
+        print(f"Completed {done}/{self.total} simulations...")
+
+
+def iter_sharded(task: Callable, shards: List[Tuple[int, int]], workers: int = 1,
+                 on_progress: Callable[[int], None] = None) -> Iterator:
+    """Run task(start, count) for every shard, yielding results in shard order
+
+    With workers > 1 shards are farmed out to a process pool; task must then be
+    picklable (a module-level function or functools.partial of one). Only a
+    small window of shards is in flight at once, so memory stays bounded
+    however many shards there are. Workers report finished runs through
+    report_progress and the parent polls the shared total, so progress is
+    aggregated across all workers. Run in-process, the task reports to a
+    local counter the same way, so on_progress sees the same units (which
+    need not be shard counts) either way.
+    """
+    global _progress
+    on_progress = on_progress or (lambda done: None)
+
+    if workers <= 1:
+        previous, _progress = _progress, multiprocessing.Value("q", 0)
+        try:
+            for start, count in shards:
+                result = task(start, count)
+                on_progress(_progress.value)
+                yield result
+        finally:
+            _progress = previous
+        return
+
+    context = multiprocessing.get_context()
+    counter = context.Value("q", 0)
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                               initializer=_init_worker, initargs=(counter,))
+    window = workers * 2
+    futures = {}
+    try:
+        for index in range(len(shards)):
+            while len(futures) < window and index + len(futures) < len(shards):
+                start, count = shards[index + len(futures)]
+                futures[index + len(futures)] = pool.submit(task, start, count)
+            head = futures.pop(index)
+            while not head.done():
+                wait([head], timeout=0.25)
+                on_progress(counter.value)
+            on_progress(counter.value)
+            yield head.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def run_sharded(task: Callable, shards: List[Tuple[int, int]], workers: int = 1,
+                on_progress: Callable[[int], None] = None) -> List:
+    """Run task(start, count) for every shard and return the results in shard order"""
+    return list(iter_sharded(task, shards, workers, on_progress))
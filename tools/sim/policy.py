@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Player policies for hazard choices
+Compiles policies (always-safe, greedy, trait-based or an explicit ranking)
+into per-hazard preference tables, evaluates many of them on common random
+numbers and searches for the ranking that plays best
+"""
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from content import Choice, Content, Effect, content_paths, load_content
+from stats import Moments, z_score
+
+POLICIES = ("random", "safe", "greedy", "traits")
+OBJECTIVES = ("days", "survival", "health", "reputation", "coins")
+
+# What outcomes are worth in coins when ranking choices; items are valued at
+# their best settlement sell price (1 coin if nobody buys them)
+VALUE_WEIGHTS = {
+    "reputation": 1.0,
+    "damage": 1.0,
+    "injury": 15.0,
+    "day": 2.0,
+    "heal": 10.0,
+}
+
+# A ranking is, per hazard, choice indices from most to least preferred
+Ranking = List[Tuple[int, ...]]
+
+
+class RankedChoices:
+    """A player that takes the highest-ranked choice it can
+
+    The compiled table holds, per hazard, every choice in preference order
+    with a flag for whether the run's traits allow it, so a roll is one
+    walk down a short tuple checking items. When nothing is available,
+    every choice is (as for TraitChoices) and the top-ranked one is taken.
+    The uniform draw is accepted and ignored, so policies consume the same
+    random numbers as the default player.
+    """
+
+    def __init__(self, hazards: List[Tuple[Choice, ...]], ranking: Ranking,
+                 traits: Sequence[str]):
+        self.ranking = [tuple(order) for order in ranking]
+        self.table = [
+            tuple((hazards[h][c], hazards[h][c].has_traits(traits)) for c in order)
+            for h, order in enumerate(self.ranking)
+        ]
+
+    def pick(self, index: int, inventory: Dict, u: float) -> Choice:
+        """The choice made at hazard index, given the inventory"""
+        table = self.table[index]
+        for choice, allowed in table:
+            if allowed and choice.has_items(inventory):
+                return choice
+        return table[0][0]
+
+    def preferred(self, index: int) -> Choice:
+        """The choice taken at hazard index when items are no object"""
+        return next((choice for choice, allowed in self.table[index] if allowed),
+                    self.table[index][0][0])
+
+
+def _item_values() -> Dict[str, float]:
+    from farm import default_prices
+
+    return default_prices()
+
+
+def effect_value(effect: Effect, prices: Dict[str, float]) -> float:
+    """Coin value of an outcome (negative for losses); random losses count 1.5 items"""
+    value = sum(prices.get(item, 1.0) * quantity for item, quantity in effect.gains)
+    value -= sum(prices.get(item, 1.0) * quantity for item, quantity in effect.losses)
+    value -= sum(prices.get(item, 1.0) * 1.5 for item in effect.random_losses)
+    value += VALUE_WEIGHTS["reputation"] * effect.reputation
+    value -= VALUE_WEIGHTS["damage"] * effect.damage
+    value -= VALUE_WEIGHTS["day"] * effect.lose_days
+    value -= VALUE_WEIGHTS["injury"] * (effect.injury is not None)
+    value += VALUE_WEIGHTS["heal"] * effect.heal
+    return value
+
+
+def expected_value(choice: Choice, prices: Dict[str, float]) -> float:
+    """Value of a choice averaged over success and failure"""
+    p = choice.success_chance
+    return p * effect_value(choice.success, prices) + (1 - p) * effect_value(choice.failure, prices)
+
+
+def harm(effect: Effect, prices: Dict[str, float]) -> float:
+    """Coin value of what an outcome costs, ignoring anything it gains"""
+    value = sum(prices.get(item, 1.0) * quantity for item, quantity in effect.losses)
+    value += sum(prices.get(item, 1.0) * 1.5 for item in effect.random_losses)
+    value += VALUE_WEIGHTS["reputation"] * max(0, -effect.reputation)
+    value += VALUE_WEIGHTS["damage"] * effect.damage
+    value += VALUE_WEIGHTS["day"] * effect.lose_days
+    value += VALUE_WEIGHTS["injury"] * (effect.injury is not None)
+    return value
+
+
+def expected_harm(choice: Choice, prices: Dict[str, float]) -> float:
+    """Expected cost of a choice, ignoring anything it gains"""
+    p = choice.success_chance
+    return p * harm(choice.success, prices) + (1 - p) * harm(choice.failure, prices)
+
+
+def rank(content: Content, key: Callable[[Choice], float]) -> Ranking:
+    """Per hazard, choices sorted by key (lowest first; ties keep file order)"""
+    return [tuple(sorted(range(len(choices)), key=lambda c: key(choices[c])))
+            for choices in content.hazards]
+
+
+def builtin_ranking(content: Content, name: str, traits: Sequence[str] = (),
+                    prices: Optional[Dict[str, float]] = None) -> Ranking:
+    """The ranking behind a named policy
+
+    safe: least expected harm first, then most likely to succeed
+    greedy: highest expected value first
+    traits: choices that need the run's traits first (the more the
+        better), then greedy; a specialist plays to its strengths
+    """
+    prices = _item_values() if prices is None else prices
+    if name == "safe":
+        return rank(content, lambda c: (expected_harm(c, prices), -c.success_chance))
+    if name == "greedy":
+        return rank(content, lambda c: -expected_value(c, prices))
+    if name == "traits":
+        def uses(choice: Choice) -> int:
+            return sum(any(r in t or t in r for t in traits) for r in choice.traits)
+        return rank(content, lambda c: (-uses(c), -expected_value(c, prices)))
+    raise ValueError(f"Unknown policy '{name}', expected one of {POLICIES}")
+
+
+def explicit_ranking(content: Content, spec: Dict[str, List[str]]) -> Ranking:
+    """Ranking from {hazard id: [choice ids, most preferred first]}
+
+    Hazards left out, and choices left out of a list, follow in file order.
+    """
+    ranking = []
+    for h, hazard in enumerate(content.hazard_ids):
+        ids = [choice.id for choice in content.hazards[h]]
+        order = [ids.index(choice) for choice in spec.get(hazard, [])]
+        ranking.append(tuple(order + [c for c in range(len(ids)) if c not in order]))
+    unknown = set(spec) - set(content.hazard_ids)
+    if unknown:
+        raise ValueError(f"Policy ranks unknown hazards: {sorted(unknown)}")
+    return ranking
+
+
+def compile_policy(content: Content, spec: Union[str, Dict], traits: Sequence[str]):
+    """The player for a config's content "policy": a name or an explicit ranking"""
+    if spec == "random":
+        return content.choices_for(traits)
+    if isinstance(spec, str):
+        ranking = builtin_ranking(content, spec, traits)
+    else:
+        ranking = explicit_ranking(content, spec)
+    return RankedChoices(content.hazards, ranking, traits)
+
+
+def ranking_spec(content: Content, ranking: Ranking) -> Dict[str, List[str]]:
+    """A ranking as the {hazard id: [choice ids]} a config takes"""
+    return {
+        hazard: [content.hazards[h][c].id for c in ranking[h]]
+        for h, hazard in enumerate(content.hazard_ids)
+    }
+
+
+class PolicyEvaluator:
+    """Plays policies on common random numbers and scores them
+
+    Every policy plays runs 0..runs-1 of the same master seed, so run i of
+    each faces the same draws until their choices make it diverge, and
+    differences between policies are measured per run (paired) rather
+    than between two noisy averages.
+    """
+
+    def __init__(self, config: Dict, runs: int, seed: int, objective: str = "days",
+                 engine: str = "python", workers: int = 1):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective '{objective}', expected one of {OBJECTIVES}")
+        self.config = config
+        self.runs = runs
+        self.seed = seed
+        self.objective = objective
+        self.engine = engine
+        self.workers = workers
+        self.content = load_content(*content_paths(config["content"]))
+        self.evaluations = 0
+
+    def scores(self, spec: Union[str, Dict]):
+        """(per-run objective values, result table) of a policy"""
+        from balance_simulator import BalanceSimulator
+
+        config = copy.deepcopy(self.config)
+        config["content"]["policy"] = spec
+        simulator = BalanceSimulator(config=config, engine=self.engine, seed=self.seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            table = simulator.run_batch(self.runs, workers=self.workers)
+        self.evaluations += 1
+        return self._objective(table), table
+
+    def check_baseline(self, spec: Union[str, Dict]):
+        """Scores of the baseline policy, refusing a scenario no run survives
+
+        With every run dead, the survival objective is flat and paired
+        differences only measure how long runs take to die, so rankings
+        against it mean nothing; raises ValueError instead.
+        """
+        values, table = self.scores(spec)
+        if not len(table) or np.asarray(table["dead"]).all():
+            raise ValueError(
+                f"No run survived under the baseline policy {spec!r} "
+                f"({len(table)} runs); check the content and config calibration")
+        return values, table
+
+    def _objective(self, table) -> np.ndarray:
+        if self.objective == "survival":
+            return 1.0 - np.asarray(table["dead"], dtype=np.float64)
+        column = {"days": "day"}.get(self.objective, self.objective)
+        return np.asarray(table[column], dtype=np.float64)
+
+    def search(self, start: Ranking, passes: int = 3,
+               on_step: Optional[Callable[[int, float], None]] = None) -> Tuple[Ranking, float]:
+        """Coordinate ascent over rankings, one hazard at a time
+
+        For each hazard, every choice is tried as the top preference with
+        the rest of the ranking fixed, and the best is kept; passes repeat
+        until nothing improves. Each try is one policy evaluation.
+        """
+        best = [tuple(order) for order in start]
+        best_score = float(self.scores(ranking_spec(self.content, best))[0].mean())
+        for _ in range(passes):
+            improved = False
+            for h, order in enumerate(best):
+                for c in order[1:]:
+                    trial = list(best)
+                    trial[h] = (c,) + tuple(o for o in order if o != c)
+                    score = float(self.scores(ranking_spec(self.content, trial))[0].mean())
+                    if on_step is not None:
+                        on_step(self.evaluations, score)
+                    if score > best_score:
+                        best, best_score, improved = trial, score, True
+                order = best[h]
+            if not improved:
+                break
+        return best, best_score
+
+
+def _paired(values: np.ndarray, baseline: np.ndarray) -> Moments:
+    moments = Moments()
+    moments.update(values - baseline)
+    return moments
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Evaluate player policies for hazard choices")
+    parser.add_argument("--policies", default=",".join(POLICIES),
+                        help="Comma-separated policies to compare (first is the baseline)")
+    parser.add_argument("--search", action="store_true",
+                        help="Also search for the best ranking, starting from greedy")
+    parser.add_argument("--passes", type=int, default=3, help="Search passes")
+    parser.add_argument("--runs", type=int, default=2000, help="Runs per policy")
+    parser.add_argument("--seed", type=int, default=42, help="Master random seed")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="days",
+                        help="What policies are ranked by")
+    parser.add_argument("--traits", default="", help="Comma-separated traits of the runs")
+    parser.add_argument("--items", default="grain=10,metal_scrap=5,weapons=1,provisions=4",
+                        help="Starting items as item=count,...")
+    parser.add_argument("--engine", choices=("python", "event"), default="python",
+                        help="Simulation engine")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes (0 = one per CPU)")
+    parser.add_argument("--output", default="reports/policies.json",
+                        help="Where to write the scores and the best ranking")
+    args = parser.parse_args()
+
+    from balance_simulator import BalanceSimulator
+
+    config = BalanceSimulator().config
+    traits = [t for t in args.traits.split(",") if t]
+    items = {}
+    for pair in filter(None, args.items.split(",")):
+        item, count = pair.split("=")
+        items[item] = int(count)
+    config["content"] = dict(config.get("content") or {}, traits=traits, starting_items=items)
+    evaluator = PolicyEvaluator(config, args.runs, args.seed, args.objective, args.engine,
+                                args.workers or os.cpu_count())
+    content = evaluator.content
+
+    policies = {name: name for name in args.policies.split(",") if name}
+    unknown = [name for name in policies if name not in POLICIES]
+    if unknown:
+        parser.error(f"Unknown policies: {', '.join(unknown)} "
+                     f"(expected some of {', '.join(POLICIES)})")
+    if not policies:
+        parser.error("--policies needs at least one policy")
+    base = next(iter(policies))
+    try:
+        results = {base: evaluator.check_baseline(base)}
+    except ValueError as error:
+        parser.error(str(error))
+    if args.search:
+        start = builtin_ranking(content, "greedy", traits)
+        print(f"Searching rankings ({args.passes} passes at most)...")
+        best, _ = evaluator.search(
+            start, args.passes,
+            on_step=lambda n, score: print(f"  {n} policies evaluated, last scored {score:.2f}")
+            if n % 10 == 0 else None)
+        policies["search"] = ranking_spec(content, best)
+
+    baseline = results[base][0]
+    for name, spec in policies.items():
+        values, table = results[name] if name in results else evaluator.scores(spec)
+        results[name] = (values, table, _paired(values, baseline))
+
+    level = z_score(0.95)
+    print(f"\n=== POLICIES ({args.objective}, {args.runs} runs each, "
+          f"paired against {base}) ===")
+    print(f"{'Policy':<10}{'Score':>10}{'vs base':>10}{'+/-':>8}{'Survival':>10}"
+          f"{'Bankrupt':>10}{'Health':>8}{'Rep.':>8}{'Injuries':>10}")
+    ranked = sorted(results.items(), key=lambda item: -item[1][0].mean())
+    for name, (values, table, paired) in ranked:
+        half = level * paired.std / np.sqrt(max(paired.count, 1))
+        print(f"{name:<10}{values.mean():>10.2f}{paired.mean:>+10.2f}{half:>8.2f}"
+              f"{1 - table['dead'].mean():>10.1%}{table['bankrupt'].mean():>10.1%}"
+              f"{table['health'].mean():>8.1f}{table['reputation'].mean():>8.1f}"
+              f"{table['injuries'].mean():>10.2f}")
+
+    # The choice each policy goes for first (among those its traits allow):
+    # one every top policy agrees on dominates its hazard
+    print("\nPreferred choice per hazard:")
+    players = {name: compile_policy(content, spec, traits)
+               for name, spec in policies.items() if spec != "random"}
+    for h, hazard in enumerate(content.hazard_ids):
+        picks = ", ".join(f"{name}: {player.preferred(h).id}" for name, player in players.items())
+        print(f"  {hazard:<18} {picks}")
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({
+            "objective": args.objective,
+            "runs": args.runs,
+            "seed": args.seed,
+            "scores": {name: float(values.mean()) for name, (values, _, _) in ranked},
+            "policies": {name: spec for name, spec in policies.items()},
+            "evaluations": evaluator.evaluations,
+        }, f, indent=2)
+    print(f"\n{evaluator.evaluations} policies evaluated; written to {args.output}")
+
+if __name__ == "__main__":
+    main()
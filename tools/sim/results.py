@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Columnar result storage for the balance simulator
+Keeps per-run results as fixed-width typed columns and streams them to disk
+as CSV and/or a directory of .npy column files
+"""
+
+import csv
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Column name -> dtype. marriage_day is -1 for runs that never married;
+# injuries is how many the run ended with.
+COLUMNS = {
+    "day": np.dtype("<i4"),
+    "dead": np.dtype("|b1"),
+    "marriage_day": np.dtype("<i4"),
+    "bankrupt": np.dtype("|b1"),
+    "entropy_order": np.dtype("<f8"),
+    "entropy_wild": np.dtype("<f8"),
+    "coins": np.dtype("<i8"),
+    "food": np.dtype("<i8"),
+    "health": np.dtype("<i4"),
+    "reputation": np.dtype("<i4"),
+    "injuries": np.dtype("<i4"),
+}
+
+CSV_HEADER = [
+    "Run", "Days", "Dead", "Marriage_Day", "Bankrupt",
+    "Final_Order", "Final_Wild", "Final_Coins"
+]
+
+# .npy headers are written at a fixed size so the row count can be patched
+# in place once a streamed column is complete
+_NPY_HEADER_SIZE = 128
+_FORMAT_VERSION = 2
+
+
+class ResultTable:
+    """Per-run simulation results as fixed-width typed columns"""
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = {
+            name: np.asarray(columns[name], dtype=dtype) for name, dtype in COLUMNS.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.columns["day"])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    @classmethod
+    def empty(cls) -> "ResultTable":
+        """Table with no rows"""
+        return cls({name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()})
+
+    @classmethod
+    def from_states(cls, states: List[Dict]) -> "ResultTable":
+        """Build a table from run_simulation state dicts"""
+        return cls({
+            "day": [s["day"] for s in states],
+            "dead": [s["dead"] for s in states],
+            "marriage_day": [
+                -1 if s["marriage_days"] is None else s["marriage_days"] for s in states
+            ],
+            "bankrupt": [s["bankrupt"] for s in states],
+            "entropy_order": [s["entropy_order"] for s in states],
+            "entropy_wild": [s["entropy_wild"] for s in states],
+            "coins": [s["resources"]["coins"] for s in states],
+            "food": [s["resources"]["food"] for s in states],
+            "health": [s["health"] for s in states],
+            "reputation": [s["reputation"] for s in states],
+            "injuries": [len(s["injuries"]) for s in states],
+        })
+
+    @classmethod
+    def concat(cls, tables: Iterable["ResultTable"]) -> "ResultTable":
+        """Join tables in order"""
+        tables = list(tables)
+        if not tables:
+            return cls.empty()
+        return cls({
+            name: np.concatenate([table.columns[name] for table in tables])
+            for name in COLUMNS
+        })
+
+    def slice(self, start: int, stop: int) -> "ResultTable":
+        """Rows [start, stop) as a view"""
+        return ResultTable({name: values[start:stop] for name, values in self.columns.items()})
+
+    def to_states(self) -> List[Dict]:
+        """Convert back to run_simulation-style state dicts (injuries as a count)"""
+        rows = zip(*(self.columns[name].tolist() for name in COLUMNS))
+        return [
+            {
+                "day": day,
+                "dead": dead,
+                "marriage_days": married if married >= 0 else None,
+                "bankrupt": bankrupt,
+                "entropy_order": order,
+                "entropy_wild": wild,
+                "resources": {"coins": coins, "food": food},
+                "health": health,
+                "reputation": reputation,
+                "injuries": injuries,
+            }
+            for (day, dead, married, bankrupt, order, wild, coins, food,
+                 health, reputation, injuries) in rows
+        ]
+
+
+def _npy_header(dtype: np.dtype, rows: int) -> bytes:
+    """Version 1.0 .npy header for a 1-D array, padded to _NPY_HEADER_SIZE"""
+    header = repr({
+        "descr": np.lib.format.dtype_to_descr(dtype),
+        "fortran_order": False,
+        "shape": (rows,),
+    })
+    header = header.ljust(_NPY_HEADER_SIZE - 11) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+def columns_path(report_path: str) -> Path:
+    """Directory holding the .npy columns that go with a CSV report path"""
+    return Path(report_path).with_suffix(".columns")
+
+
+def _partial_path(directory: Path, name: str) -> Path:
+    """Where a column is written until its writer closes"""
+    return directory / f"{name}.npy.partial"
+
+
+class ResultWriter:
+    """Streams result tables to disk chunk by chunk
+
+    Writes the CSV report and/or a columns directory with one .npy file per
+    column plus meta.json. Nothing is held in memory beyond the chunk being
+    written, and the columns load back memory-mapped through load_results.
+    Passing resume, the position() of an earlier writer, reopens its
+    outputs cut back to that point and carries on appending.
+
+    Columns are written to .partial files and only replace the .npy files
+    on close, so the previous results stay readable (and any memory-mapped
+    load_results of them valid) while a report is rewritten over them.
+    """
+
+    def __init__(self, report_path: str, csv_output: bool = True,
+                 columns_output: bool = True, metadata: Optional[Dict] = None,
+                 resume: Optional[Dict] = None):
+        self.report_path = Path(report_path)
+        self.columns_dir = columns_path(report_path)
+        self.metadata = dict(metadata or {})
+        self.rows = 0 if resume is None else resume["rows"]
+        self._csv_file = None
+        self._csv = None
+        self._column_files = {}
+
+        self.report_path.parent.mkdir(parents=True, exist_ok=True)
+        if csv_output:
+            if resume is None:
+                self._csv_file = open(self.report_path, "w", newline="")
+            else:
+                os.truncate(self.report_path, resume["csv"])
+                self._csv_file = open(self.report_path, "a", newline="")
+            self._csv = csv.writer(self._csv_file)
+            if resume is None:
+                self._csv.writerow(CSV_HEADER)
+        if columns_output:
+            self.columns_dir.mkdir(parents=True, exist_ok=True)
+            for name, dtype in COLUMNS.items():
+                partial = _partial_path(self.columns_dir, name)
+                if resume is None:
+                    handle = open(partial, "wb")
+                    handle.write(_npy_header(dtype, 0))
+                else:
+                    if not partial.exists():
+                        # The interrupted writer was closed, moving it into place
+                        os.replace(self.columns_dir / f"{name}.npy", partial)
+                    handle = open(partial, "r+b")
+                    handle.truncate(resume["columns"][name])
+                    handle.seek(resume["columns"][name])
+                self._column_files[name] = handle
+
+    def __enter__(self) -> "ResultWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, table: ResultTable):
+        """Append a chunk of results"""
+        if self._csv is not None:
+            self._write_csv(table)
+        for name, handle in self._column_files.items():
+            handle.write(table.columns[name].tobytes())
+        self.rows += len(table)
+
+    def _write_csv(self, table: ResultTable):
+        """Append a chunk of CSV rows"""
+        married = table["marriage_day"].tolist()
+        self._csv.writerows(zip(
+            range(self.rows + 1, self.rows + len(table) + 1),
+            table["day"].tolist(),
+            table["dead"].tolist(),
+            [day if day >= 0 else "" for day in married],
+            table["bankrupt"].tolist(),
+            np.round(table["entropy_order"], 2).tolist(),
+            np.round(table["entropy_wild"], 2).tolist(),
+            table["coins"].tolist(),
+        ))
+
+    def flush(self):
+        """Push everything written so far to disk"""
+        if self._csv_file is not None:
+            self._csv_file.flush()
+        for handle in self._column_files.values():
+            handle.flush()
+
+    def position(self) -> Dict:
+        """Flush to disk and return how much has been written, for resuming"""
+        self.flush()
+        for handle in [self._csv_file, *self._column_files.values()]:
+            if handle is not None:
+                os.fsync(handle.fileno())
+        return {
+            "rows": self.rows,
+            "csv": None if self._csv_file is None else self._csv_file.tell(),
+            "columns": {name: handle.tell() for name, handle in self._column_files.items()},
+        }
+
+    def close(self):
+        """Finish the outputs: patch row counts into the headers, write meta.json"""
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = None
+        for name, handle in self._column_files.items():
+            handle.seek(0)
+            handle.write(_npy_header(COLUMNS[name], self.rows))
+            handle.close()
+            os.replace(_partial_path(self.columns_dir, name), self.columns_dir / f"{name}.npy")
+        if self._column_files:
+            meta = dict(self.metadata, format=_FORMAT_VERSION, rows=self.rows,
+                        columns={name: dtype.str for name, dtype in COLUMNS.items()})
+            with open(self.columns_dir / "meta.json", "w") as f:
+                json.dump(meta, f, indent=2)
+        self._column_files = {}
+
+
+def load_results(report_path: str) -> ResultTable:
+    """Load a streamed report's columns back, memory-mapped"""
+    directory = columns_path(report_path)
+    with open(directory / "meta.json") as f:
+        meta = json.load(f)
+    if meta.get("format") != _FORMAT_VERSION:
+        raise ValueError(f"Unsupported results format in {directory}: {meta.get('format')}")
+    if not meta["rows"]:
+        return ResultTable.empty()
+    return ResultTable({
+        name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in COLUMNS
+    })
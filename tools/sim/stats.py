@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Online statistics for the balance simulator
+Single-pass, mergeable aggregates: Welford moments, a relative-error quantile
+sketch and proportion confidence intervals
+"""
+
+import math
+from statistics import NormalDist
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+def z_score(confidence: float) -> float:
+    """Two-sided normal critical value for a confidence level"""
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+class Moments:
+    """Running count, mean, variance, min and max (Welford / Chan et al.)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values: np.ndarray):
+        """Fold a chunk of values in"""
+        values = np.asarray(values, dtype=np.float64)
+        if not values.size:
+            return
+        chunk = Moments()
+        chunk.count = values.size
+        chunk.mean = float(values.mean())
+        chunk.m2 = float(((values - chunk.mean) ** 2).sum())
+        chunk.min = float(values.min())
+        chunk.max = float(values.max())
+        self.merge(chunk)
+
+    def merge(self, other: "Moments"):
+        """Combine with moments gathered elsewhere"""
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> float:
+        """Sample variance"""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        """Sample standard deviation"""
+        return math.sqrt(self.variance)
+
+    def confidence_interval(self, confidence: float = 0.95) -> Tuple[float, float]:
+        """Normal-approximation interval for the mean"""
+        if not self.count:
+            return (math.nan, math.nan)
+        half = z_score(confidence) * self.std / math.sqrt(self.count)
+        return (self.mean - half, self.mean + half)
+
+
+class Proportion:
+    """Running success count with Wilson score intervals"""
+
+    def __init__(self):
+        self.count = 0
+        self.successes = 0
+
+    def update(self, flags: np.ndarray):
+        """Fold a chunk of boolean outcomes in"""
+        flags = np.asarray(flags)
+        self.count += flags.size
+        self.successes += int(np.count_nonzero(flags))
+
+    def merge(self, other: "Proportion"):
+        """Combine with a proportion gathered elsewhere"""
+        self.count += other.count
+        self.successes += other.successes
+
+    @property
+    def rate(self) -> float:
+        """Observed proportion"""
+        return self.successes / self.count if self.count else 0.0
+
+    def confidence_interval(self, confidence: float = 0.95) -> Tuple[float, float]:
+        """Wilson score interval"""
+        if not self.count:
+            return (0.0, 1.0)
+        z = z_score(confidence)
+        n = self.count
+        p = self.rate
+        denominator = 1 + z * z / n
+        center = (p + z * z / (2 * n)) / denominator
+        half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+        return (max(0.0, center - half), min(1.0, center + half))
+
+    def half_width(self, confidence: float = 0.95) -> float:
+        """Half the width of the Wilson interval"""
+        low, high = self.confidence_interval(confidence)
+        return (high - low) / 2
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error (DDSketch-style)
+
+    Values are counted in logarithmic buckets, so any quantile comes back
+    within `accuracy` relative error using memory proportional to the log of
+    the value range. Sketches merge by adding bucket counts.
+    """
+
+    def __init__(self, accuracy: float = 0.01):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+
+    def update(self, values: np.ndarray):
+        """Fold a chunk of values in"""
+        values = np.asarray(values, dtype=np.float64)
+        self.count += values.size
+        self.zeros += int(np.count_nonzero(values == 0))
+        for store, part in ((self.positive, values[values > 0]),
+                            (self.negative, -values[values < 0])):
+            if part.size:
+                keys, counts = np.unique(
+                    np.ceil(np.log(part) / self._log_gamma).astype(np.int64),
+                    return_counts=True,
+                )
+                for key, count in zip(keys.tolist(), counts.tolist()):
+                    store[key] = store.get(key, 0) + count
+
+    def merge(self, other: "QuantileSketch"):
+        """Combine with a sketch gathered elsewhere (same accuracy)"""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for store, incoming in ((self.positive, other.positive),
+                                (self.negative, other.negative)):
+            for key, count in incoming.items():
+                store[key] = store.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def _value(self, key: int) -> float:
+        """Representative value of a bucket"""
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q: float) -> float:
+        """Estimate the q-quantile, 0 <= q <= 1"""
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive))
+
+
+class BatchSummary:
+    """Everything the simulator reports about a batch, updated chunk by chunk
+
+    Shards summarise their own results and the summaries merge, so a batch
+    never needs a second pass over its rows.
+    """
+
+    PERCENTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+    def __init__(self):
+        self.dead = Proportion()
+        self.bankrupt = Proportion()
+        self.married = Proportion()
+        self.days = Moments()
+        self.coins = Moments()
+        self.marriage_day = Moments()
+        self.entropy_order = Moments()
+        self.entropy_wild = Moments()
+        self.health = Moments()
+        self.reputation = Moments()
+        self.injuries = Moments()
+        self.days_quantiles = QuantileSketch()
+        self.coins_quantiles = QuantileSketch()
+
+    @property
+    def runs(self) -> int:
+        """Number of runs summarised"""
+        return self.dead.count
+
+    @classmethod
+    def from_table(cls, table) -> "BatchSummary":
+        """Summary of a ResultTable"""
+        summary = cls()
+        summary.update(table)
+        return summary
+
+    def update(self, table):
+        """Fold a ResultTable chunk in"""
+        married = table["marriage_day"] >= 0
+        self.dead.update(table["dead"])
+        self.bankrupt.update(table["bankrupt"])
+        self.married.update(married)
+        self.days.update(table["day"])
+        self.coins.update(table["coins"])
+        self.marriage_day.update(table["marriage_day"][married])
+        self.entropy_order.update(table["entropy_order"])
+        self.entropy_wild.update(table["entropy_wild"])
+        self.health.update(table["health"])
+        self.reputation.update(table["reputation"])
+        self.injuries.update(table["injuries"])
+        self.days_quantiles.update(table["day"])
+        self.coins_quantiles.update(table["coins"])
+
+    def merge(self, other: "BatchSummary"):
+        """Combine with another summary"""
+        for name, aggregate in vars(self).items():
+            aggregate.merge(getattr(other, name))
+
+    def survival(self) -> Proportion:
+        """Survival as a proportion (complement of dead)"""
+        alive = Proportion()
+        alive.count = self.dead.count
+        alive.successes = self.dead.count - self.dead.successes
+        return alive
+
+    def is_precise(self, precision: float, confidence: float = 0.95) -> bool:
+        """True once survival and bankruptcy CIs are within +/- precision"""
+        return (self.runs > 0
+                and self.dead.half_width(confidence) <= precision
+                and self.bankrupt.half_width(confidence) <= precision)
+
+    def metrics(self, confidence: float = 0.95) -> Dict[str, float]:
+        """Headline numbers as a flat dict (rates, means, CI bounds, medians)"""
+        survival = self.survival()
+        metrics = {"runs": self.runs}
+        for name, proportion in (("survival", survival), ("bankruptcy", self.bankrupt),
+                                 ("marriage", self.married)):
+            low, high = proportion.confidence_interval(confidence)
+            metrics[f"{name}_rate"] = proportion.rate
+            metrics[f"{name}_low"] = low
+            metrics[f"{name}_high"] = high
+        for name, moments in (("days", self.days), ("coins", self.coins),
+                              ("marriage_day", self.marriage_day),
+                              ("entropy_order", self.entropy_order),
+                              ("entropy_wild", self.entropy_wild)):
+            metrics[f"avg_{name}"] = moments.mean
+        metrics["days_p50"] = self.days_quantiles.quantile(0.5)
+        metrics["coins_p50"] = self.coins_quantiles.quantile(0.5)
+        return metrics
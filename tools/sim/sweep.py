@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Config sweeps for the balance simulator
+Runs the simulator over a grid or random sample of config values and caches
+each point's summary on disk, keyed by a hash of everything that decides it
+"""
+
+import argparse
+import copy
+import csv
+import hashlib
+import itertools
+import json
+import os
+import random
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from balance_simulator import ENGINES, SIMULATOR_VERSION, BalanceSimulator
+from content import content_paths
+from economy import DEFAULT_PATHS as MARKET_PATHS
+from farm import farm_paths
+from travel import DEFAULT_REGIONS
+from parallel import derive_seed
+
+DEFAULT_CACHE_DIR = "reports/sweep_cache"
+
+
+def set_path(config: Dict, path: str, value):
+    """Set a dotted key such as 'starting_resources.coins' in a nested config"""
+    *parents, leaf = path.split(".")
+    node = config
+    for key in parents:
+        if not isinstance(node.get(key), dict):
+            raise KeyError(f"Config has no section '{key}' (in '{path}')")
+        node = node[key]
+    node[leaf] = value
+
+
+def grid_points(grid: Dict[str, List]) -> List[Dict]:
+    """Every combination of the grid's values, as {dotted key: value} dicts"""
+    if not grid:
+        return []
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+
+
+def random_points(ranges: Dict[str, List], samples: int, seed: int) -> List[Dict]:
+    """Uniform samples from [low, high] ranges; integer bounds give integers"""
+    rng = random.Random(derive_seed(seed, "sweep"))
+    points = []
+    for _ in range(samples):
+        point = {}
+        for key, (low, high) in ranges.items():
+            if isinstance(low, int) and isinstance(high, int):
+                point[key] = rng.randint(low, high)
+            else:
+                point[key] = round(rng.uniform(low, high), 6)
+        points.append(point)
+    return points
+
+
+def cache_key(config: Dict, seed: int, runs: int, engine: str,
+              precision: Optional[float] = None) -> str:
+    """Content hash of everything that determines a sweep point's results"""
+    payload = {
+        "config": config,
+        "seed": seed,
+        "runs": runs,
+        "engine": engine,
+        "precision": precision,
+        "version": SIMULATOR_VERSION,
+    }
+    if config.get("content") is not None:
+        # Content files shape the results as much as the config does
+        payload["content"] = [_file_digest(path) for path in content_paths(config["content"])]
+    if config.get("farm") is not None:
+        payload["farm"] = [_file_digest(path) for path in farm_paths(config["farm"])]
+    # Farms without explicit prices, and the built-in ranked policies,
+    # value goods at farm.default_prices(), which come from the market data
+    policy = (config.get("content") or {}).get("policy", "random")
+    ranked = isinstance(policy, str) and policy != "random"
+    if ranked or (config.get("farm") is not None and config["farm"].get("prices") is None):
+        payload["market"] = [_file_digest(path) for path in MARKET_PATHS.values()]
+    if config.get("travel") is not None:
+        payload["travel"] = _file_digest(config["travel"].get("regions", DEFAULT_REGIONS))
+    if config.get("world_events") and Path(config["world_events"]).exists():
+        payload["world_events"] = _file_digest(config["world_events"])
+    data = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+def _file_digest(path: str) -> str:
+    """SHA-256 of a file's contents"""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class ResultCache:
+    """On-disk cache of sweep point results, one JSON file per key"""
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR):
+        self.directory = Path(directory)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Cached record for key, or None"""
+        path = self._path(key)
+        if not path.exists():
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def put(self, key: str, record: Dict):
+        """Store a record; written to a temp file first so readers never see half a file"""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(record, f, indent=2)
+        os.replace(tmp, path)
+
+
+class Sweep:
+    """A set of config points to simulate, declared as grids and/or random ranges
+
+    Spec keys:
+        base: optional config file; defaults to the simulator's default config
+        runs, seed, engine: batch settings shared by every point
+        precision: optional; run each point with run_until instead of run_batch
+        grid: {dotted key: [values]}, every combination is a point
+        random: {"samples": n, "ranges": {dotted key: [low, high]}}
+    Grid and random points are concatenated. Every point uses the same seed,
+    so differences between points are not drowned out by sampling noise.
+    """
+
+    def __init__(self, spec: Dict):
+        self.spec = spec
+        self.runs = spec.get("runs", 1000)
+        self.seed = spec.get("seed", 0)
+        self.engine = spec.get("engine", "numpy")
+        self.precision = spec.get("precision")
+        if self.engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{self.engine}', expected one of {ENGINES}")
+        self.base = BalanceSimulator(config_path=spec.get("base", "data/sim_config.json")).config
+
+    @classmethod
+    def load(cls, path: str) -> "Sweep":
+        """Load a sweep spec from JSON"""
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def points(self) -> List[Dict]:
+        """The sweep's parameter points"""
+        points = grid_points(self.spec.get("grid", {}))
+        sampled = self.spec.get("random")
+        if sampled:
+            points += random_points(sampled["ranges"], sampled["samples"], self.seed)
+        return points or [{}]
+
+    def resolve(self, point: Dict) -> Dict:
+        """Full config for one point"""
+        config = copy.deepcopy(self.base)
+        for path, value in point.items():
+            set_path(config, path, value)
+        return config
+
+    def run(self, cache: ResultCache, workers: int = 1, refresh: bool = False) -> List[Dict]:
+        """Run every point not already cached and return one row per point"""
+        rows = []
+        points = self.points()
+        for index, point in enumerate(points, 1):
+            config = self.resolve(point)
+            key = cache_key(config, self.seed, self.runs, self.engine, self.precision)
+            record = None if refresh else cache.get(key)
+            status = "cached"
+            if record is None:
+                status = "ran"
+                record = {"params": point, "metrics": self._simulate(config, workers)}
+                cache.put(key, record)
+            print(f"[{index}/{len(points)}] {status}: {_describe(point)}")
+            rows.append(dict(point, **record["metrics"]))
+        return rows
+
+    def _simulate(self, config: Dict, workers: int) -> Dict:
+        """Simulate one point and summarise it"""
+        simulator = BalanceSimulator(config=config, engine=self.engine, seed=self.seed)
+        if self.precision is None:
+            simulator.run_batch(self.runs, workers=workers)
+        else:
+            simulator.run_until(self.precision, max_runs=self.runs, workers=workers)
+        return simulator.summary.metrics()
+
+
+def _describe(point: Dict) -> str:
+    """Short 'key=value' description of a point"""
+    return ", ".join(f"{key}={value}" for key, value in point.items()) or "(base config)"
+
+
+def write_table(rows: List[Dict], output_path: str):
+    """Write sweep rows as CSV"""
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    fields = list(dict.fromkeys(key for row in rows for key in row))
+    with open(output_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def print_table(rows: List[Dict], params: List[str]):
+    """Print the headline columns of a sweep"""
+    columns = params + ["runs", "survival_rate", "bankruptcy_rate", "marriage_rate",
+                        "avg_days", "avg_coins"]
+    cells = [[_format(row.get(column)) for column in columns] for row in rows]
+    widths = [max(len(column), *(len(line[i]) for line in cells))
+              for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for line in cells:
+        print("  ".join(cell.ljust(width) for cell, width in zip(line, widths)))
+
+
+def _format(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Balance simulator config sweeps")
+    parser.add_argument("spec", help="Sweep spec (JSON)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes per point (0 = one per CPU)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_DIR, help="Result cache directory")
+    parser.add_argument("--output", default="reports/sweep.csv", help="Summary CSV path")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Ignore cached results and rerun every point")
+    args = parser.parse_args()
+
+    sweep = Sweep.load(args.spec)
+    rows = sweep.run(ResultCache(args.cache), workers=args.workers or os.cpu_count(),
+                     refresh=args.refresh)
+    params = list(dict.fromkeys(key for point in sweep.points() for key in point))
+    print()
+    print_table(rows, params)
+    write_table(rows, args.output)
+    print(f"\nSweep table saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Travel-route index for the balance simulator
+Builds all-pairs shortest routes over data/world/regions.json once, caches
+them on disk keyed by the file's contents, and answers trip cost lookups in
+O(1), following WorldController.calculate_travel_distance / start_travel
+"""
+
+import argparse
+import functools
+import hashlib
+import math
+import os
+import random
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from datapack import load_json
+DEFAULT_REGIONS = "data/world/regions.json"
+DEFAULT_CACHE_DIR = "reports/route_cache"
+
+# WorldController travel costs per unit of distance, per leg
+DAYS_PER_UNIT = 0.5
+FUEL_PER_UNIT = 0.5
+FOOD_PER_DAY = 1
+
+# Coins per unit a run pays to top up food and fuel before a trip, at the
+# ash caravan's base prices. Nothing else restores fuel, so without it a
+# run's starting 5 fuel never covers a round trip (6 at the cheapest)
+DEFAULT_RESUPPLY = {"food": 3, "fuel": 4}
+
+# Chance that a leg (the journey out or back) runs into a hazard. The game
+# does not schedule road hazards yet, so this is a tuning assumption
+DEFAULT_LEG_HAZARD_CHANCE = 0.5
+
+# Bump when the cached arrays change meaning
+_INDEX_VERSION = 1
+
+
+class RouteIndex:
+    """All-pairs shortest routes between regions as (from, to) matrices
+
+    Legs are the regions' connections, weighted by the straight-line
+    distance the game charges for them. distance, hops, days and fuel hold
+    the totals along the shortest route (days and fuel are charged per leg,
+    rounded up, as start_travel does); next_hop[i, j] is the first region
+    after i on it. Unreachable pairs have infinite distance and -1
+    elsewhere.
+    """
+
+    def __init__(self, ids: List[str], distance: np.ndarray, hops: np.ndarray,
+                 days: np.ndarray, fuel: np.ndarray, next_hop: np.ndarray):
+        self.ids = ids
+        self.index = {region: i for i, region in enumerate(ids)}
+        self.distance = distance
+        self.hops = hops
+        self.days = days
+        self.fuel = fuel
+        self.next_hop = next_hop
+
+    @classmethod
+    def build(cls, regions: List[Dict]) -> "RouteIndex":
+        """Floyd-Warshall over the region graph, each pivot as one matrix step"""
+        ids = [region["id"] for region in regions]
+        index = {region: i for i, region in enumerate(ids)}
+        n = len(ids)
+        position = np.array([[region.get("position", {}).get("x", 0),
+                              region.get("position", {}).get("y", 0)] for region in regions],
+                            dtype=np.float64).reshape(n, 2)
+
+        distance = np.full((n, n), np.inf)
+        days = np.zeros((n, n), dtype=np.int64)
+        fuel = np.zeros((n, n), dtype=np.int64)
+        hops = np.zeros((n, n), dtype=np.int64)
+        next_hop = np.full((n, n), -1, dtype=np.int64)
+        np.fill_diagonal(distance, 0.0)
+        np.fill_diagonal(next_hop, np.arange(n))
+        for i, region in enumerate(regions):
+            for target in region.get("connections", []):
+                j = index.get(target)
+                if j is None or j == i:
+                    continue
+                leg = float(np.hypot(*(position[j] - position[i])))
+                distance[i, j] = leg
+                days[i, j] = math.ceil(leg * DAYS_PER_UNIT)
+                fuel[i, j] = math.ceil(leg * FUEL_PER_UNIT)
+                hops[i, j] = 1
+                next_hop[i, j] = j
+
+        for k in range(n):
+            # Only routes into and out of k that exist can improve
+            into = np.flatnonzero(np.isfinite(distance[:, k]))
+            out = np.flatnonzero(np.isfinite(distance[k]))
+            through = distance[into, k, None] + distance[k, out]
+            rows, cols = np.nonzero(through < distance[np.ix_(into, out)])
+            if not rows.size:
+                continue
+            i, j = into[rows], out[cols]
+            distance[i, j] = through[rows, cols]
+            days[i, j] = days[i, k] + days[k, j]
+            fuel[i, j] = fuel[i, k] + fuel[k, j]
+            hops[i, j] = hops[i, k] + hops[k, j]
+            next_hop[i, j] = next_hop[i, k]
+
+        unreachable = np.isinf(distance)
+        for matrix in (days, fuel, hops):
+            matrix[unreachable] = -1
+        return cls(ids, distance, hops, days, fuel, next_hop)
+
+    def save(self, path: Path):
+        """Write the index to an .npz, via a temp file so readers never see half of one"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        np.savez(tmp, ids=np.array(self.ids), distance=self.distance, hops=self.hops,
+                 days=self.days, fuel=self.fuel, next_hop=self.next_hop)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "RouteIndex":
+        """Read an index written by save()"""
+        with np.load(path) as data:
+            return cls([str(region) for region in data["ids"]], data["distance"], data["hops"],
+                       data["days"], data["fuel"], data["next_hop"])
+
+    def route(self, origin: str, destination: str) -> List[str]:
+        """Regions along the shortest route, both ends included ([] if unreachable)"""
+        i, j = self.index[origin], self.index[destination]
+        if self.next_hop[i, j] < 0:
+            return []
+        path = [i]
+        while i != j:
+            i = self.next_hop[i, j]
+            path.append(i)
+        return [self.ids[k] for k in path]
+
+
+def _cache_path(regions_path: str, cache_dir: str) -> Path:
+    """Cache file for a regions file: keyed by a SHA-256 of its contents"""
+    digest = hashlib.sha256(f"v{_INDEX_VERSION}:".encode())
+    with open(regions_path, "rb") as f:
+        digest.update(f.read())
+    key = digest.hexdigest()
+    return Path(cache_dir) / f"{key}.npz"
+
+
+@functools.lru_cache(maxsize=None)
+def load_routes(regions_path: str = DEFAULT_REGIONS,
+                cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> RouteIndex:
+    """Route index for a regions file, from the disk cache when it is current
+
+    Editing the regions file changes its hash, so stale indexes are simply
+    never looked up again. Cached per process.
+    """
+    if cache_dir is None:
+        return RouteIndex.build(load_json(regions_path))
+    path = _cache_path(regions_path, cache_dir)
+    if path.exists():
+        return RouteIndex.load(path)
+    routes = RouteIndex.build(load_json(regions_path))
+    routes.save(path)
+    return routes
+
+
+class TradeRoutes:
+    """Round trips from home that a run makes every few days
+
+    Settings (the config's "travel" section): regions, home, destinations
+    (default: every settlement reachable from home), every (days between
+    trips), resupply (coin prices of food and fuel, or null) and
+    leg_hazard_chance. Each trip goes out and back along the shortest
+    routes and costs food and fuel up front as start_travel does. A run
+    short of food or fuel first buys the difference at the resupply prices;
+    one that cannot afford it stays home.
+
+    depart() only pays for a trip; the engines play its road days on the
+    run's clock, as _process_travel advances the game a day at a time.
+    Each road day rolls an encounter in place of the day's home rolls, and
+    each leg sets off with a leg_hazard_chance roll for a hazard.
+
+    Given the runs' starting resources, raises ValueError when no
+    destination is affordable from them, since no run would ever leave.
+    """
+
+    def __init__(self, settings: Dict, starting: Optional[Dict] = None):
+        self.routes = load_routes(settings.get("regions", DEFAULT_REGIONS))
+        self.every = settings.get("every", 30)
+        self.hazard_chance = settings.get("leg_hazard_chance", DEFAULT_LEG_HAZARD_CHANCE)
+        home = self.routes.index[settings.get("home", "home_farm")]
+        destinations = settings.get("destinations")
+        if destinations is None:
+            destinations = [r["id"] for r in load_json(settings.get("regions", DEFAULT_REGIONS))
+                            if r.get("type") == "settlement"]
+        targets = [self.routes.index[region] for region in destinations]
+        targets = [j for j in targets if j != home and self.routes.days[home, j] >= 0
+                   and self.routes.days[j, home] >= 0]
+        if not targets:
+            raise ValueError("No destination is reachable from home and back")
+        self.destinations = np.array(targets)
+        # Per destination round-trip cost, so a trip is one table lookup
+        self.out_days = self.routes.days[home, targets]
+        self.days = self.out_days + self.routes.days[targets, home]
+        self.fuel = self.routes.fuel[home, targets] + self.routes.fuel[targets, home]
+        self.resupply = settings.get("resupply", DEFAULT_RESUPPLY) or {}
+        if starting is not None:
+            costs = [self._top_up(starting, int(days), int(fuel))
+                     for days, fuel in zip(self.days, self.fuel)]
+            if min(costs) > starting.get("coins", 0):
+                cheapest = int(np.argmin(self.fuel))
+                raise ValueError(
+                    f"No destination is affordable: the cheapest round trip takes "
+                    f"{self.fuel[cheapest]} fuel and {self.days[cheapest] * FOOD_PER_DAY} food, "
+                    f"runs start with {starting.get('fuel', 0)} fuel and "
+                    f"{starting.get('food', 0)} food, and resupply "
+                    f"{'cannot make up the difference' if self.resupply else 'is off'}")
+
+    def _top_up(self, resources: Dict, days: int, fuel: int) -> float:
+        """Coins to buy the food and fuel resources lack for a trip (inf if it cannot)"""
+        cost = 0
+        for item, needed in (("food", days * FOOD_PER_DAY), ("fuel", fuel)):
+            short = needed - resources.get(item, 0)
+            if short > 0:
+                if item not in self.resupply:
+                    return math.inf
+                cost += short * self.resupply[item]
+        return cost
+
+    def depart(self, state: Dict, rng: random.Random) -> Optional[Tuple[int, int]]:
+        """Set off on a trade run: pick a destination and pay for it
+
+        Returns (days out, days in all) of the round trip, or None if the
+        run cannot afford it and stays home.
+        """
+        pick = int(rng.random() * len(self.destinations))
+        days, fuel = int(self.days[pick]), int(self.fuel[pick])
+        resources = state["resources"]
+        food = days * FOOD_PER_DAY
+        cost = self._top_up(resources, days, fuel)
+        if cost > resources["coins"]:
+            return None
+        if cost:
+            resources["coins"] -= cost
+            resources["food"] = max(resources.get("food", 0), food)
+            resources["fuel"] = max(resources.get("fuel", 0), fuel)
+        resources["food"] -= food
+        resources["fuel"] -= fuel
+        state["trips"] += 1
+        state["travel_days"] += days
+        return int(self.out_days[pick]), days
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Shortest travel routes between regions")
+    parser.add_argument("--regions", default=DEFAULT_REGIONS, help="regions.json path")
+    parser.add_argument("--origin", default="home_farm", help="Region to route from")
+    args = parser.parse_args()
+
+    routes = load_routes(args.regions)
+    origin = routes.index[args.origin]
+    print(f"{'Destination':<20}{'Distance':>10}{'Hops':>6}{'Days':>6}{'Fuel':>6}  Route")
+    for region, j in routes.index.items():
+        if j == origin:
+            continue
+        route = " > ".join(routes.route(args.origin, region)) or "unreachable"
+        print(f"{region:<20}{routes.distance[origin, j]:>10.2f}{routes.hops[origin, j]:>6}"
+              f"{routes.days[origin, j]:>6}{routes.fuel[origin, j]:>6}  {route}")
+
+if __name__ == "__main__":
+    main()
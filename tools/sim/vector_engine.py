@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Vectorized NumPy engine for the balance simulator
+Advances every run of a batch at once as arrays instead of one run at a time
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+# Daily rolls are raw 32-bit draws compared against integer thresholds, which
+# costs half as much as drawing floats
+_UNIT = 2 ** 32
+
+
+def _threshold(probability: float) -> int:
+    """Integer threshold t such that P(uint32 draw < t) == probability"""
+    return min(_UNIT - 1, max(0, round(probability * _UNIT)))
+
+
+# Every kind of draw has its own stream, and each block reads from a fixed
+# offset into it, so runs line up draw for draw across configs
+_STREAMS = ("death", "coins", "harvest", "marriage", "food", "order", "wild")
+_BLOCK_STRIDE = 2 ** 64
+
+
+class _Streams:
+    """One generator per kind of draw, repositioned at the start of each block
+
+    Two configs simulated from the same rng see the same draws for the same
+    purpose in the same run (common random numbers), however many draws the
+    other purposes and earlier runs consumed. With antithetic set, callers
+    mirror every draw (u -> 1 - u).
+    """
+
+    def __init__(self, rng: np.random.Generator, antithetic: bool = False):
+        self.antithetic = antithetic
+        seeds = rng.integers(2 ** 63, size=len(_STREAMS))
+        self._generators = {
+            name: np.random.Generator(np.random.PCG64(int(seed)))
+            for name, seed in zip(_STREAMS, seeds)
+        }
+        self._starts = {name: g.bit_generator.state for name, g in self._generators.items()}
+
+    def __getitem__(self, name: str) -> np.random.Generator:
+        return self._generators[name]
+
+    def seek(self, block: int):
+        """Move every stream to the start of a block's draws"""
+        for name, generator in self._generators.items():
+            generator.bit_generator.state = self._starts[name]
+            generator.bit_generator.advance(block * _BLOCK_STRIDE)
+
+    def raw(self, name: str, count: int, dtype) -> np.ndarray:
+        """count raw unsigned integers of dtype (uint16 or uint32)"""
+        per_word = 8 // np.dtype(dtype).itemsize
+        words = self[name].bit_generator.random_raw(-(-count // per_word))
+        draws = words.view(dtype)[:count]
+        return ~draws if self.antithetic else draws
+
+    def uniform(self, name: str, size: int) -> np.ndarray:
+        """Uniforms in [0, 1), mirrored as 1 - u (kept below 1) when antithetic"""
+        u = self[name].random(size)
+        if self.antithetic:
+            u = np.minimum(1 - u, np.nextafter(1.0, 0.0))
+        return u
+
+    def geometric(self, name: str, p: float, size: int, cap: int = 2 ** 31 - 1) -> np.ndarray:
+        """Geometric(p) trial counts by inversion, capped at cap"""
+        u = self.uniform(name, size)
+        trials = np.floor(np.log1p(-u) / np.log1p(-p)) + 1
+        return np.minimum(trials, cap).astype(np.int64)
+
+
+def _binomial_inverse(n: np.ndarray, p: float, u: np.ndarray) -> np.ndarray:
+    """Binomial(n, p) quantiles of u, so equal u gives coupled counts
+
+    Walks the CDF one k at a time for every run at once until every run has
+    found its count.
+    """
+    if p <= 0:
+        return np.zeros_like(n)
+    if p >= 1:
+        return n.copy()
+    count = np.zeros_like(n)
+    odds = p / (1 - p)
+    # The pmf recurrence runs in linear space unless (1 - p) ** n would
+    # underflow, which only very long runs reach
+    log_space = n.max() * -np.log1p(-p) > 700
+    pmf = n * np.log1p(-p) if log_space else (1 - p) ** n
+    cdf = np.exp(pmf) if log_space else pmf.copy()
+    unresolved = (u >= cdf) & (n > 0)
+    k = 0
+    with np.errstate(divide="ignore"):
+        while unresolved.any():
+            k += 1
+            count += unresolved
+            # pmf(k) = pmf(k - 1) * (n - k + 1) / k * p / (1 - p)
+            factor = np.maximum(n - k + 1, 0) * (odds / k)
+            if log_space:
+                pmf += np.log(factor)
+                cdf += np.exp(pmf)
+            else:
+                pmf *= factor
+                cdf += pmf
+            unresolved &= (u >= cdf) & (n > k)
+    return count
+
+
+class NumpyEngine:
+    """Runs a batch of simulations as (day, run) arrays
+    
+    Produces the same distribution of outcomes as BalanceSimulator.run_simulation.
+    Runs are processed in blocks; within a block every day of every run is laid
+    out as one array, so the coin ledger is a single cumulative sum and the
+    bankruptcy, death and marriage days fall out of it. Days after a run's
+    death or bankruptcy are masked out rather than simulated one by one.
+    
+    Death days do not depend on anything else, so they are drawn up front and
+    runs are blocked in order of death; each block then only lays out the days
+    until its last run dies.
+    
+    Every draw a run makes sits at a position fixed by its block, its place in
+    the block and the day, never by what other runs drew. Two configs run from
+    the same rng therefore share their random numbers run by run, and
+    antithetic=True mirrors all of them.
+    """
+    
+    def __init__(self, config: Dict, block_size: int = 256, antithetic: bool = False):
+        self.config = config
+        self.block_size = block_size
+        self.antithetic = antithetic
+    
+    def run(self, num_runs: int, rng: np.random.Generator,
+            harvests: Optional[np.ndarray] = None,
+            coins: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """Simulate num_runs games and return their final state as columns
+
+        harvests, if given, is the (harvest, run) coin income of each run's
+        farm (farm.FarmHarvests.coins) and replaces the random harvest bump.
+        coins, if given, is each run's starting coins (e.g. an inheritance)
+        in place of starting_resources["coins"].
+        """
+        config = self.config
+        start = config["starting_resources"]
+        streams = _Streams(rng, self.antithetic)
+        # marriage_day is -1 for runs that never married
+        out = {
+            "day": np.empty(num_runs, dtype=np.int32),
+            "dead": np.empty(num_runs, dtype=bool),
+            "marriage_day": np.empty(num_runs, dtype=np.int32),
+            "bankrupt": np.empty(num_runs, dtype=bool),
+            "entropy_order": np.empty(num_runs, dtype=np.float64),
+            "entropy_wild": np.empty(num_runs, dtype=np.float64),
+            "coins": np.empty(num_runs, dtype=np.int64),
+            "fuel": np.full(num_runs, start.get("fuel", 0), dtype=np.int64),
+            # Only content-driven runs take damage, injuries or reputation
+            "health": np.full(num_runs, config.get("starting_health", 100), dtype=np.int32),
+            "reputation": np.zeros(num_runs, dtype=np.int32),
+            "injuries": np.zeros(num_runs, dtype=np.int32),
+        }
+        # Past day 200 each day carries a 1% death roll, checked before
+        # bankruptcy, so the death day is geometric
+        death_day = 200 + streams.geometric("death", 0.01, num_runs)
+        order = np.argsort(death_day, kind="stable")
+        for block, first in enumerate(range(0, num_runs, self.block_size)):
+            rows = order[first:first + self.block_size]
+            streams.seek(block)
+            harvest = None if harvests is None else harvests[:, rows]
+            opening = start.get("coins", 0) if coins is None else coins[rows]
+            for key, values in self._run_block(death_day[rows], streams, harvest,
+                                               opening).items():
+                out[key][rows] = values
+        
+        # Hazards take a unit of food half the time and food never grows back,
+        # so only the number of losses matters; the hazard that takes food
+        # below zero is the one that flags the run bankrupt
+        streams.seek(0)
+        losses = _binomial_inverse(out["day"].astype(np.int64), config["hazard_rate"] * 0.5,
+                                   streams.uniform("food", num_runs))
+        out["food"] = start.get("food", 0) - losses
+        out["bankrupt"] |= out["food"] < 0
+        return out
+    
+    def _run_block(self, death_day: np.ndarray, streams: _Streams,
+                   harvest: Optional[np.ndarray] = None,
+                   opening=None) -> Dict[str, np.ndarray]:
+        """Simulate one block of runs with known death days"""
+        config = self.config
+        start = config["starting_resources"]
+        n = death_day.size
+        runs = np.arange(n)
+        # Every run in the block is over by its last death or max_days
+        days = int(min(config["max_days"], death_day.max()))
+        
+        # Coin ledger, one row per day. Encounters cost coins 30% of the time,
+        # so one draw decides whether a day loses coins, and the draw's position
+        # under the threshold picks the 1-10 coin loss.
+        encounter_loss = _threshold(config["encounter_rate"] * 0.3)
+        draws = streams.raw("coins", days * n, np.uint32)
+        lost = np.flatnonzero(draws < encounter_loss)
+        ledger = np.zeros(days * n, dtype=np.int32)
+        ledger[lost] = -1 - (draws[lost] // -(-encounter_loss // 10)).astype(np.int32)
+        ledger = ledger.reshape(days, n)
+        
+        # Crop harvests every 10 days
+        if harvest is None:
+            harvest = streams["harvest"].integers(5, 16, size=(days // 10, n), dtype=np.int32)
+            if streams.antithetic:
+                harvest = 20 - harvest
+        ledger[9::10] += harvest[:days // 10]
+        ledger[0] += start.get("coins", 0) if opening is None else opening
+        coins = np.cumsum(ledger, axis=0, dtype=np.int32, out=ledger)
+        
+        # First day with negative coins, or days + 1 if it never happens. Few
+        # runs ever go negative, so only those are searched.
+        broke_day = np.full(n, days + 1)
+        broke = np.flatnonzero(coins.min(axis=0) < 0)
+        if broke.size:
+            broke_day[broke] = (coins[:, broke] < 0).argmax(axis=0) + 1
+        
+        end_day = np.minimum(np.minimum(broke_day, death_day), days)
+        dead = death_day <= np.minimum(broke_day, days)
+        bankrupt = (broke_day <= end_day) & ~dead
+        
+        # Each day past 50 with more than 100 coins is a 5% marriage roll, so
+        # the wedding lands on the G-th eligible day with G geometric. Weddings
+        # after the run ended, or on the day it died, never happened.
+        marriage_day = np.full(n, -1, dtype=np.int32)
+        if days > 50:
+            count_type = np.int16 if days < 32767 else np.int32
+            eligible = np.cumsum(coins[50:] > 100, axis=0, dtype=count_type)
+            rolls = streams.geometric("marriage", 0.05, n, cap=np.iinfo(count_type).max)
+            wed = eligible >= rolls.astype(count_type)
+            marriage_day = np.where(wed.any(axis=0), wed.argmax(axis=0) + 51, -1)
+            marriage_day[(marriage_day > end_day) | (marriage_day >= death_day)] = -1
+        
+        # Entropy drifts by uniform(0.1, 0.5) a day; sum 16-bit uniforms over
+        # each run's lifetime. Every run owns a row of `days` draws and sums
+        # its first end_day of them: reduceat over [row start, row start +
+        # end_day) boundaries, keeping every other segment.
+        bounds = np.empty(2 * n, dtype=np.int64)
+        bounds[0::2] = runs * days
+        bounds[1::2] = runs * days + end_day
+        bounds = bounds[:-1] if bounds[-1] == days * n else bounds
+        entropy = {}
+        for lane in ("order", "wild"):
+            drift = streams.raw(lane, days * n, np.uint16)
+            steps = np.add.reduceat(drift, bounds, dtype=np.uint64)[0::2]
+            entropy[lane] = 0.1 * end_day + 0.4 * (steps + 0.5 * end_day) / 65536
+        
+        return {
+            "day": end_day,
+            "dead": dead,
+            "marriage_day": marriage_day,
+            "bankrupt": bankrupt,
+            "entropy_order": entropy["order"],
+            "entropy_wild": entropy["wild"],
+            "coins": coins[end_day - 1, runs],
+        }
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the sprite generator
+Measures sprites/sec of each generator, PNG encoding and a full in-memory
+build on a fixed seed, compares them against stored baselines, and with
+--profile attributes a build's time to each drawing helper
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import PIL
+from PIL import Image
+
+import sprite_generator
+from sprite_generator import SOIL_COLORS, SpriteGenerator
+
+DEFAULT_BASELINE = "tools/sprite_bench_baseline.json"
+DEFAULT_OUTPUT = "reports/sprite_bench.json"
+DEFAULT_PROFILE = "reports/sprite_profile.json"
+SEED = 20240601
+
+# Fail when a throughput drops, or the memory peak grows, by more than this
+DEFAULT_THRESHOLD = 0.25
+
+# One crop per drawing routine: the name picks the routine
+CROP_TYPES = {
+    "wheat": "Ironwheat",
+    "root": "Steamroot",
+    "bean": "Cogbean",
+    "moss": "Rustmoss",
+    "generic": "Scrapvine",
+}
+TRAIT_SETS = [[], ["mechanically_gifted"], ["prosthetic_limb", "soot_stained"],
+              ["mechanically_gifted", "prosthetic_limb", "soot_stained"]]
+
+# Module functions --profile times alongside the generator's own helpers
+PROFILED_FUNCTIONS = ["new_sprite", "indexed_from_rgba", "soil_textures", "swap_palette",
+                      "save_sprite"]
+
+
+class Benchmark:
+    """One named measurement
+
+    run() returns the metric; higher_is_better says which way a regression
+    goes. Throughput benchmarks keep the best of several repeats, since
+    noise only ever makes a run slower.
+    """
+
+    def __init__(self, name: str, unit: str, run: Callable[[], float],
+                 higher_is_better: bool = True, repeat: int = 3):
+        self.name = name
+        self.unit = unit
+        self.run = run
+        self.higher_is_better = higher_is_better
+        self.repeat = repeat
+
+    def measure(self) -> float:
+        """Best value over the repeats"""
+        values = [self.run() for _ in range(self.repeat)]
+        return max(values) if self.higher_is_better else min(values)
+
+
+def _generator(indexed: bool = True) -> SpriteGenerator:
+    return SpriteGenerator(tempfile.gettempdir(), SEED, indexed=indexed)
+
+
+def crop_jobs(crop_type: str, count: int) -> List[Tuple]:
+    """count jobs of one crop drawing routine, over its stages and mutation variants"""
+    generator = _generator()
+    name = CROP_TYPES[crop_type]
+    jobs = []
+    for number in range(count):
+        stage, variant = number % 5 + 1, number // 5
+        jobs.append(("crop", (name, stage, 5, True,
+                              generator.crop_mutations(name, stage, variant), variant)))
+    return jobs
+
+
+def soil_jobs(count: int) -> List[Tuple]:
+    """count soil tile jobs, over every soil type and memory level"""
+    levels = [None] + [{"years_used": years, "mood": "tired"} for years in (3, 5, 10)]
+    jobs = []
+    for number in range(count):
+        soil_type = list(SOIL_COLORS)[number % len(SOIL_COLORS)]
+        jobs.append(("soil", (soil_type, levels[number // len(SOIL_COLORS) % 4], 32,
+                              "white")))
+    return jobs
+
+
+def character_jobs(count: int) -> List[Tuple]:
+    """count character jobs, over trait sets and ages on either side of 50"""
+    return [("character", (TRAIT_SETS[number % len(TRAIT_SETS)], 20 + number % 60,
+                           number // len(TRAIT_SETS) + 1)) for number in range(count)]
+
+
+def build_jobs() -> List[Tuple]:
+    """The default build's jobs (crops from data/crops.json, soil, the character)"""
+    generator = _generator()
+    with open("data/crops.json") as f:
+        jobs = generator.crop_jobs(json.load(f))
+    jobs += generator.soil_jobs(list(SOIL_COLORS))
+    jobs.append(("character", (["mechanically_gifted"], 45, 1), "character_example.png", None))
+    return [job[:2] for job in jobs]
+
+
+def render_throughput(jobs: List[Tuple], indexed: bool = True) -> Callable[[], float]:
+    """Sprites/sec render_sprite draws jobs at, without saving them"""
+
+    def run() -> float:
+        generator = _generator(indexed)
+        start = time.perf_counter()
+        for kind, args in jobs:
+            generator.render_sprite(kind, args)
+        return len(jobs) / (time.perf_counter() - start)
+
+    return run
+
+
+def soil_batch_throughput(count: int) -> Callable[[], float]:
+    """Tiles/sec of one soil_tiles batch of count tiles"""
+
+    def run() -> float:
+        generator = _generator()
+        start = time.perf_counter()
+        generator.soil_tiles("ferro_soil", count, {"years_used": 10}, 32, "value")
+        return count / (time.perf_counter() - start)
+
+    return run
+
+
+def encode_throughput(jobs: List[Tuple]) -> Callable[[], float]:
+    """Sprites/sec save_sprite encodes the sprites of jobs as PNG, in memory"""
+    generator = _generator()
+    sprites = [generator.render_sprite(kind, args) for kind, args in jobs]
+
+    def run() -> float:
+        start = time.perf_counter()
+        for sprite in sprites:
+            sprite_generator.save_sprite(sprite, io.BytesIO())
+        return len(sprites) / (time.perf_counter() - start)
+
+    return run
+
+
+def _build(jobs: List[Tuple], generator: SpriteGenerator):
+    for kind, args in jobs:
+        sprite_generator.save_sprite(generator.render_sprite(kind, args), io.BytesIO())
+
+
+def build_throughput(jobs: List[Tuple], rounds: int) -> Callable[[], float]:
+    """Sprites/sec of rendering and encoding jobs, rounds times over"""
+
+    def run() -> float:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            _build(jobs, _generator())
+        return rounds * len(jobs) / (time.perf_counter() - start)
+
+    return run
+
+
+def build_memory(jobs: List[Tuple]) -> Callable[[], float]:
+    """Peak traced MB of rendering and encoding jobs
+
+    tracemalloc sees Python and numpy allocations (the soil textures), not
+    Pillow's image buffers, which for 32x32 sprites are a few KB each.
+    """
+
+    def run() -> float:
+        tracemalloc.start()
+        try:
+            _build(jobs, _generator())
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak / 2 ** 20
+
+    return run
+
+
+def suite() -> List[Benchmark]:
+    """Every benchmark"""
+    benchmarks = [
+        Benchmark(f"crop_{crop_type}_sprites_per_sec", "sprites/s",
+                  render_throughput(crop_jobs(crop_type, 2000)))
+        for crop_type in CROP_TYPES
+    ]
+    jobs = build_jobs()
+    benchmarks += [
+        # RGBA crops blend their mutations with alpha_composite
+        Benchmark("crop_rgba_sprites_per_sec", "sprites/s",
+                  render_throughput(crop_jobs("wheat", 2000), indexed=False)),
+        Benchmark("soil_sprites_per_sec", "sprites/s", render_throughput(soil_jobs(1000))),
+        Benchmark("soil_batch_tiles_per_sec", "tiles/s", soil_batch_throughput(4096)),
+        Benchmark("character_sprites_per_sec", "sprites/s",
+                  render_throughput(character_jobs(4000))),
+        Benchmark("png_encode_sprites_per_sec", "sprites/s", encode_throughput(jobs * 10)),
+        Benchmark("build_sprites_per_sec", "sprites/s", build_throughput(jobs, 10)),
+        Benchmark("build_peak_mb", "MB", build_memory(jobs), higher_is_better=False,
+                  repeat=1),
+    ]
+    return benchmarks
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], benchmarks: List[Benchmark],
+            threshold: float) -> List[str]:
+    """Names of the benchmarks that regressed past threshold against baseline"""
+    regressions = []
+    for benchmark in benchmarks:
+        before = baseline.get(benchmark.name)
+        if not before or benchmark.name not in results:
+            continue
+        ratio = results[benchmark.name] / before
+        if benchmark.higher_is_better and ratio < 1 - threshold:
+            regressions.append(benchmark.name)
+        elif not benchmark.higher_is_better and ratio > 1 + threshold:
+            regressions.append(benchmark.name)
+    return regressions
+
+
+class HelperProfile:
+    """Self time and calls of each wrapped drawing helper
+
+    A helper's time excludes the wrapped helpers it calls (the overlay's
+    mutations, say), so the times add up to the wrapped total without
+    counting anything twice.
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self._children: List[float] = []
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        """func, timed as helper name"""
+        seconds, calls, children = self.seconds, self.calls, self._children
+        clock = time.perf_counter
+
+        def wrapped(*args, **kwargs):
+            children.append(0.0)
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                seconds[name] = seconds.get(name, 0.0) + elapsed - children.pop()
+                calls[name] = calls.get(name, 0) + 1
+                if children:
+                    children[-1] += elapsed
+
+        return wrapped
+
+
+def profile_build(jobs: List[Tuple], rounds: int, indexed: bool = True) -> Tuple[Dict, float]:
+    """Time each drawing helper over rounds of rendering and encoding jobs
+
+    Wraps the generator's generate_*, _draw_*, _add_* and overlay methods
+    on the instance, and the module's canvas, texture, palette and PNG
+    functions and Image.alpha_composite for the duration. Returns
+    ({helper: {"seconds", "calls"}}, wall seconds); the wall time left
+    over is the loop and render_sprite's dispatch.
+    """
+    profile = HelperProfile()
+    patched = [(sprite_generator, name) for name in PROFILED_FUNCTIONS]
+    patched.append((Image, "alpha_composite"))
+    originals = [(owner, name, getattr(owner, name)) for owner, name in patched]
+    for owner, name, func in originals:
+        label = f"Image.{name}" if owner is Image else name
+        setattr(owner, name, profile.wrap(label, func))
+    try:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            generator = SpriteGenerator(tempfile.gettempdir(), SEED, indexed=indexed)
+            for name in dir(generator):
+                if name.startswith(("generate_", "_draw_", "_add_", "_apply_")) \
+                        or name == "soil_tiles":
+                    setattr(generator, name, profile.wrap(name, getattr(generator, name)))
+            _build(jobs, generator)
+        wall = time.perf_counter() - start
+    finally:
+        for owner, name, func in originals:
+            setattr(owner, name, func)
+    helpers = {name: {"seconds": profile.seconds[name], "calls": profile.calls[name]}
+               for name in sorted(profile.seconds, key=profile.seconds.get, reverse=True)}
+    return helpers, wall
+
+
+def print_profile(helpers: Dict, wall: float):
+    """Table of helpers by self time, with their share of the wall time"""
+    print(f"{'Helper':<32}{'Calls':>9}{'Seconds':>10}{'Share':>8}{'us/call':>10}")
+    for name, helper in helpers.items():
+        print(f"{name:<32}{helper['calls']:>9,}{helper['seconds']:>10.3f}"
+              f"{helper['seconds'] / wall:>8.1%}"
+              f"{helper['seconds'] / helper['calls'] * 1e6:>10.1f}")
+    untracked = wall - sum(helper["seconds"] for helper in helpers.values())
+    print(f"{'(loop and dispatch)':<32}{'':>9}{untracked:>10.3f}{untracked / wall:>8.1%}")
+    print(f"{'Total':<32}{'':>9}{wall:>10.3f}")
+
+
+def save_record(path: str, numbers: Dict):
+    """Write numbers with the seed and library versions they were measured on"""
+    record = {
+        "seed": SEED,
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pillow": PIL.__version__,
+        "cpus": os.cpu_count(),
+        "results": numbers,
+    }
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(record, f, indent=2)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Sprite generator benchmarks")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON path")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT,
+                        help="Where to write this run's numbers")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store this run's numbers as the new baseline "
+                             "(required when there is none)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed regression as a fraction (default: 0.25)")
+    parser.add_argument("--only", default=None,
+                        help="Only run benchmarks whose name contains this")
+    parser.add_argument("--profile", action="store_true",
+                        help="Instead of benchmarking, time each drawing helper over "
+                             "default builds and write reports/sprite_profile.json")
+    parser.add_argument("--rounds", type=int, default=20,
+                        help="Default builds to run with --profile")
+    parser.add_argument("--rgba", action="store_true",
+                        help="Profile the RGBA pipeline instead of the indexed one")
+    args = parser.parse_args()
+
+    if args.profile:
+        jobs = build_jobs()
+        helpers, wall = profile_build(jobs, args.rounds, indexed=not args.rgba)
+        print_profile(helpers, wall)
+        Path(DEFAULT_PROFILE).parent.mkdir(parents=True, exist_ok=True)
+        with open(DEFAULT_PROFILE, "w") as f:
+            json.dump({"seed": SEED, "indexed": not args.rgba, "sprites": len(jobs) * args.rounds,
+                       "seconds": wall, "helpers": helpers}, f, indent=2)
+        print(f"\nProfile written to {DEFAULT_PROFILE}")
+        return
+
+    benchmarks = suite()
+    if args.only:
+        benchmarks = [b for b in benchmarks if args.only in b.name]
+    baseline = {}
+    if Path(args.baseline).exists():
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    print(f"{'Benchmark':<36}{'Result':>14}{'Baseline':>14}{'Change':>9}")
+    for benchmark in benchmarks:
+        value = results[benchmark.name] = benchmark.measure()
+        before = baseline.get(benchmark.name)
+        change = f"{value / before - 1:+.0%}" if before else ""
+        before = f"{before:,.1f}" if before else "-"
+        print(f"{benchmark.name:<36}{value:>14,.1f}{before:>14}{change:>9}  {benchmark.unit}")
+
+    # Per sprite, encoding takes 1 / encode of the 1 / build a build spends
+    if "png_encode_sprites_per_sec" in results and "build_sprites_per_sec" in results:
+        share = results["build_sprites_per_sec"] / results["png_encode_sprites_per_sec"]
+        results["png_encode_share"] = share
+        print(f"\nPNG encoding is {share:.0%} of a build's time")
+
+    save_record(args.output, results)
+    if args.save_baseline:
+        # Benchmarks left out with --only keep their old baseline
+        save_record(args.baseline, dict(baseline, **results))
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+    missing = [benchmark.name for benchmark in benchmarks if benchmark.name not in baseline]
+    if missing:
+        print(f"\nNo baseline for: {', '.join(missing)}")
+        print(f"Record one in {args.baseline} with --save-baseline (make bench-baseline)")
+        sys.exit(1)
+
+    regressions = compare(results, baseline, benchmarks, args.threshold)
+    if regressions:
+        print(f"\nRegressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    main()
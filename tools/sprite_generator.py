@@ -5,9 +5,13 @@ Generates crop sprites, soil tiles, and character sprites with mutations
 """
 
 from PIL import Image, ImageDraw, ImageFilter
+import numpy as np
+import argparse
+import hashlib
 import json
 import os
 import random
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
 
@@ -35,20 +39,343 @@ PALETTE = {
     },
 }
 
+# Base soil colors
+SOIL_COLORS = {
+    "ferro_soil": PALETTE["copper"]["medium"],
+    "fungal_soil": PALETTE["ash"]["medium"],
+    "ash_soil": PALETTE["ash"]["dark"],
+    "pure_bio_soil": (101, 120, 81),  # Slightly green
+    "scrap_heap": PALETTE["rust"]["dark"],
+}
+
+NOISE_TYPES = ("white", "value")
+
+MUTATIONS = ["rust_veins", "gear_leaves", "steam_pipes"]
+
+# Bump whenever a drawing routine changes what it draws; every sprite in a
+# build manifest made by another version is then regenerated
+GENERATOR_VERSION = 3
+MANIFEST_NAME = ".manifest.json"
+
+# Colors drawn outside PALETTE
+LITERAL_COLORS = {
+    "socket": (50, 50, 50),
+    "soot": (40, 40, 40),
+    "wrinkle": (80, 60, 40),
+    "bio_soil": SOIL_COLORS["pure_bio_soil"],
+}
+
+# Soil textures jitter their base color by up to this much
+SOIL_JITTER = 10
+
+# Generator of a pool worker process, set by _init_worker
+_worker = None
+
+
+def derive_seed(master_seed: int, *key) -> int:
+    """Derive an independent 64-bit seed from the master seed and a key"""
+    data = ":".join(str(part) for part in (master_seed,) + key).encode()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def value_noise(rng: np.random.Generator, count: int, size: int, cell: int) -> np.ndarray:
+    """count smooth noise fields in [-1, 1], shape (count, size, size)
+    
+    Random values on a lattice of cell-pixel squares, blended with
+    smoothstep between lattice points.
+    """
+    cells = -(-size // cell)
+    lattice = rng.uniform(-1.0, 1.0, (count, cells + 1, cells + 1))
+    position = np.arange(size) / cell
+    i = position.astype(np.intp)
+    f = position - i
+    f = f * f * (3 - 2 * f)
+    rows, cols = i[:, None], i[None, :]
+    fx, fy = f[None, None, :], f[None, :, None]
+    top = lattice[:, rows, cols] * (1 - fx) + lattice[:, rows, cols + 1] * fx
+    bottom = lattice[:, rows + 1, cols] * (1 - fx) + lattice[:, rows + 1, cols + 1] * fx
+    return top * (1 - fy) + bottom * fy
+
+
+def fractal_noise(rng: np.random.Generator, count: int, size: int) -> np.ndarray:
+    """Two octaves of value noise: clumps about a quarter tile wide, plus grain"""
+    return (0.65 * value_noise(rng, count, size, max(2, size // 4))
+            + 0.35 * value_noise(rng, count, size, max(1, size // 16)))
+
+
+def soil_textures(rng: np.random.Generator, base_colors: np.ndarray, size: int = 32,
+                  noise: str = "white", crack_counts: Optional[np.ndarray] = None,
+                  ferro: Optional[np.ndarray] = None) -> np.ndarray:
+    """A batch of soil tiles as an RGBA array of shape (count, size, size, 4)
+    
+    Tile i has base color base_colors[i] with +/-10 of color jitter on
+    about 30% of its pixels (the rest are transparent), crack_counts[i]
+    cracks and, where ferro[i], 1-2 metal pipes. noise "white" jitters and
+    masks every pixel independently; "value" uses coherent noise for both,
+    so texture comes in clumps. The whole batch is one set of array
+    operations; features scale with the tile (pipes are 5-10 px at 32,
+    kept off the edges by 5 px, or less on tiles under 10 px).
+    """
+    if noise not in NOISE_TYPES:
+        raise ValueError(f"Unknown noise '{noise}', expected one of {NOISE_TYPES}")
+    count = len(base_colors)
+    base = np.asarray(base_colors, dtype=np.int16)[:, None, None, :]
+    if noise == "white":
+        jitter = rng.integers(-10, 11, (count, size, size), dtype=np.int16)
+        mask = rng.random((count, size, size)) < 0.3
+    else:
+        jitter = np.rint(fractal_noise(rng, count, size) * 10).astype(np.int16)
+        grain = fractal_noise(rng, count, size)
+        mask = grain < np.quantile(grain, 0.3, axis=(1, 2), keepdims=True)
+    tiles = np.zeros((count, size, size, 4), dtype=np.uint8)
+    tiles[..., :3] = np.clip(base + jitter[..., None], 0, 255)
+    tiles[..., 3] = 255
+    tiles[~mask] = 0
+    
+    # Cracks: up to 3 lines per tile, rasterised by sampling each segment
+    if crack_counts is not None and np.any(crack_counts):
+        ends = rng.integers(0, size + 1, (count, 3, 4))
+        t = np.linspace(0.0, 1.0, 2 * size + 1)
+        xs = np.rint(ends[..., 0, None] + t * (ends[..., 2, None] - ends[..., 0, None]))
+        ys = np.rint(ends[..., 1, None] + t * (ends[..., 3, None] - ends[..., 1, None]))
+        xs, ys = xs.astype(np.intp), ys.astype(np.intp)
+        active = (np.arange(3) < np.asarray(crack_counts)[:, None])[..., None]
+        keep = active & (xs < size) & (ys < size)
+        tile = np.broadcast_to(np.arange(count)[:, None, None], xs.shape)
+        tiles[tile[keep], ys[keep], xs[keep]] = (*PALETTE["ash"]["dark"], 255)
+    
+    # Pipes: 1-2 bars per ferro tile, across or down
+    if ferro is not None and np.any(ferro):
+        scale = max(1, size // 32)
+        pipes = rng.integers(1, 3, count)
+        margin = min(5 * scale, size // 2)
+        x = rng.integers(margin, size - margin + 1, (count, 2))
+        y = rng.integers(margin, size - margin + 1, (count, 2))
+        length = rng.integers(5 * scale, 10 * scale + 1, (count, 2))
+        across = rng.random((count, 2)) < 0.5
+        width = np.where(across, length, 2 * scale - 1)
+        height = np.where(across, 2 * scale - 1, length)
+        active = (np.arange(2) < pipes[:, None]) & np.asarray(ferro)[:, None]
+        grid = np.arange(size)
+        in_cols = (grid >= x[..., None]) & (grid <= (x + width)[..., None])
+        in_rows = (grid >= y[..., None]) & (grid <= (y + height)[..., None])
+        inside = in_rows[..., :, None] & in_cols[..., None, :] & active[..., None, None]
+        tiles[inside.any(axis=1)] = (*PALETTE["copper"]["dark"], 255)
+    return tiles
+
+
+def _palette_entries() -> List[Tuple[Tuple[str, str, int], Tuple[int, int, int]]]:
+    """((family, shade, offset), color) of every color a sprite can contain
+    
+    Entry 0 is transparent. Then come the PALETTE shades, the literal
+    colors, and the jitter ramp (offsets -10..10) of each soil base color.
+    A color that appears twice keeps its first entry.
+    """
+    entries = [(("transparent", "", 0), (0, 0, 0))]
+    names = {}
+    for family, shades in PALETTE.items():
+        for shade, color in shades.items():
+            entries.append(((family, shade, 0), color))
+            names.setdefault(color, (family, shade))
+    for name, color in LITERAL_COLORS.items():
+        entries.append((("literal", name, 0), color))
+        names.setdefault(color, ("literal", name))
+    for color in dict.fromkeys(SOIL_COLORS.values()):
+        family, shade = names[color]
+        for offset in range(-SOIL_JITTER, SOIL_JITTER + 1):
+            if offset:
+                jittered = tuple(max(0, min(255, c + offset)) for c in color)
+                entries.append(((family, shade, offset), jittered))
+    seen = set()
+    unique = []
+    for name, color in entries:
+        if color not in seen or name[0] == "transparent":
+            seen.add(color)
+            unique.append((name, color))
+    return unique
+
+
+# The shared palette of indexed sprites: INDEXED_NAMES[i] is what entry i
+# is, INDEXED_PALETTE the flat RGB table Pillow takes
+_ENTRIES = _palette_entries()
+INDEXED_NAMES = [name for name, _ in _ENTRIES]
+INDEXED_PALETTE = [c for _, color in _ENTRIES for c in color]
+_COLOR_KEYS = np.array([(r << 16) | (g << 8) | b for _, (r, g, b) in _ENTRIES[1:]])
+_KEY_ORDER = np.argsort(_COLOR_KEYS)
+# Palette index of every color: indexed canvases are drawn on with these,
+# since Pillow looks an RGB fill up in the palette again on every call
+PALETTE_INDEX = {color: index for index, (_, color) in enumerate(_ENTRIES)}
+
+
+def new_sprite(size: int, indexed: bool) -> Image.Image:
+    """A blank, transparent sprite canvas: paletted (mode P) or RGBA"""
+    if not indexed:
+        return Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    image = Image.new("P", (size, size), 0)
+    image.putpalette(INDEXED_PALETTE)
+    image.info["transparency"] = 0
+    return image
+
+
+def indexed_from_rgba(pixels: np.ndarray) -> Image.Image:
+    """A paletted sprite from an (h, w, 4) RGBA array of palette colors"""
+    keys = ((pixels[..., 0].astype(np.int64) << 16) | (pixels[..., 1].astype(np.int64) << 8)
+            | pixels[..., 2])
+    position = np.searchsorted(_COLOR_KEYS, keys, sorter=_KEY_ORDER)
+    position = np.minimum(position, len(_KEY_ORDER) - 1)
+    indices = _KEY_ORDER[position] + 1
+    opaque = pixels[..., 3] > 0
+    if np.any(opaque & (_COLOR_KEYS[indices - 1] != keys)):
+        raise ValueError("Sprite has colors outside the indexed palette")
+    image = Image.fromarray(np.where(opaque, indices, 0).astype(np.uint8), "P")
+    image.putpalette(INDEXED_PALETTE)
+    image.info["transparency"] = 0
+    return image
+
+
+def swap_palette(image: Image.Image, swaps: Dict[str, str]) -> Image.Image:
+    """image with whole color families swapped, e.g. {"copper": "rust"}
+    
+    Only the palette table changes: each entry of a swapped family takes
+    the same shade (and jitter offset) of the new family, and pixel data
+    is shared. Needs a sprite from the indexed pipeline. Colors that two
+    families share (ash light and steam dark) are one entry and follow
+    the family that claimed them first.
+    """
+    if image.mode != "P":
+        raise ValueError("Palette swaps need an indexed (mode P) sprite")
+    lookup = dict((color, name) for name, color in reversed(_ENTRIES))
+    table = image.getpalette()
+    swapped = []
+    for i in range(0, len(table), 3):
+        color = tuple(table[i:i + 3])
+        family, shade, offset = lookup.get(color, ("", "", 0))
+        if i and family in swaps:
+            color = tuple(max(0, min(255, c + offset)) for c in PALETTE[swaps[family]][shade])
+        swapped.extend(color)
+    result = image.copy()
+    result.putpalette(swapped)
+    return result
+
+
+def save_sprite(image: Image.Image, path):
+    """Write a sprite as PNG to a path or file object
+    
+    Paletted sprites keep only the entries they use, so most are stored
+    at 1-4 bits per pixel, and get full zlib effort.
+    """
+    if image.mode != "P":
+        image.save(path, "PNG")
+        return
+    used = sorted(index for _, index in image.getcolors(256))
+    if 0 not in used:
+        used.insert(0, 0)
+    image = image.remap_palette(used)
+    image.save(path, "PNG", transparency=0, optimize=True, compress_level=9)
+
+
+def sprite_key(seed: int, job: Tuple, indexed: bool = True) -> str:
+    """Content hash of everything a sprite job's output depends on"""
+    data = json.dumps([GENERATOR_VERSION, PALETTE, LITERAL_COLORS, seed, indexed, *job],
+                      sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class BuildManifest:
+    """What the last build wrote to an output directory
+    
+    Maps each generated file (relative path) to the sprite_key of its
+    inputs, and records the build's master seed, so an unchanged sprite
+    can be recognised without rendering it.
+    """
+    
+    def __init__(self, output_dir: Path):
+        self.path = Path(output_dir) / MANIFEST_NAME
+        self.seed: Optional[int] = None
+        self.sprites: Dict[str, str] = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                data = json.load(f)
+            self.seed = data["seed"]
+            self.sprites = data["sprites"]
+    
+    def save(self):
+        """Write the manifest atomically"""
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"seed": self.seed, "sprites": self.sprites}, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def sprite_info(job: Tuple) -> Dict:
+    """What a sprite job depicts, as atlas index fields"""
+    kind, args = job[:2]
+    if kind == "swap":
+        swaps, kind, args = args
+        return dict(sprite_info((kind, args)), palette=swaps)
+    if kind == "crop":
+        crop_name, stage, _, _, mutations, variant = args
+        return {"kind": kind, "crop": crop_name, "stage": stage, "variant": variant,
+                "mutations": list(mutations)}
+    if kind == "soil":
+        memory = args[1] if len(args) > 1 else None
+        return {"kind": kind, "soil": args[0], "memory": (memory or {}).get("years_used", 0)}
+    traits, age, generation = args
+    return {"kind": kind, "traits": list(traits), "age": age, "generation": generation}
+
+
+def _init_worker(output_dir: str, seed: int, indexed: bool):
+    """Process-pool initializer: one generator per worker"""
+    global _worker
+    _worker = SpriteGenerator(output_dir, seed, indexed=indexed)
+
+
+def _render_job(job: Tuple) -> str:
+    """Render and save one sprite in a worker process"""
+    return _worker.render(job)
+
+
 class SpriteGenerator:
-    """Main sprite generator class"""
+    """Main sprite generator class
+    
+    Every sprite draws from its own random stream, seeded from the master
+    seed and what the sprite is (kind, name, stage or variant), so the same
+    seed always gives the same art, whatever order or process the sprites
+    are rendered in. Without a seed a fresh master seed is picked per run.
+    
+    Sprites are indexed by default: drawn straight into paletted images
+    over the shared INDEXED_PALETTE, which holds every color the drawing
+    helpers use. indexed=False draws RGBA images instead.
+    """
     
-    def __init__(self, output_dir: str = "assets/generated"):
+    def __init__(self, output_dir: str = "assets/generated", seed: Optional[int] = None,
+                 workers: int = 1, indexed: bool = True):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
-        random.seed()
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(63)
+        self.seed = seed
+        self.workers = workers
+        self.indexed = indexed
+        self.rng = random.Random(seed)
+        # The last sprite rendered, reused by palette swaps of it
+        self._last = (None, None)
+    
+    def _reseed(self, kind: str, *key):
+        """Start the random stream of one sprite"""
+        self.rng.seed(derive_seed(self.seed, kind, *key))
+    
+    def _ink(self, color: Tuple[int, int, int]):
+        """The fill that draws color: its palette index on indexed canvases"""
+        return PALETTE_INDEX[color] if self.indexed else color
     
     def generate_crop_sprite(self, crop_name: str, growth_stage: int, 
                             max_stages: int = 5, biomechanical: bool = True,
-                            mutations: List[str] = None) -> Image.Image:
+                            mutations: List[str] = None, variant: int = 0) -> Image.Image:
         """Generate a crop sprite with optional mutations"""
+        self._reseed("crop", crop_name, growth_stage, variant)
         size = 32
-        img = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+        img = new_sprite(size, self.indexed)
         draw = ImageDraw.Draw(img)
         
         # Base shape based on crop type
@@ -79,14 +406,14 @@ class SpriteGenerator:
         stalk_height = int(size * 0.7 * stage_progress)
         stalk_color = PALETTE["copper"]["medium"]
         draw.rectangle([center_x - 1, center_y, center_x + 1, center_y + stalk_height], 
-                      fill=stalk_color)
+                      fill=self._ink(stalk_color))
         
         # Head (grain)
         if stage_progress > 0.3:
             head_size = int(6 * stage_progress)
             draw.ellipse([center_x - head_size, center_y - head_size * 2,
                          center_x + head_size, center_y - head_size], 
-                        fill=PALETTE["copper"]["light"])
+                        fill=self._ink(PALETTE["copper"]["light"]))
         
         return draw._image
     
@@ -100,14 +427,14 @@ class SpriteGenerator:
         root_size = int(8 * stage_progress)
         draw.ellipse([center_x - root_size, center_y, 
                      center_x + root_size, center_y + root_size * 2],
-                    fill=PALETTE["rust"]["medium"])
+                    fill=self._ink(PALETTE["rust"]["medium"]))
         
         # Leaves (above ground)
         if stage_progress > 0.4:
             leaf_height = int(10 * stage_progress)
             draw.rectangle([center_x - 2, center_y - leaf_height,
                            center_x + 2, center_y],
-                          fill=PALETTE["copper"]["dark"])
+                          fill=self._ink(PALETTE["copper"]["dark"]))
         
         return draw._image
     
@@ -129,7 +456,7 @@ class SpriteGenerator:
             
             for i in range(len(points) - 1):
                 draw.line([points[i], points[i + 1]], 
-                         fill=PALETTE["copper"]["medium"], width=2)
+                         fill=self._ink(PALETTE["copper"]["medium"]), width=2)
         
         # Beans
         if stage_progress > 0.6:
@@ -140,7 +467,7 @@ class SpriteGenerator:
                              center_y - bean_size + offset % 4,
                              center_x + bean_size + offset % 6,
                              center_y + bean_size + offset % 4],
-                            fill=PALETTE["rust"]["light"])
+                            fill=self._ink(PALETTE["rust"]["light"]))
         
         return draw._image
     
@@ -153,12 +480,12 @@ class SpriteGenerator:
         # Moss patches
         patch_count = int(5 * stage_progress)
         for _ in range(patch_count):
-            x = random.randint(center_x - 10, center_x + 10)
-            y = random.randint(center_y - 10, center_y + 10)
-            patch_size = random.randint(3, 8)
+            x = self.rng.randint(center_x - 10, center_x + 10)
+            y = self.rng.randint(center_y - 10, center_y + 10)
+            patch_size = self.rng.randint(3, 8)
             draw.ellipse([x - patch_size, y - patch_size,
                          x + patch_size, y + patch_size],
-                        fill=PALETTE["ash"]["medium"])
+                        fill=self._ink(PALETTE["ash"]["medium"]))
         
         return draw._image
     
@@ -172,7 +499,7 @@ class SpriteGenerator:
         stalk_height = int(size * 0.6 * stage_progress)
         draw.rectangle([center_x - 2, center_y,
                        center_x + 2, center_y + stalk_height],
-                      fill=PALETTE["copper"]["medium"])
+                      fill=self._ink(PALETTE["copper"]["medium"]))
         
         return draw._image
     
@@ -192,130 +519,101 @@ class SpriteGenerator:
             elif mutation == "metal_joints":
                 self._draw_metal_joints(draw, img.size)
         
-        # Blend overlay with original
+        # Blend overlay with original; fills are opaque, so for a paletted
+        # sprite the overlay already is the blend
+        if overlay.mode == "P":
+            return overlay
         result = Image.alpha_composite(img, overlay)
         return result
     
     def _draw_rust_veins(self, draw: ImageDraw, size: Tuple[int, int]):
         """Draw rust veins on sprite"""
         width, height = size
-        for _ in range(random.randint(3, 6)):
-            start_x = random.randint(0, width)
-            start_y = random.randint(0, height)
-            end_x = random.randint(0, width)
-            end_y = random.randint(0, height)
+        for _ in range(self.rng.randint(3, 6)):
+            start_x = self.rng.randint(0, width)
+            start_y = self.rng.randint(0, height)
+            end_x = self.rng.randint(0, width)
+            end_y = self.rng.randint(0, height)
             draw.line([(start_x, start_y), (end_x, end_y)],
-                     fill=PALETTE["rust"]["dark"], width=1)
+                     fill=self._ink(PALETTE["rust"]["dark"]), width=1)
     
     def _draw_gear_leaves(self, draw: ImageDraw, size: Tuple[int, int]):
         """Draw gear-like leaves"""
         width, height = size
-        for _ in range(random.randint(1, 3)):
-            x = random.randint(5, width - 5)
-            y = random.randint(5, height - 5)
+        for _ in range(self.rng.randint(1, 3)):
+            x = self.rng.randint(5, width - 5)
+            y = self.rng.randint(5, height - 5)
             # Simple gear shape (circle with teeth)
-            radius = random.randint(3, 5)
+            radius = self.rng.randint(3, 5)
             draw.ellipse([x - radius, y - radius, x + radius, y + radius],
-                        fill=PALETTE["copper"]["dark"])
+                        fill=self._ink(PALETTE["copper"]["dark"]))
             # Teeth
             for angle in range(0, 360, 45):
                 rad = angle * 3.14159 / 180
                 tooth_x = x + int((radius + 2) * (rad))
                 tooth_y = y + int((radius + 2) * (rad))
                 draw.rectangle([tooth_x - 1, tooth_y - 1, tooth_x + 1, tooth_y + 1],
-                              fill=PALETTE["copper"]["dark"])
+                              fill=self._ink(PALETTE["copper"]["dark"]))
     
     def _draw_steam_pipes(self, draw: ImageDraw, size: Tuple[int, int]):
         """Draw steam pipes"""
         width, height = size
-        for _ in range(random.randint(1, 2)):
-            x = random.randint(0, width)
-            y = random.randint(0, height)
-            length = random.randint(5, 15)
+        for _ in range(self.rng.randint(1, 2)):
+            x = self.rng.randint(0, width)
+            y = self.rng.randint(0, height)
+            length = self.rng.randint(5, 15)
             draw.rectangle([x, y, x + length, y + 2],
-                          fill=PALETTE["steam"]["medium"])
+                          fill=self._ink(PALETTE["steam"]["medium"]))
     
     def _draw_metal_joints(self, draw: ImageDraw, size: Tuple[int, int]):
         """Draw metal joints"""
         width, height = size
-        for _ in range(random.randint(2, 4)):
-            x = random.randint(2, width - 2)
-            y = random.randint(2, height - 2)
+        for _ in range(self.rng.randint(2, 4)):
+            x = self.rng.randint(2, width - 2)
+            y = self.rng.randint(2, height - 2)
             draw.rectangle([x - 2, y - 2, x + 2, y + 2],
-                          fill=PALETTE["copper"]["dark"])
+                          fill=self._ink(PALETTE["copper"]["dark"]))
     
-    def generate_soil_tile(self, soil_type: str, memory: Dict = None) -> Image.Image:
+    def generate_soil_tile(self, soil_type: str, memory: Dict = None, size: int = 32,
+                           noise: str = "white") -> Image.Image:
         """Generate a soil tile based on type and memory"""
-        size = 32
-        img = Image.new("RGBA", (size, size), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
+        pixels = self.soil_tiles(soil_type, 1, memory, size, noise)[0]
+        if self.indexed:
+            return indexed_from_rgba(pixels)
+        return Image.fromarray(pixels, "RGBA")
+    
+    def soil_tiles(self, soil_type: str, count: int, memory: Dict = None, size: int = 32,
+                   noise: str = "white", batch: int = 0) -> np.ndarray:
+        """count tiles of one soil type and memory, as a (count, size, size, 4) RGBA array
         
-        # Base soil color
-        soil_colors = {
-            "ferro_soil": PALETTE["copper"]["medium"],
-            "fungal_soil": PALETTE["ash"]["medium"],
-            "ash_soil": PALETTE["ash"]["dark"],
-            "pure_bio_soil": (101, 120, 81),  # Slightly green
-            "scrap_heap": PALETTE["rust"]["dark"],
-        }
-        
-        base_color = soil_colors.get(soil_type, PALETTE["ash"]["medium"])
-        
-        # Draw base with noise
-        for x in range(size):
-            for y in range(size):
-                noise = random.randint(-10, 10)
-                color = tuple(max(0, min(255, c + noise)) for c in base_color)
-                if random.random() < 0.3:  # Add texture
-                    draw.point((x, y), fill=color)
-        
-        # Add cracks based on memory
-        if memory and memory.get("years_used", 0) > 3:
-            years = memory["years_used"]
-            crack_count = min(3, years // 2)
-            for _ in range(crack_count):
-                self._draw_crack(draw, size)
-        
-        # Add pipes/mechanical elements for ferro_soil
-        if soil_type == "ferro_soil":
-            self._draw_metal_pipes(draw, size)
+        The tiles are generated together (see soil_textures) from one
+        stream, seeded from the soil type, years used, size, noise and
+        batch number.
+        """
+        years = (memory or {}).get("years_used", 0)
+        rng = np.random.default_rng(derive_seed(self.seed, "soil", soil_type, years, size,
+                                                noise, batch))
+        base_color = SOIL_COLORS.get(soil_type, PALETTE["ash"]["medium"])
         
-        return img
-    
-    def _draw_crack(self, draw: ImageDraw, size: int):
-        """Draw a crack in the soil"""
-        start_x = random.randint(0, size)
-        start_y = random.randint(0, size)
-        end_x = random.randint(0, size)
-        end_y = random.randint(0, size)
-        draw.line([(start_x, start_y), (end_x, end_y)],
-                 fill=PALETTE["ash"]["dark"], width=1)
-    
-    def _draw_metal_pipes(self, draw: ImageDraw, size: int):
-        """Draw metal pipes in ferro soil"""
-        for _ in range(random.randint(1, 2)):
-            x = random.randint(5, size - 5)
-            y = random.randint(5, size - 5)
-            length = random.randint(5, 10)
-            if random.random() < 0.5:
-                draw.rectangle([x, y, x + length, y + 1],
-                              fill=PALETTE["copper"]["dark"])
-            else:
-                draw.rectangle([x, y, x + 1, y + length],
-                              fill=PALETTE["copper"]["dark"])
+        # Cracks based on memory, pipes/mechanical elements for ferro_soil
+        crack_count = min(3, years // 2) if years > 3 else 0
+        return soil_textures(rng, np.tile(base_color, (count, 1)), size, noise,
+                             np.full(count, crack_count),
+                             np.full(count, soil_type == "ferro_soil"))
     
     def generate_character_sprite(self, traits: List[str],
                                  age: int, generation: int) -> Image.Image:
         """Generate a character sprite based on traits"""
+        self._reseed("character", ",".join(traits), age, generation)
         size = 32
-        img = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+        img = new_sprite(size, self.indexed)
         draw = ImageDraw.Draw(img)
         
         # Base body
         body_color = PALETTE["copper"]["light"]
         draw.ellipse([size // 2 - 8, size // 2 - 4,
                      size // 2 + 8, size // 2 + 12],
-                    fill=body_color)
+                    fill=self._ink(body_color))
         
         # Apply trait-based mutations
         for trait in traits:
@@ -337,38 +635,149 @@ class SpriteGenerator:
         eye_x, eye_y = size // 2 - 3, size // 2 - 2
         # Eye socket
         draw.ellipse([eye_x - 3, eye_y - 3, eye_x + 3, eye_y + 3],
-                    fill=(50, 50, 50))
+                    fill=self._ink(LITERAL_COLORS["socket"]))
         # Gear eye
         draw.ellipse([eye_x - 2, eye_y - 2, eye_x + 2, eye_y + 2],
-                    fill=PALETTE["copper"]["dark"])
+                    fill=self._ink(PALETTE["copper"]["dark"]))
     
     def _add_prosthetic_limb(self, draw: ImageDraw, size: int):
         """Add prosthetic limb"""
         # Simple metal arm
         draw.rectangle([size // 2 + 6, size // 2,
                        size // 2 + 10, size // 2 + 8],
-                      fill=PALETTE["copper"]["dark"])
+                      fill=self._ink(PALETTE["copper"]["dark"]))
     
     def _add_soot_stains(self, draw: ImageDraw, size: int):
         """Add soot stains to clothing"""
-        for _ in range(random.randint(2, 5)):
-            x = random.randint(size // 2 - 6, size // 2 + 6)
-            y = random.randint(size // 2, size // 2 + 10)
-            draw.point((x, y), fill=(40, 40, 40))
+        for _ in range(self.rng.randint(2, 5)):
+            x = self.rng.randint(size // 2 - 6, size // 2 + 6)
+            y = self.rng.randint(size // 2, size // 2 + 10)
+            draw.point((x, y), fill=self._ink(LITERAL_COLORS["soot"]))
     
     def _add_wrinkles(self, draw: ImageDraw, size: int):
         """Add age wrinkles"""
         for _ in range(3):
-            x = random.randint(size // 2 - 4, size // 2 + 4)
+            x = self.rng.randint(size // 2 - 4, size // 2 + 4)
             y = size // 2 - 1
             draw.line([(x - 2, y), (x + 2, y)],
-                     fill=(80, 60, 40), width=1)
+                     fill=self._ink(LITERAL_COLORS["wrinkle"]), width=1)
     
-    def batch_generate_crops(self, crop_data: List[Dict]):
-        """Generate all crop sprites from crop data"""
-        crops_dir = self.output_dir / "crops"
-        crops_dir.mkdir(exist_ok=True)
+    def crop_mutations(self, crop_name: str, stage: int, variant: int = 0) -> List[str]:
+        """The 0-2 random biomechanical mutations of a crop stage variant"""
+        rng = random.Random(derive_seed(self.seed, "mutations", crop_name, stage, variant))
+        return rng.sample(MUTATIONS, rng.randint(0, 2))
+    
+    def render_sprite(self, kind: str, args: Tuple) -> Image.Image:
+        """The sprite of one job (see render)"""
+        if kind == "swap":
+            swaps, kind, args = args
+            return swap_palette(self.render_sprite(kind, args), swaps)
+        if self._last[0] == (kind, args):
+            return self._last[1]
+        if kind == "crop":
+            sprite = self.generate_crop_sprite(*args)
+        elif kind == "soil":
+            sprite = self.generate_soil_tile(*args)
+        elif kind == "character":
+            sprite = self.generate_character_sprite(*args)
+        else:
+            raise ValueError(f"Unknown sprite kind '{kind}'")
+        self._last = ((kind, args), sprite)
+        return sprite
+    
+    def render(self, job: Tuple) -> str:
+        """Render one sprite job and save it; returns its path under output_dir
         
+        A job is (kind, args, path, source): kind picks generate_crop_sprite,
+        generate_soil_tile or generate_character_sprite, called with args.
+        Kind "swap" has args (swaps, kind, args): that sprite with
+        swap_palette applied, reusing the render of the job before it when
+        that was the same sprite. source is the data the job came from (a
+        crop's definition), which only matters to the build manifest.
+        """
+        kind, args, path = job[:3]
+        save_sprite(self.render_sprite(kind, args), self.output_dir / path)
+        return path
+    
+    def render_all(self, jobs: List[Tuple]):
+        """Render and save sprite jobs, across self.workers processes
+        
+        Each sprite is seeded on its own, so the files are byte-identical
+        for any number of workers.
+        """
+        if self.workers <= 1 or len(jobs) < 2:
+            for path in map(self.render, jobs):
+                print(f"Generated: {Path(path).name}")
+            return
+        chunksize = max(1, len(jobs) // (self.workers * 8))
+        with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                 initargs=(str(self.output_dir), self.seed,
+                                           self.indexed)) as executor:
+            for path in executor.map(_render_job, jobs, chunksize=chunksize):
+                print(f"Generated: {Path(path).name}")
+    
+    def build(self, jobs: List[Tuple], force: bool = False) -> Tuple[int, int, int]:
+        """Incrementally render jobs against the output directory's manifest
+        
+        Only sprites whose inputs (sprite_key) changed, or whose file is
+        missing, are rendered; files the last build wrote that no job
+        produces any more are deleted. force renders every job. Returns
+        (rendered, unchanged, pruned).
+        """
+        manifest = BuildManifest(self.output_dir)
+        built = {} if force else manifest.sprites
+        sprites = {job[2]: sprite_key(self.seed, job, self.indexed) for job in jobs}
+        stale = [
+            job for job in jobs
+            if built.get(job[2]) != sprites[job[2]]
+            or not (self.output_dir / job[2]).exists()
+        ]
+        for directory in {Path(job[2]).parent for job in stale}:
+            (self.output_dir / directory).mkdir(parents=True, exist_ok=True)
+        self.render_all(stale)
+        
+        orphans = [path for path in manifest.sprites if path not in sprites]
+        for path in orphans:
+            (self.output_dir / path).unlink(missing_ok=True)
+            print(f"Removed: {Path(path).name}")
+        manifest.seed = self.seed
+        manifest.sprites = sprites
+        manifest.save()
+        return len(stale), len(jobs) - len(stale), len(orphans)
+    
+    def build_atlas(self, jobs: List[Tuple], max_size: int = 2048, padding: int = 1,
+                    force: bool = False) -> bool:
+        """Pack the sprites of jobs (already built) into <output>/atlas
+        
+        Sprite keys are output paths without .png (crops/ironwheat_stage_1).
+        The atlas is only rewritten when a sprite or the packing settings
+        changed. Returns whether it was.
+        """
+        from atlas import ATLAS_DIR, atlas_key, build_atlas
+        
+        out_dir = self.output_dir / ATLAS_DIR
+        sprites = {job[2][:-len(".png")]: job for job in jobs}
+        keys = sorted((path, sprite_key(self.seed, job, self.indexed))
+                      for path, job in sprites.items())
+        key = hashlib.sha256(json.dumps([keys, max_size, padding]).encode()).hexdigest()
+        if not force and atlas_key(out_dir) == key:
+            return False
+        images = {}
+        for path, job in sprites.items():
+            with Image.open(self.output_dir / job[2]) as image:
+                images[path] = image.copy()
+        info = {path: sprite_info(job) for path, job in sprites.items()}
+        index = build_atlas(images, info, out_dir, key, max_size, padding, self.indexed)
+        print(f"Atlas: {len(index['sprites'])} sprites on {len(index['sheets'])} sheet(s)")
+        return True
+    
+    def crop_jobs(self, crop_data: List[Dict], variants: int = 1) -> List[Tuple]:
+        """Sprite jobs for every stage of every crop
+        
+        With variants > 1 each stage gets that many mutation variants,
+        saved as <crop>_stage_<n>_v<k>.png.
+        """
+        jobs = []
         for crop in crop_data:
             crop_name = crop["name"]
             max_stages = crop.get("growth_stages", 5)
@@ -376,67 +785,127 @@ class SpriteGenerator:
             
             # Generate for each growth stage
             for stage in range(1, max_stages + 1):
-                mutations = []
-                if biomechanical:
-                    # Random biomechanical mutations
-                    mutation_options = ["rust_veins", "gear_leaves", "steam_pipes"]
-                    mutations = random.sample(mutation_options, 
-                                            random.randint(0, 2))
-                
-                sprite = self.generate_crop_sprite(
-                    crop_name, stage, max_stages, biomechanical, mutations
-                )
-                
-                filename = f"{crop_name.lower()}_stage_{stage}.png"
-                sprite.save(crops_dir / filename)
-                print(f"Generated: {filename}")
-    
-    def batch_generate_soil_tiles(self, soil_types: List[str]):
-        """Generate soil tile sprites"""
-        tiles_dir = self.output_dir / "tiles"
-        tiles_dir.mkdir(exist_ok=True)
+                for variant in range(variants):
+                    mutations = []
+                    if biomechanical:
+                        mutations = self.crop_mutations(crop_name, stage, variant)
+                    
+                    suffix = f"_v{variant}" if variants > 1 else ""
+                    filename = f"{crop_name.lower()}_stage_{stage}{suffix}.png"
+                    jobs.append(("crop", (crop_name, stage, max_stages, biomechanical,
+                                          mutations, variant), f"crops/{filename}", crop))
+        return jobs
+    
+    def with_palette_swaps(self, jobs: List[Tuple], swaps: List[Dict[str, str]]) -> List[Tuple]:
+        """jobs, each followed by a copy per palette swap, e.g. {"copper": "rust"}
         
+        A copy is saved next to its sprite with the new families as a
+        suffix (ironwheat_stage_1_rust.png). Coming right after it, it
+        reuses the sprite's render.
+        """
+        result = []
+        for kind, args, path, source in jobs:
+            result.append((kind, args, path, source))
+            for swap in swaps:
+                suffix = "_" + "_".join(swap[family] for family in sorted(swap))
+                result.append(("swap", (swap, kind, args),
+                               path[:-len(".png")] + suffix + ".png", source))
+        return result
+    
+    def soil_jobs(self, soil_types: List[str], size: int = 32,
+                  noise: str = "white") -> List[Tuple]:
+        """Sprite jobs for every soil type, bare and at each memory level"""
+        jobs = []
         for soil_type in soil_types:
             # Generate base tile
-            tile = self.generate_soil_tile(soil_type)
-            filename = f"{soil_type}.png"
-            tile.save(tiles_dir / filename)
-            print(f"Generated: {filename}")
+            jobs.append(("soil", (soil_type, None, size, noise), f"tiles/{soil_type}.png", None))
             
             # Generate with memory variations
             for years in [3, 5, 10]:
                 memory = {"years_used": years, "mood": "tired"}
-                tile = self.generate_soil_tile(soil_type, memory)
-                filename = f"{soil_type}_memory_{years}.png"
-                tile.save(tiles_dir / filename)
-                print(f"Generated: {filename}")
+                jobs.append(("soil", (soil_type, memory, size, noise),
+                             f"tiles/{soil_type}_memory_{years}.png", None))
+        return jobs
+    
+    def batch_generate_crops(self, crop_data: List[Dict], variants: int = 1):
+        """Generate all crop sprites from crop data"""
+        (self.output_dir / "crops").mkdir(exist_ok=True)
+        self.render_all(self.crop_jobs(crop_data, variants))
+    
+    def batch_generate_soil_tiles(self, soil_types: List[str], size: int = 32,
+                                  noise: str = "white"):
+        """Generate soil tile sprites"""
+        (self.output_dir / "tiles").mkdir(exist_ok=True)
+        self.render_all(self.soil_jobs(soil_types, size, noise))
 
 
 def main():
     """Main function to generate all sprites"""
-    generator = SpriteGenerator("assets/generated")
+    parser = argparse.ArgumentParser(description="Generate crop, soil and character sprites")
+    parser.add_argument("--output", default="assets/generated", help="Output directory")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Master seed (default: the last build's, or a new one)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes (0 = one per CPU)")
+    parser.add_argument("--variants", type=int, default=1,
+                        help="Mutation variants per crop stage")
+    parser.add_argument("--tile-size", type=int, default=32, help="Soil tile size in pixels")
+    parser.add_argument("--noise", choices=NOISE_TYPES, default="white",
+                        help="Soil texture noise: white (per pixel) or value (coherent)")
+    parser.add_argument("--atlas", action="store_true",
+                        help="Also pack every sprite into atlas sheets under <output>/atlas")
+    parser.add_argument("--atlas-size", type=int, default=2048,
+                        help="Largest atlas sheet side in pixels")
+    parser.add_argument("--atlas-padding", type=int, default=1,
+                        help="Transparent pixels around each sprite in the atlas")
+    parser.add_argument("--rgba", action="store_true",
+                        help="Write RGBA sprites instead of indexed (paletted) ones")
+    parser.add_argument("--swap", action="append", default=[],
+                        help="Also write palette-swapped copies, e.g. copper=rust "
+                             "(comma-separate several families; repeat for more sets)")
+    parser.add_argument("--force", action="store_true",
+                        help="Regenerate every sprite, even unchanged ones")
+    args = parser.parse_args()
+    
+    # Without --seed, keep the art of the last build (and its cache)
+    seed = args.seed
+    if seed is None:
+        seed = BuildManifest(Path(args.output)).seed
+    swaps = [dict(pair.split("=") for pair in spec.split(",")) for spec in args.swap]
+    for swap in swaps:
+        unknown = (set(swap) | set(swap.values())) - set(PALETTE)
+        if unknown:
+            parser.error(f"Unknown palette families: {', '.join(sorted(unknown))}")
+    if swaps and args.rgba:
+        parser.error("--swap needs indexed sprites (drop --rgba)")
+    if args.tile_size < 1:
+        parser.error("--tile-size must be at least 1")
+    generator = SpriteGenerator(args.output, seed, args.workers or os.cpu_count(),
+                                indexed=not args.rgba)
+    print(f"Seed: {generator.seed}")
     
     # Load crop data
+    jobs = []
     crop_data_path = Path("data/crops.json")
     if crop_data_path.exists():
         with open(crop_data_path) as f:
             crops = json.load(f)
-        generator.batch_generate_crops(crops)
+        jobs.extend(generator.crop_jobs(crops, args.variants))
     
     # Generate soil tiles
     soil_types = ["ferro_soil", "fungal_soil", "ash_soil", 
                   "pure_bio_soil", "scrap_heap"]
-    generator.batch_generate_soil_tiles(soil_types)
+    jobs.extend(generator.soil_jobs(soil_types, args.tile_size, args.noise))
     
     # Generate example character
-    character = generator.generate_character_sprite(
-        ["mechanically_gifted"], 45, 1
-    )
-    generator.output_dir.mkdir(exist_ok=True)
-    character.save(generator.output_dir / "character_example.png")
-    print("Generated: character_example.png")
+    jobs.append(("character", (["mechanically_gifted"], 45, 1), "character_example.png", None))
+    jobs = generator.with_palette_swaps(jobs, swaps)
+    
+    rendered, unchanged, pruned = generator.build(jobs, force=args.force)
+    print(f"{rendered} generated, {unchanged} up to date, {pruned} removed")
+    if args.atlas:
+        generator.build_atlas(jobs, args.atlas_size, args.atlas_padding, force=args.force)
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+On-demand sprite generation service
+Renders single sprites on request, for previewing trait and mutation
+combinations without a batch build, behind an in-memory LRU cache and an
+on-disk cache; usable as a Python API or a small localhost HTTP server
+"""
+
+import argparse
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from sprite_generator import (MUTATIONS, NOISE_TYPES, PALETTE, SpriteGenerator, save_sprite,
+                              sprite_key)
+
+DEFAULT_DISK_CACHE = "reports/sprite_cache"
+DEFAULT_CACHE_BYTES = 64 * 2 ** 20
+DEFAULT_PORT = 8765
+KINDS = ("crop", "soil", "character")
+# Soil tile sizes a request may ask for, in pixels per side
+SOIL_SIZES = (8, 256)
+
+
+class LRUCache:
+    """Byte-bounded least-recently-used cache of PNG bytes by key"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """The cached value, marked most recently used (None if absent)"""
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: bytes):
+        """Cache value, evicting the least recently used until it fits"""
+        if key in self._items:
+            self.bytes -= len(self._items.pop(key))
+        if len(value) > self.max_bytes:
+            return
+        self._items[key] = value
+        self.bytes += len(value)
+        while self.bytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.bytes -= len(evicted)
+
+
+class SpriteService:
+    """Renders sprites by description, memoized in memory and on disk
+
+    A sprite is keyed by the build manifest's sprite_key of its job, so
+    the key covers the generator version and palette as well as the
+    request, and a stale cache entry can never be served. Lookups go
+    memory, then disk_dir (if set), then a render. Safe to share between
+    threads: the lock only guards the caches and stats, and renders run
+    concurrently, each thread on its own generators.
+    """
+
+    def __init__(self, seed: int = 0, cache_bytes: int = DEFAULT_CACHE_BYTES,
+                 disk_dir: Optional[str] = DEFAULT_DISK_CACHE,
+                 crops_path: str = "data/crops.json"):
+        self.seed = seed
+        self.memory = LRUCache(cache_bytes)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "renders": 0, "render_seconds": 0.0}
+        self.crops = {}
+        if Path(crops_path).exists():
+            with open(crops_path) as f:
+                self.crops = {crop["name"]: crop for crop in json.load(f)}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _generator(self, seed: int) -> SpriteGenerator:
+        """This thread's generator for seed (generators are not thread-safe)"""
+        generators = getattr(self._local, "generators", None)
+        if generators is None:
+            generators = self._local.generators = {}
+        generator = generators.get(seed)
+        if generator is None:
+            output_dir = self.disk_dir or Path(tempfile.gettempdir())
+            generator = generators[seed] = SpriteGenerator(str(output_dir), seed)
+        return generator
+
+    def job(self, kind: str, name: str = "", stage: int = 1,
+            mutations: Sequence[str] = (), traits: Sequence[str] = (), age: int = 30,
+            generation: int = 1, memory: int = 0, size: int = 32, noise: str = "white",
+            variant: int = 0, palette: Optional[Dict[str, str]] = None) -> Tuple:
+        """The sprite job a request describes; raises ValueError for a bad request
+
+        name is a crop or soil type; crops take their stage count and
+        whether they are biomechanical from data/crops.json. memory is the
+        soil's years of use. palette swaps color families (see
+        swap_palette).
+        """
+        if kind == "crop":
+            crop = self.crops.get(name, {"name": name})
+            max_stages = crop.get("growth_stages", 5)
+            if not 1 <= stage <= max_stages:
+                raise ValueError(f"{name} has stages 1-{max_stages}")
+            unknown = set(mutations) - set(MUTATIONS) - {"metal_joints"}
+            if unknown:
+                raise ValueError(f"Unknown mutations: {', '.join(sorted(unknown))}")
+            job = ("crop", (name, stage, max_stages, crop.get("biomechanical", True),
+                            list(mutations), variant), "", crop)
+        elif kind == "soil":
+            if noise not in NOISE_TYPES:
+                raise ValueError(f"Unknown noise '{noise}'")
+            low, high = SOIL_SIZES
+            if not low <= size <= high:
+                raise ValueError(f"Soil size must be {low}-{high} pixels, got {size}")
+            years = {"years_used": memory, "mood": "tired"} if memory else None
+            job = ("soil", (name, years, size, noise), "", None)
+        elif kind == "character":
+            job = ("character", (list(traits), age, generation), "", None)
+        else:
+            raise ValueError(f"Unknown kind '{kind}', expected one of {KINDS}")
+        if palette:
+            unknown = (set(palette) | set(palette.values())) - set(PALETTE)
+            if unknown:
+                raise ValueError(f"Unknown palette families: {', '.join(sorted(unknown))}")
+            job = ("swap", (dict(palette), job[0], job[1]), "", job[3])
+        return job
+
+    def sprite(self, kind: str, seed: Optional[int] = None, **request) -> bytes:
+        """PNG bytes of a sprite (see job for the request fields)"""
+        seed = self.seed if seed is None else seed
+        job = self.job(kind, **request)
+        key = sprite_key(seed, job)
+        with self._lock:
+            png = self.memory.get(key)
+            if png is not None:
+                self.stats["memory_hits"] += 1
+                return png
+        path = self.disk_dir / key[:2] / f"{key}.png" if self.disk_dir else None
+        if path is not None and path.exists():
+            png = path.read_bytes()
+            with self._lock:
+                self.stats["disk_hits"] += 1
+                self.memory.put(key, png)
+            return png
+
+        start = time.perf_counter()
+        try:
+            image = self._generator(seed).render_sprite(job[0], job[1])
+        except ValueError as error:
+            # job() accepted the request, so this is a generator bug, not a bad request
+            raise RuntimeError(f"Rendering {kind} sprite failed: {error}") from error
+        buffer = io.BytesIO()
+        save_sprite(image, buffer)
+        png = buffer.getvalue()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.stats["renders"] += 1
+            self.stats["render_seconds"] += elapsed
+            self.memory.put(key, png)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(png)
+            os.replace(tmp, path)
+        return png
+
+    def info(self) -> Dict:
+        """Cache sizes and hit counts"""
+        with self._lock:
+            return dict(self.stats, cached=len(self.memory), cached_bytes=self.memory.bytes,
+                        cache_limit=self.memory.max_bytes)
+
+
+def parse_request(query: str) -> Dict:
+    """sprite() keyword arguments from an HTTP query string
+
+    kind, name, stage, seed, age, generation, memory, size, noise and
+    variant are single values; mutations and traits are comma-separated;
+    palette is family=family pairs, comma-separated.
+    """
+    fields = {key: values[-1] for key, values in parse_qs(query).items()}
+    request = {"kind": fields.pop("kind", "crop")}
+    for key in ("name", "noise"):
+        if key in fields:
+            request[key] = fields.pop(key)
+    for key in ("stage", "seed", "age", "generation", "memory", "size", "variant"):
+        if key in fields:
+            request[key] = int(fields.pop(key))
+    for key in ("mutations", "traits"):
+        if key in fields:
+            request[key] = [item for item in fields.pop(key).split(",") if item]
+    if "palette" in fields:
+        request["palette"] = dict(pair.split("=") for pair in fields.pop("palette").split(","))
+    if fields:
+        raise ValueError(f"Unknown parameters: {', '.join(sorted(fields))}")
+    return request
+
+
+def make_handler(service: SpriteService):
+    """HTTP handler class serving GET /sprite?... (PNG) and GET /stats (JSON)"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/stats":
+                self._reply(200, "application/json", json.dumps(service.info()).encode())
+                return
+            if url.path != "/sprite":
+                self._reply(404, "text/plain", b"Try /sprite?kind=crop&name=Ironwheat&stage=3")
+                return
+            try:
+                png = service.sprite(**parse_request(url.query))
+            except (ValueError, TypeError) as error:
+                self._reply(400, "text/plain", str(error).encode())
+                return
+            except RuntimeError as error:
+                self._reply(500, "text/plain", str(error).encode())
+                return
+            self._reply(200, "image/png", png)
+
+        def _reply(self, status: int, content_type: str, body: bytes):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Serve generated sprites on localhost")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--seed", type=int, default=0, help="Default master seed")
+    parser.add_argument("--cache-mb", type=float, default=DEFAULT_CACHE_BYTES / 2 ** 20,
+                        help="In-memory cache size in MB")
+    parser.add_argument("--disk-cache", default=DEFAULT_DISK_CACHE,
+                        help="On-disk cache directory ('' to disable)")
+    args = parser.parse_args()
+
+    service = SpriteService(args.seed, int(args.cache_mb * 2 ** 20), args.disk_cache or None)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(service))
+    print(f"Serving sprites on http://127.0.0.1:{args.port}/sprite "
+          f"(e.g. /sprite?kind=crop&name=Ironwheat&stage=3&mutations=rust_veins)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
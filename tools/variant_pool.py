@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Variant pools of crop and character sprites
+Renders many candidate mutation variants per crop stage (and per character
+trait set), drops empty and near-duplicate ones with a perceptual hash
+index and keeps the most distinct few for procedural variety in-game
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from sprite_generator import INDEXED_PALETTE, SpriteGenerator, derive_seed, save_sprite
+
+# Every mutation the overlay can draw, metal_joints included
+POOL_MUTATIONS = ["rust_veins", "gear_leaves", "steam_pipes", "metal_joints"]
+DEFAULT_OUTPUT = "assets/generated/variants"
+
+# Near-duplicates: hashes at most this many bits apart
+DEFAULT_DISTANCE = 4
+
+_PALETTE_RGB = np.array(INDEXED_PALETTE, dtype=np.float32).reshape(-1, 3)
+_LUMA = _PALETTE_RGB @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# int.bit_count is Python 3.10+
+_bit_count = getattr(int, "bit_count", None) or (lambda value: bin(value).count("1"))
+
+
+def popcount(values: np.ndarray) -> np.ndarray:
+    """Set bits of each uint64"""
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    return _POPCOUNT[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1)
+
+
+def perceptual_hashes(sprites: np.ndarray) -> np.ndarray:
+    """64-bit average hashes of a batch of paletted sprites (n, h, w)
+
+    Each sprite's luminance (0 where transparent) is averaged over an 8x8
+    grid of blocks and each block is one bit: brighter than the sprite's
+    mean or not. Sprites that differ by a stray pixel or two hash alike.
+    """
+    count, height, width = sprites.shape
+    luma = _LUMA[sprites] * (sprites > 0)
+    blocks = luma.reshape(count, 8, height // 8, 8, width // 8).mean(axis=(2, 4))
+    bits = (blocks > blocks.mean(axis=(1, 2), keepdims=True)).reshape(count, 64)
+    weights = np.uint64(1) << np.arange(64, dtype=np.uint64)
+    return (bits.astype(np.uint64) * weights).sum(axis=1, dtype=np.uint64)
+
+
+def _band_masks(hashes: np.ndarray, bands: int) -> List[int]:
+    """Split the 64 bit positions into bands with equal shares of the varying bits
+
+    Sprites of one crop stage agree on most of their hash (the plant's
+    outline), so contiguous bands would put most hashes in a handful of
+    buckets. Dealing bits out by how evenly they split the batch keeps
+    every band discriminating.
+    """
+    weights = np.uint64(1) << np.arange(64, dtype=np.uint64)
+    ones = ((hashes[:, None] & weights) > 0).mean(axis=0) if len(hashes) else np.zeros(64)
+    order = np.argsort(-np.minimum(ones, 1 - ones), kind="stable")
+    masks = [0] * bands
+    for rank, bit in enumerate(order):
+        masks[rank % bands] |= 1 << int(bit)
+    return masks
+
+
+def dedupe(hashes: np.ndarray, max_distance: int = DEFAULT_DISTANCE) -> List[int]:
+    """Indices of hashes to keep, dropping any within max_distance bits of a kept one
+
+    Multi-index hashing: the bits are split into max_distance // 2 + 1
+    bands, and two hashes that close must differ in at most one bit of
+    some band. Each kept hash is filed under its band values, and a new
+    hash only probes its band values and their one-bit neighbours, so
+    it is compared with the few kept hashes that could match, not all of
+    them: near-linear rather than quadratic. Earlier hashes win.
+    """
+    bands = max_distance // 2 + 1
+    masks = _band_masks(np.asarray(hashes, dtype=np.uint64), bands)
+    probe = max_distance // bands > 0
+    plan = [({}, mask, [0] + ([1 << bit for bit in range(64) if mask >> bit & 1] if probe else []))
+            for mask in masks]
+    seen = set()
+    kept = []
+    for index, value in enumerate(np.asarray(hashes, dtype=np.uint64).tolist()):
+        if value in seen:
+            continue
+        duplicate = False
+        for table, mask, flips in plan:
+            key = value & mask
+            for flip in flips:
+                for other in table.get(key ^ flip, ()):
+                    if _bit_count(value ^ other) <= max_distance:
+                        duplicate = True
+                        break
+                if duplicate:
+                    break
+            if duplicate:
+                break
+        if duplicate:
+            continue
+        seen.add(value)
+        kept.append(index)
+        for table, mask, _ in plan:
+            table.setdefault(value & mask, []).append(value)
+    return kept
+
+
+def most_distinct(hashes: np.ndarray, keep: int) -> List[int]:
+    """Indices of keep hashes spread as far apart as possible (greedy max-min)
+
+    Starts from the first hash and repeatedly adds the one farthest (in
+    Hamming distance) from everything chosen so far.
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    if len(hashes) <= keep:
+        return list(range(len(hashes)))
+    chosen = [0]
+    nearest = popcount(hashes ^ hashes[0])
+    for _ in range(keep - 1):
+        index = int(np.argmax(nearest))
+        chosen.append(index)
+        nearest = np.minimum(nearest, popcount(hashes ^ hashes[index]))
+    return chosen
+
+
+def _render_candidates(seed: int, kind: str, specs: Sequence[Tuple]) -> np.ndarray:
+    """Render candidate sprites as one (n, 32, 32) array of palette indices"""
+    generator = SpriteGenerator(tempfile.gettempdir(), seed)
+    render = (generator.generate_crop_sprite if kind == "crop"
+              else generator.generate_character_sprite)
+    return np.stack([np.asarray(render(*spec)) for spec in specs])
+
+
+class VariantPool:
+    """Builds pools of distinct sprite variants
+
+    Candidates are rendered in chunks (across worker processes when
+    workers > 1) straight into palette-index arrays, hashed as a batch,
+    deduplicated and thinned to the keep most distinct.
+    """
+
+    def __init__(self, seed: int, workers: int = 1, chunk: int = 512):
+        self.seed = seed
+        self.workers = workers
+        self.chunk = chunk
+
+    def crop_candidates(self, crop: Dict, stage: int, count: int) -> List[Tuple]:
+        """generate_crop_sprite arguments of count random mutation variants"""
+        rng = random.Random(derive_seed(self.seed, "pool", crop["name"], stage))
+        specs = []
+        for variant in range(count):
+            mutations = rng.sample(POOL_MUTATIONS, rng.randint(0, len(POOL_MUTATIONS)))
+            specs.append((crop["name"], stage, crop.get("growth_stages", 5),
+                          crop.get("biomechanical", True), mutations, variant))
+        return specs
+
+    def character_candidates(self, traits: List[str], count: int) -> List[Tuple]:
+        """generate_character_sprite arguments of count variants of a trait set"""
+        rng = random.Random(derive_seed(self.seed, "pool", ",".join(traits)))
+        return [(traits, rng.randint(18, 80), generation + 1) for generation in range(count)]
+
+    def render(self, kind: str, specs: List[Tuple]) -> np.ndarray:
+        """Palette-index arrays of every candidate, in order"""
+        chunks = [specs[i:i + self.chunk] for i in range(0, len(specs), self.chunk)]
+        task = partial(_render_candidates, self.seed, kind)
+        if self.workers <= 1 or len(chunks) < 2:
+            return np.concatenate([task(chunk) for chunk in chunks])
+        with ProcessPoolExecutor(self.workers) as executor:
+            return np.concatenate(list(executor.map(task, chunks)))
+
+    def select(self, sprites: np.ndarray, keep: int,
+               max_distance: int = DEFAULT_DISTANCE) -> Tuple[List[int], Dict]:
+        """Indices of the keep most distinct non-empty, non-duplicate sprites, and counts"""
+        nonempty = np.flatnonzero(sprites.reshape(len(sprites), -1).any(axis=1))
+        hashes = perceptual_hashes(sprites[nonempty])
+        unique = dedupe(hashes, max_distance)
+        chosen = most_distinct(hashes[unique], keep)
+        picked = [int(nonempty[unique[i]]) for i in chosen]
+        return picked, {"candidates": len(sprites), "empty": len(sprites) - len(nonempty),
+                        "unique": len(unique), "kept": len(picked)}
+
+
+def write_pool(directory: Path, sprites: np.ndarray, picked: List[int], specs: List[Tuple],
+               describe) -> List[Dict]:
+    """Save the picked sprites as 0.png, 1.png, ... under directory; returns their index"""
+    directory.mkdir(parents=True, exist_ok=True)
+    for stale in directory.glob("*.png"):
+        stale.unlink()
+    entries = []
+    for number, index in enumerate(picked):
+        image = Image.fromarray(sprites[index], "P")
+        image.putpalette(INDEXED_PALETTE)
+        image.info["transparency"] = 0
+        save_sprite(image, directory / f"{number}.png")
+        entries.append(dict(describe(specs[index]), file=f"{number}.png"))
+    return entries
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Pre-generate pools of distinct sprite variants")
+    parser.add_argument("--candidates", type=int, default=2000,
+                        help="Candidates rendered per crop stage / trait set")
+    parser.add_argument("--keep", type=int, default=16, help="Variants kept per pool")
+    parser.add_argument("--distance", type=int, default=DEFAULT_DISTANCE,
+                        help="Hashes this many bits apart or closer are duplicates")
+    parser.add_argument("--traits", action="append", default=[],
+                        help="Character trait set to pool, comma-separated (repeatable)")
+    parser.add_argument("--seed", type=int, default=0, help="Master seed")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes (0 = one per CPU)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Output directory")
+    args = parser.parse_args()
+
+    pool = VariantPool(args.seed, args.workers or os.cpu_count())
+    output = Path(args.output)
+    index = {"seed": args.seed, "distance": args.distance, "crops": {}, "characters": {}}
+    with open("data/crops.json") as f:
+        crops = json.load(f)
+
+    jobs = []
+    for crop in crops:
+        for stage in range(1, crop.get("growth_stages", 5) + 1):
+            name = f"{crop['name'].lower()}_stage_{stage}"
+            jobs.append(("crop", name, pool.crop_candidates(crop, stage, args.candidates),
+                         output / "crops" / name))
+    for traits in args.traits:
+        traits = [trait for trait in traits.split(",") if trait]
+        name = "_".join(traits) or "plain"
+        jobs.append(("character", name, pool.character_candidates(traits, args.candidates),
+                     output / "characters" / name))
+
+    print(f"{'Pool':<32}{'Candidates':>11}{'Empty':>7}{'Unique':>8}{'Kept':>6}{'Seconds':>9}")
+    for kind, name, specs, directory in jobs:
+        start = time.perf_counter()
+        sprites = pool.render(kind, specs)
+        picked, counts = pool.select(sprites, args.keep, args.distance)
+        if kind == "crop":
+            entries = write_pool(directory, sprites, picked, specs,
+                                 lambda spec: {"mutations": spec[4], "variant": spec[5]})
+            index["crops"][name] = entries
+        else:
+            entries = write_pool(directory, sprites, picked, specs,
+                                 lambda spec: {"age": spec[1], "generation": spec[2]})
+            index["characters"][name] = entries
+        print(f"{name:<32}{counts['candidates']:>11}{counts['empty']:>7}{counts['unique']:>8}"
+              f"{counts['kept']:>6}{time.perf_counter() - start:>9.2f}")
+
+    output.mkdir(parents=True, exist_ok=True)
+    with open(output / "pool.json", "w") as f:
+        json.dump(index, f, indent=1)
+    print(f"Index written to {output / 'pool.json'}")
+
+if __name__ == "__main__":
+    main()